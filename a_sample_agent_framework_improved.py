@@ -21,21 +21,64 @@ except ModuleNotFoundError:
 import os
 import json
 import argparse
+import asyncio
 import time
 import sys
 import traceback
+import functools
+import hashlib
+import io
+import sqlite3
+from collections import OrderedDict, deque
+from itertools import compress, islice
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Callable, Optional
-from litellm import completion
+from typing import List, Dict, Any, Awaitable, Callable, Optional
+import httpx  # installed with litellm
+import litellm
+from litellm import acompletion, completion
 from litellm import exceptions as litellm_exceptions
 
+# Incremental memory hashing: BLAKE3 when available, stdlib BLAKE2b otherwise
+try:
+    from blake3 import blake3 as _memory_hasher
+except ImportError:
+    _memory_hasher = hashlib.blake2b
+
+# orjson is 2-10x faster than the stdlib json module; fall back when missing
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps(value: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def _json_loads(data: str) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
 # Load environment variables
 load_dotenv()
 
 # Configuration
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gemini/gemini-1.5-flash")
 DEFAULT_MAX_ITERATIONS = int(os.getenv("DEFAULT_MAX_ITERATIONS", "50"))
+DEFAULT_MAX_MEMORY = int(os.getenv("DEFAULT_MAX_MEMORY", "10000"))
+DEFAULT_MAX_MEMORY_TOKENS = int(os.getenv("DEFAULT_MAX_MEMORY_TOKENS", "8000"))
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "none")  # none | memory | sqlite
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1000"))
+
+# Prompt-cache breakpoint for providers that need explicit markers
+EPHEMERAL_CACHE = {"type": "ephemeral"}
+
+# Console separators
+HEAVY_RULE = "=" * 70
+LIGHT_RULE = "─" * 70
 
 
 # ============================================================================
@@ -50,7 +93,8 @@ class Prompt:
     Attributes:
         messages: Conversation history
         tools: Available function calling tools
-        metadata: Additional context information
+        metadata: Additional context information; "digest", when set,
+            identifies messages and tools for ResponseCache.make_key
     """
     messages: List[Dict] = field(default_factory=list)
     tools: List[Dict] = field(default_factory=list)
@@ -86,6 +130,9 @@ class Action:
     to interact with the environment.
     """
     
+    __slots__ = ('name', 'function', 'description', 'parameters', 'terminal',
+                 'requires_confirmation', '_tool_dict')
+    
     def __init__(
         self,
         name: str,
@@ -112,6 +159,15 @@ class Action:
         self.parameters = parameters
         self.terminal = terminal
         self.requires_confirmation = requires_confirmation
+        # Function-calling schema, built once since actions don't change
+        self._tool_dict = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description[:1024],  # Limit description length
+                "parameters": parameters,
+            },
+        }
     
     def execute(self, **kwargs) -> Any:
         """
@@ -136,8 +192,13 @@ class ActionRegistry:
     This allows dynamic registration and retrieval of actions.
     """
     
+    __slots__ = ('actions', '_lookup', 'version')
+    
     def __init__(self):
         self.actions: Dict[str, Action] = {}
+        # Bumped on every registration so cached tool schemas can be invalidated
+        self.version = 0
+        self._lookup = self.actions.get
     
     def register(self, action: Action) -> None:
         """
@@ -147,6 +208,7 @@ class ActionRegistry:
             action: The action to register
         """
         self.actions[action.name] = action
+        self.version += 1
     
     def get_action(self, name: str) -> Optional[Action]:
         """
@@ -158,7 +220,7 @@ class ActionRegistry:
         Returns:
             The action if found, None otherwise
         """
-        return self.actions.get(name)
+        return self._lookup(name)
     
     def get_actions(self) -> List[Action]:
         """
@@ -192,10 +254,24 @@ class Memory:
     - 'assistant': Agent's decisions/reasoning
     - 'environment': Results from action execution
     - 'system': System instructions
+    
+    Items are stored as parallel bounded deques (types, contents, timestamps)
+    rather than one dict per item; dicts are rebuilt on demand. Once max_items
+    is reached the oldest items are dropped automatically.
+    
+    Memory is append-only: items are never edited in place, so each prompt
+    extends the previous one byte-for-byte and provider prompt caches can
+    reuse the shared prefix.
     """
     
-    def __init__(self):
-        self.items: List[Dict] = []
+    def __init__(self, max_items: int = DEFAULT_MAX_MEMORY):
+        self.max_items = max_items
+        self._types: deque = deque(maxlen=max_items)
+        self._contents: deque = deque(maxlen=max_items)
+        self._timestamps: deque = deque(maxlen=max_items)
+        # Any keys besides 'type'/'content' (None for the common case)
+        self._extras: deque = deque(maxlen=max_items)
+        self._hasher = _memory_hasher()
     
     def add_memory(self, memory: Dict) -> None:
         """
@@ -206,7 +282,51 @@ class Memory:
         """
         if "type" not in memory:
             raise ValueError("Memory must have a 'type' field")
-        self.items.append(memory)
+        self._types.append(memory["type"])
+        self._contents.append(memory.get("content"))
+        self._timestamps.append(time.time())
+        extras = {k: v for k, v in memory.items() if k not in ("type", "content")}
+        self._extras.append(extras or None)
+        # Feed only the new item so digest() stays O(1) per turn. Items are
+        # built with a fixed key order, so no sort_keys pass is needed (a
+        # different order could only cost a cache miss)
+        if orjson is not None:
+            data = orjson.dumps(memory, default=str)
+        else:
+            data = json.dumps(memory, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+        self._hasher.update(data + b"\n")
+    
+    def _iter_items(self, start: int = 0, stop: Optional[int] = None):
+        """Yield items in [start, stop) rebuilt as dictionaries."""
+        fields = zip(self._types, self._contents, self._extras)
+        for item_type, content, extras in islice(fields, start, stop):
+            item = {"type": item_type, "content": content}
+            if extras:
+                item.update(extras)
+            yield item
+    
+    @property
+    def items(self) -> List[Dict]:
+        """All memory items as dictionaries (oldest first)."""
+        return list(self._iter_items())
+    
+    def digest(self) -> str:
+        """
+        Get a content hash of every item added so far, suitable as a cache key.
+        
+        Returns:
+            Hex digest of the memory contents
+        """
+        return self._hasher.hexdigest()
+    
+    def iter_memories(self):
+        """
+        Iterate over memory items without building a list.
+        
+        Returns:
+            Iterator over memory items (oldest first)
+        """
+        return self._iter_items()
     
     def get_memories(self, limit: Optional[int] = None) -> List[Dict]:
         """
@@ -218,9 +338,7 @@ class Memory:
         Returns:
             List of memory items
         """
-        if limit is None:
-            return self.items
-        return self.items[:limit]
+        return list(self._iter_items(0, limit))
     
     def get_recent_memories(self, count: int = 10) -> List[Dict]:
         """
@@ -232,7 +350,9 @@ class Memory:
         Returns:
             List of recent memory items
         """
-        return self.items[-count:] if count > 0 else []
+        if count <= 0:
+            return []
+        return list(self._iter_items(max(0, len(self._types) - count)))
     
     def copy_without_system_memories(self) -> 'Memory':
         """
@@ -243,23 +363,41 @@ class Memory:
         Returns:
             New Memory object without system items
         """
-        filtered_items = [m for m in self.items if m.get("type") != "system"]
-        memory = Memory()
-        memory.items = filtered_items
+        mask = [t != "system" for t in self._types]
+        memory = Memory(self.max_items)
+        for item in compress(self._iter_items(), mask):
+            memory.add_memory(item)
         return memory
     
     def clear(self) -> None:
         """Clear all memory items."""
-        self.items = []
+        self._types.clear()
+        self._contents.clear()
+        self._timestamps.clear()
+        self._extras.clear()
+        self._hasher = _memory_hasher()
     
     def __len__(self) -> int:
-        return len(self.items)
+        return len(self._types)
 
 
 # ============================================================================
 # ENVIRONMENT
 # ============================================================================
 
+# [epoch second, formatted string] for the last timestamp produced
+_LAST_TIMESTAMP = [0, ""]
+
+
+def _timestamp() -> str:
+    """Local ISO-8601 timestamp, formatted at most once per second."""
+    now = int(time.time())
+    if now != _LAST_TIMESTAMP[0]:
+        _LAST_TIMESTAMP[0] = now
+        _LAST_TIMESTAMP[1] = time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(now))
+    return _LAST_TIMESTAMP[1]
+
+
 class Environment:
     """
     Represents the environment where the agent operates.
@@ -284,19 +422,36 @@ class Environment:
         try:
             result = action.execute(**args)
             return self.format_result(result)
+        # Keep the raw exc_info; render_traceback formats it only on demand
         except TypeError as e:
             return {
                 "tool_executed": False,
                 "error": f"Invalid arguments: {str(e)}",
-                "traceback": traceback.format_exc()
+                "traceback": None,
+                "exc_info": sys.exc_info()
             }
         except Exception as e:
             return {
                 "tool_executed": False,
                 "error": str(e),
-                "traceback": traceback.format_exc()
+                "traceback": None,
+                "exc_info": sys.exc_info()
             }
     
+    def render_traceback(self, result: Dict) -> Optional[str]:
+        """
+        Format the traceback of a failed execution, caching it in the result.
+        
+        Args:
+            result: Error dictionary returned by execute_action
+        
+        Returns:
+            The formatted traceback, or None if the result has no exception
+        """
+        if result.get("traceback") is None and result.get("exc_info"):
+            result["traceback"] = "".join(traceback.format_exception(*result["exc_info"]))
+        return result.get("traceback")
+    
     def format_result(self, result: Any) -> Dict:
         """
         Format a successful result with metadata.
@@ -310,7 +465,7 @@ class Environment:
         return {
             "tool_executed": True,
             "result": result,
-            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+            "timestamp": _timestamp()
         }
 
 
@@ -362,6 +517,15 @@ class AgentLanguage:
         raise NotImplementedError("Subclasses must implement this method")
 
 
+@functools.lru_cache(maxsize=4096)
+def _count_tokens(model: str, text: str) -> int:
+    """Token count for one message body, memoized since memory items never change."""
+    try:
+        return litellm.token_counter(model=model, text=text)
+    except Exception:
+        return len(text) // 4  # rough estimate for models litellm can't tokenize
+
+
 class AgentFunctionCallingLanguage(AgentLanguage):
     """
     Agent language using native LLM function calling.
@@ -370,25 +534,49 @@ class AgentFunctionCallingLanguage(AgentLanguage):
     instead of custom parsing.
     """
     
+    # Leading memory items always kept (task + first reply), StreamingLLM-style
+    SINK_ITEMS = 2
+    
+    def __init__(self, max_memory_tokens: int = DEFAULT_MAX_MEMORY_TOKENS,
+                 model: str = DEFAULT_MODEL):
+        """
+        Initialize the language.
+        
+        Args:
+            max_memory_tokens: Token budget for the memory part of the prompt
+            model: Model whose tokenizer is used to measure memory items
+        """
+        self.max_memory_tokens = max_memory_tokens
+        self.model = model
+        # Anthropic only reuses a cached prefix up to an explicit marker;
+        # OpenAI and Gemini cache identical prefixes automatically
+        self.uses_cache_markers = model.startswith("anthropic/")
+    
     def format_goals(self, goals: List[Goal]) -> List[Dict]:
         """
         Format goals as system messages.
         
         Args:
-            goals: List of agent goals
+            goals: List of agent goals, highest priority first (Agent sorts
+                them once at construction)
         
         Returns:
             List of message dictionaries
         """
-        # Sort by priority (higher first)
-        sorted_goals = sorted(goals, key=lambda g: g.priority, reverse=True)
-        
         sep = "\n" + "=" * 50 + "\n"
-        goal_text = "\n\n".join([
-            f"GOAL: {goal.name}{sep}{goal.description}{sep}"
-            for goal in sorted_goals
-        ])
+        parts = []
+        for goal in goals:
+            parts.extend(("GOAL: ", goal.name, sep, goal.description, sep, "\n\n"))
+        if parts:
+            parts.pop()  # no blank line after the last goal
+        goal_text = "".join(parts)
         
+        if self.uses_cache_markers:
+            # Goals end the stable prefix (tools, goals) shared by every request
+            return [{
+                "role": "system",
+                "content": [{"type": "text", "text": goal_text, "cache_control": EPHEMERAL_CACHE}],
+            }]
         return [{"role": "system", "content": goal_text}]
     
     def format_memory(self, memory: Memory) -> List[Dict]:
@@ -401,26 +589,53 @@ class AgentFunctionCallingLanguage(AgentLanguage):
         Returns:
             List of message dictionaries for the LLM
         """
-        items = memory.get_memories()
-        mapped_items = []
+        mapped_items = [None] * len(memory)
         
-        for item in items:
+        for i, item in enumerate(memory.iter_memories()):
             content = item.get("content")
             if content is None:
                 content = json.dumps(item, indent=2)
             
-            item_type = item.get("type", "user")
-            
-            # Map types to roles
-            if item_type == "assistant":
-                mapped_items.append({"role": "assistant", "content": content})
-            elif item_type == "environment":
-                # Environment results go as user messages
-                mapped_items.append({"role": "user", "content": content})
-            else:  # user, system, or other
-                mapped_items.append({"role": "user", "content": content})
+            # Assistant turns keep their role; environment results, user and
+            # system items all go as user messages
+            role = "assistant" if item.get("type") == "assistant" else "user"
+            mapped_items[i] = {"role": role, "content": content}
+        
+        return self._trim_to_budget(mapped_items)
+    
+    def _trim_to_budget(self, messages: List[Dict]) -> List[Dict]:
+        """
+        Keep the first SINK_ITEMS messages plus as many recent messages as
+        fit in max_memory_tokens, replacing the dropped middle with a note.
         
-        return mapped_items
+        Args:
+            messages: Formatted memory messages, oldest first
+        
+        Returns:
+            The messages, trimmed to the token budget
+        """
+        head = messages[:self.SINK_ITEMS]
+        rest = messages[self.SINK_ITEMS:]
+        budget = self.max_memory_tokens - sum(
+            _count_tokens(self.model, m["content"]) for m in head
+        )
+        
+        keep = 0
+        for message in reversed(rest):
+            budget -= _count_tokens(self.model, message["content"])
+            if budget < 0:
+                break
+            keep += 1
+        
+        omitted = len(rest) - keep
+        if omitted == 0:
+            return messages
+        
+        placeholder = {
+            "role": "system",
+            "content": f"[... {omitted} earlier turns omitted ...]",
+        }
+        return head + [placeholder] + rest[len(rest) - keep:]
     
     def format_actions(self, actions: List[Action]) -> List[Dict]:
         """
@@ -432,16 +647,10 @@ class AgentFunctionCallingLanguage(AgentLanguage):
         Returns:
             List of tool definitions for the LLM
         """
-        tools = []
-        for action in actions:
-            tools.append({
-                "type": "function",
-                "function": {
-                    "name": action.name,
-                    "description": action.description[:1024],  # Limit description length
-                    "parameters": action.parameters,
-                },
-            })
+        tools = [action._tool_dict for action in actions]
+        if self.uses_cache_markers and tools:
+            # Copy so the marker doesn't leak into the shared Action._tool_dict
+            tools[-1] = {**tools[-1], "cache_control": EPHEMERAL_CACHE}
         return tools
     
     def construct_prompt(
@@ -471,30 +680,238 @@ class AgentFunctionCallingLanguage(AgentLanguage):
         
         return Prompt(messages=messages, tools=tools)
     
-    def parse_response(self, response: str) -> Dict:
+    def construct_prompt_incremental(
+        self,
+        memory: Memory,
+        cached_goals: List[Dict],
+        cached_tools: List[Dict]
+    ) -> Prompt:
+        """
+        Construct a prompt from pre-formatted goals and tools.
+        
+        Goals and actions don't change during a run, so only memory needs
+        formatting on each iteration.
+        
+        Args:
+            memory: Conversation history
+            cached_goals: Output of format_goals
+            cached_tools: Output of format_actions
+        
+        Returns:
+            Complete prompt with tools
+        """
+        messages = list(cached_goals)
+        messages.extend(self.format_memory(memory))
+        return Prompt(messages=messages, tools=cached_tools)
+    
+    def parse_response(self, response: str) -> Any:
         """
         Parse function calling response.
         
         Args:
-            response: JSON string with tool and args
+            response: JSON string with tool and args, or a JSON list of
+                them for parallel tool calls
         
         Returns:
-            Parsed dictionary with 'tool' and 'args'
+            Parsed dictionary with 'tool' and 'args', or a list of them
         """
-        try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            # Fallback: treat as terminate message
-            return {
-                "tool": "terminate",
-                "args": {"message": response}
-            }
+        # Plain-text replies can't be JSON; skip the parse attempt
+        if response.lstrip().startswith(("{", "[")):
+            try:
+                return _json_loads(response)
+            except json.JSONDecodeError:
+                pass
+        
+        # Fallback: treat as terminate message
+        return {
+            "tool": "terminate",
+            "args": {"message": response}
+        }
 
 
 # ============================================================================
 # LLM INTERACTION
 # ============================================================================
 
+def _make_http_client() -> httpx.AsyncClient:
+    """
+    Build the keep-alive connection pool shared by every acompletion() call.
+    
+    HTTP/2 needs the optional 'h2' package; without it the pool still reuses
+    HTTP/1.1 connections, which is what saves the TCP+TLS handshake.
+    """
+    limits = httpx.Limits(max_keepalive_connections=20, max_connections=100)
+    try:
+        return httpx.AsyncClient(http2=True, limits=limits, timeout=60.0)
+    except ImportError:
+        return httpx.AsyncClient(limits=limits, timeout=60.0)
+
+
+async def with_http_session(coro):
+    """Await coro with one AsyncClient installed as litellm's session, then close it."""
+    async with _make_http_client() as client:
+        litellm.aclient_session = client
+        try:
+            return await coro
+        finally:
+            litellm.aclient_session = None
+
+
+class ResponseCache:
+    """
+    Cache of LLM response text keyed by a hash of the request.
+    
+    Agent loops often re-issue identical prompts; a hit skips the network
+    round-trip entirely. Off by default, since a replayed answer hides any
+    change in the files the agent looks at: LLM_CACHE_BACKEND=memory keeps
+    an in-process LRU, and LLM_CACHE_BACKEND=sqlite persists entries in a
+    WAL-mode SQLite file.
+    """
+    
+    def __init__(self, backend: str = LLM_CACHE_BACKEND, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.backend = backend
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if backend == "sqlite":
+            Path(LLM_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(Path(LLM_CACHE_DIR) / "framework_responses.sqlite3"))
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, response TEXT)")
+    
+    @staticmethod
+    def make_key(model: str, prompt: Prompt, max_tokens: int) -> str:
+        """
+        Hash the parts of a request that determine its response.
+        
+        Prompts built by Agent.construct_prompt carry a digest of their
+        messages and tools in metadata, so the conversation is not
+        re-serialized on every call; other prompts are hashed in full.
+        
+        Returns:
+            Hex digest usable as a cache key
+        """
+        digest = prompt.metadata.get("digest")
+        if digest is None:
+            payload = json.dumps([prompt.messages, prompt.tools], sort_keys=True, default=str)
+            digest = hashlib.blake2b(payload.encode("utf-8")).hexdigest()
+        return hashlib.blake2b(f"{model}\0{max_tokens}\0{digest}".encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None."""
+        if self.backend == "none":
+            return None
+        if self._db is not None:
+            row = self._db.execute("SELECT response FROM cache WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+    
+    def put(self, key: str, value: Optional[str]) -> None:
+        """Store a response, evicting the least recently used entry when full."""
+        if self.backend == "none" or value is None:
+            return
+        if self._db is not None:
+            with self._db:
+                self._db.execute("INSERT OR REPLACE INTO cache (key, response) VALUES (?, ?)", (key, value))
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+_response_cache = ResponseCache()
+
+
+def _completion_kwargs(prompt: Prompt, model: str) -> Dict:
+    """Build streaming completion() arguments; tools are only sent when there are any."""
+    kwargs = {"model": model, "messages": prompt.messages, "max_tokens": 1024, "stream": True}
+    if prompt.tools:
+        kwargs["tools"] = prompt.tools
+    return kwargs
+
+
+class _StreamAccumulator:
+    """
+    Rebuild the framework's response string from streamed completion chunks.
+    
+    Tool call arguments are collected per call index and parsed after every
+    chunk. Once every started call has complete JSON arguments and a
+    non-tool-call chunk arrives (trailing text or the finish chunk), the
+    response is ready without waiting for the rest of the stream.
+    """
+    
+    def __init__(self):
+        self.tool_names: List[Optional[str]] = []
+        self.arguments: List[io.StringIO] = []
+        self.parsed_args: List[Any] = []
+        self.text_parts: List[str] = []
+        self._decoder = json.JSONDecoder()
+    
+    def _slot(self, index: int) -> None:
+        while len(self.tool_names) <= index:
+            self.tool_names.append(None)
+            self.arguments.append(io.StringIO())
+            self.parsed_args.append(None)
+    
+    def _all_complete(self) -> bool:
+        return bool(self.tool_names) and all(
+            name and args is not None
+            for name, args in zip(self.tool_names, self.parsed_args)
+        )
+    
+    def _encode(self) -> str:
+        calls = [
+            {"tool": name, "args": args}
+            for name, args in zip(self.tool_names, self.parsed_args)
+        ]
+        return _json_dumps(calls[0] if len(calls) == 1 else calls)
+    
+    def feed(self, chunk: Any) -> Optional[str]:
+        """
+        Add one chunk.
+        
+        Returns:
+            The final response string as soon as all tool calls are complete, else None
+        """
+        if not chunk.choices:
+            return None
+        choice = chunk.choices[0]
+        delta = choice.delta
+        if delta.tool_calls:
+            for tool_delta in delta.tool_calls:
+                index = getattr(tool_delta, "index", 0) or 0
+                self._slot(index)
+                if tool_delta.function.name:
+                    self.tool_names[index] = tool_delta.function.name
+                if tool_delta.function.arguments:
+                    self.arguments[index].write(tool_delta.function.arguments)
+                    try:
+                        self.parsed_args[index], _ = self._decoder.raw_decode(
+                            self.arguments[index].getvalue()
+                        )
+                    except ValueError:
+                        self.parsed_args[index] = None
+            return None
+        if delta.content:
+            self.text_parts.append(delta.content)
+        if self._all_complete() or (self.tool_names and getattr(choice, "finish_reason", None)):
+            return self.result()
+        return None
+    
+    def result(self) -> str:
+        """Response string once the stream has ended."""
+        if self.tool_names:
+            for index, args in enumerate(self.parsed_args):
+                if args is None:
+                    self.parsed_args[index] = _json_loads(self.arguments[index].getvalue() or "{}")
+            return self._encode()
+        return "".join(self.text_parts)
+
+
 def generate_response(prompt: Prompt, model: str = DEFAULT_MODEL) -> str:
     """
     Generate a response from the LLM.
@@ -508,37 +925,62 @@ def generate_response(prompt: Prompt, model: str = DEFAULT_MODEL) -> str:
     Returns:
         Response string (JSON for function calls, text otherwise)
     """
-    messages = prompt.messages
-    tools = prompt.tools
-    
-    if not tools:
-        # Regular text completion
-        response = completion(
-            model=model,
-            messages=messages,
-            max_tokens=1024
-        )
-        return response.choices[0].message.content
-    
-    # Function calling completion
-    response = completion(
-        model=model,
-        messages=messages,
-        tools=tools,
-        max_tokens=1024
-    )
+    cache_key = ResponseCache.make_key(model, prompt, 1024)
+    cached = _response_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    # Check if LLM wants to call a function
-    if response.choices[0].message.tool_calls:
-        tool_call = response.choices[0].message.tool_calls[0]
-        result = {
-            "tool": tool_call.function.name,
-            "args": json.loads(tool_call.function.arguments),
-        }
-        return json.dumps(result)
+    stream = completion(**_completion_kwargs(prompt, model))
+    accumulator = _StreamAccumulator()
+    text = None
+    for chunk in stream:
+        text = accumulator.feed(chunk)
+        if text is not None:
+            # The sync stream wrapper has no close(); leaving the loop stops
+            # reading, and dropping the wrapper releases the response
+            break
+    if text is None:
+        text = accumulator.result()
+    _response_cache.put(cache_key, text)
+    return text
+
+
+async def agenerate_response(prompt: Prompt, model: str = DEFAULT_MODEL) -> str:
+    """
+    Async version of generate_response using litellm.acompletion.
+    
+    Args:
+        prompt: The prompt to send
+        model: Model identifier
     
-    # No function call - return text
-    return response.choices[0].message.content
+    Returns:
+        Response string (JSON for function calls, text otherwise)
+    """
+    cache_key = ResponseCache.make_key(model, prompt, 1024)
+    cached = _response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    stream = await acompletion(**_completion_kwargs(prompt, model))
+    accumulator = _StreamAccumulator()
+    text = None
+    async for chunk in stream:
+        text = accumulator.feed(chunk)
+        if text is not None:
+            # Closes the provider's HTTP response; no more tokens are read
+            await stream.aclose()
+            break
+    if text is None:
+        text = accumulator.result()
+    _response_cache.put(cache_key, text)
+    return text
+
+
+def _without_exc_info(result: Dict) -> Dict:
+    """Drop exc_info, which holds live exception objects, before serializing."""
+    if "exc_info" in result:
+        return {k: v for k, v in result.items() if k != "exc_info"}
+    return result
 
 
 # ============================================================================
@@ -563,7 +1005,9 @@ class Agent:
         action_registry: ActionRegistry,
         generate_response_fn: Callable[[Prompt], str],
         environment: Environment,
-        verbose: bool = False
+        verbose: bool = False,
+        agenerate_response_fn: Optional[Callable[[Prompt], Awaitable[str]]] = None,
+        max_memory_items: int = DEFAULT_MAX_MEMORY
     ):
         """
         Initialize an agent.
@@ -575,13 +1019,24 @@ class Agent:
             generate_response_fn: Function to call LLM
             environment: Operating environment
             verbose: Whether to print detailed logs
+            agenerate_response_fn: Async LLM function used by run_async
+                (falls back to running generate_response_fn in a thread)
+            max_memory_items: Item cap for memories the agent creates itself;
+                older items are evicted once it is reached
         """
-        self.goals = goals
+        # Sorted by priority (higher first) once, not on every prompt
+        self.goals = sorted(goals, key=lambda g: g.priority, reverse=True)
         self.agent_language = agent_language
         self.actions = action_registry
         self.generate_response = generate_response_fn
+        self.agenerate_response = agenerate_response_fn
         self.environment = environment
         self.verbose = verbose
+        self.max_memory_items = max_memory_items
+        self._prompt_cache_key = None
+        self._cached_goal_messages: List[Dict] = []
+        self._cached_tools: List[Dict] = []
+        self._cached_prefix_digest = ""
     
     def construct_prompt(
         self,
@@ -600,6 +1055,31 @@ class Agent:
         Returns:
             Complete prompt
         """
+        if hasattr(self.agent_language, "construct_prompt_incremental"):
+            # Re-format goals/tools only when they actually change
+            key = (tuple(goals), id(actions), actions.version)
+            if key != self._prompt_cache_key:
+                self._cached_goal_messages = self.agent_language.format_goals(goals)
+                self._cached_tools = self.agent_language.format_actions(actions.get_actions())
+                self._prompt_cache_key = key
+                # The memory budget changes how much history is sent, so it
+                # is part of the prompt's identity too
+                prefix = [
+                    self._cached_goal_messages,
+                    self._cached_tools,
+                    getattr(self.agent_language, "max_memory_tokens", None),
+                ]
+                self._cached_prefix_digest = hashlib.blake2b(
+                    json.dumps(prefix, sort_keys=True, default=str).encode("utf-8")
+                ).hexdigest()
+            prompt = self.agent_language.construct_prompt_incremental(
+                memory, self._cached_goal_messages, self._cached_tools
+            )
+            # Messages are a function of the memory items, so the running
+            # memory digest stands in for hashing them on every call. The
+            # length pins down which items are still held after eviction.
+            prompt.metadata["digest"] = f"{self._cached_prefix_digest}:{len(memory)}:{memory.digest()}"
+            return prompt
         return self.agent_language.construct_prompt(
             actions=actions.get_actions(),
             environment=self.environment,
@@ -607,31 +1087,37 @@ class Agent:
             memory=memory
         )
     
-    def get_action(self, response: str) -> tuple[Optional[Action], Dict]:
+    def get_action(self, response: str) -> List[tuple[Optional[Action], Dict]]:
         """
-        Parse response and retrieve the corresponding action.
+        Parse response and retrieve the corresponding actions.
+        
+        A response holds one invocation, or a list of them when the LLM
+        made several tool calls at once.
         
         Args:
             response: LLM response string
         
         Returns:
-            Tuple of (Action object, invocation dictionary)
+            List of (Action object, invocation dictionary) tuples
         """
-        invocation = self.agent_language.parse_response(response)
-        action = self.actions.get_action(invocation["tool"])
-        return action, invocation
+        invocations = self.agent_language.parse_response(response)
+        if isinstance(invocations, dict):
+            invocations = [invocations]
+        return [
+            (self.actions.get_action(invocation["tool"]), invocation)
+            for invocation in invocations
+        ]
     
-    def should_terminate(self, response: str) -> bool:
+    def should_terminate(self, action: Optional[Action]) -> bool:
         """
         Check if the agent should stop.
         
         Args:
-            response: LLM response
+            action: Action parsed from the LLM response this iteration
         
         Returns:
             True if agent should terminate
         """
-        action, _ = self.get_action(response)
         return action is not None and action.terminal
     
     def set_current_task(self, memory: Memory, task: str) -> None:
@@ -654,7 +1140,7 @@ class Agent:
             result: Execution result
         """
         memory.add_memory({"type": "assistant", "content": response})
-        memory.add_memory({"type": "environment", "content": json.dumps(result)})
+        memory.add_memory({"type": "environment", "content": _json_dumps(_without_exc_info(result))})
     
     def run(
         self,
@@ -665,6 +1151,9 @@ class Agent:
         """
         Execute the agent loop (GAME cycle).
         
+        Synchronous entry point; runs run_async on a fresh event loop, with
+        one keep-alive connection pool shared by its LLM calls.
+        
         Args:
             user_input: User's task
             memory: Existing memory (or creates new)
@@ -673,68 +1162,129 @@ class Agent:
         Returns:
             Final memory state
         """
-        memory = memory or Memory()
+        return asyncio.run(with_http_session(self.run_async(user_input, memory, max_iterations)))
+    
+    async def _agenerate(self, prompt: Prompt) -> str:
+        if self.agenerate_response is not None:
+            return await self.agenerate_response(prompt)
+        return await asyncio.to_thread(self.generate_response, prompt)
+    
+    async def run_async(
+        self,
+        user_input: str,
+        memory: Optional[Memory] = None,
+        max_iterations: int = DEFAULT_MAX_ITERATIONS
+    ) -> Memory:
+        """
+        Execute the agent loop (GAME cycle) without blocking the event loop.
+        
+        The LLM call is awaited and actions run in a worker thread, so several
+        agents can make progress concurrently on one event loop.
+        
+        Args:
+            user_input: User's task
+            memory: Existing memory (or creates new)
+            max_iterations: Maximum loop iterations
+        
+        Returns:
+            Final memory state
+        """
+        # Memory defines __len__, so an empty one is falsy; test for None
+        if memory is None:
+            memory = Memory(max_items=self.max_memory_items)
         self.set_current_task(memory, user_input)
         
-        print("\n" + "=" * 70)
-        print("🤖 AGENT FRAMEWORK (GAME Architecture)")
-        print("=" * 70)
-        print(f"📋 Task: {user_input}")
-        print(f"🎯 Goals: {len(self.goals)}")
-        print(f"🔧 Actions: {len(self.actions.get_actions())}")
-        print(f"🔄 Max iterations: {max_iterations}\n")
+        # Output is collected per iteration and written in one call; the
+        # buffer is also flushed before waiting on the LLM so progress shows
+        lines: List[str] = []
+        emit = lines.append
+        
+        def flush() -> None:
+            if lines:
+                sys.stdout.write("\n".join(lines) + "\n")
+                sys.stdout.flush()
+                lines.clear()
+        
+        emit("\n" + HEAVY_RULE)
+        emit("🤖 AGENT FRAMEWORK (GAME Architecture)")
+        emit(HEAVY_RULE)
+        emit(f"📋 Task: {user_input}")
+        emit(f"🎯 Goals: {len(self.goals)}")
+        emit(f"🔧 Actions: {len(self.actions.get_actions())}")
+        emit(f"🔄 Max iterations: {max_iterations}\n")
         
         for iteration in range(max_iterations):
-            print(f"{'─' * 70}")
-            print(f"Iteration {iteration + 1}/{max_iterations}")
-            print(f"{'─' * 70}")
+            emit(LIGHT_RULE)
+            emit(f"Iteration {iteration + 1}/{max_iterations}")
+            emit(LIGHT_RULE)
             
             # Construct prompt
             prompt = self.construct_prompt(self.goals, memory, self.actions)
             
             # Generate response
-            print("🧠 Agent thinking...")
+            response_task = asyncio.create_task(self._agenerate(prompt))
+            emit("🧠 Agent thinking...")
+            flush()
             try:
-                response = self.generate_response(prompt)
+                response = await response_task
             except Exception as e:
-                print(f"❌ Error generating response: {e}")
+                emit(f"❌ Error generating response: {e}")
                 break
             
             if self.verbose:
-                print(f"📝 Full response:\n{response}\n")
+                emit(f"📝 Full response:\n{response}\n")
             
-            # Parse action
-            action, invocation = self.get_action(response)
+            # Parse actions
+            calls = self.get_action(response)
             
-            if action is None:
-                print(f"❌ Unknown action: {invocation.get('tool', 'unknown')}")
+            unknown = [invocation for action, invocation in calls if action is None]
+            if unknown:
+                emit(f"❌ Unknown action: {unknown[0].get('tool', 'unknown')}")
                 break
             
-            print(f"🔧 Action: {action.name}")
-            if invocation.get("args"):
-                print(f"   Args: {invocation['args']}")
+            for action, invocation in calls:
+                emit(f"🔧 Action: {action.name}")
+                if invocation.get("args"):
+                    emit(f"   Args: {invocation['args']}")
             
-            # Execute action
-            result = self.environment.execute_action(action, invocation["args"])
+            # Execute actions; independent calls from one response run in parallel
+            results = await asyncio.gather(*(
+                asyncio.to_thread(self.environment.execute_action, action, invocation["args"])
+                for action, invocation in calls
+            ))
             
-            # Display result
-            if result.get("tool_executed"):
-                print(f"✅ Result: {result.get('result', 'Success')}")
-            else:
-                print(f"❌ Error: {result.get('error', 'Unknown error')}")
-                if self.verbose and "traceback" in result:
-                    print(f"Traceback:\n{result['traceback']}")
+            # Display results
+            for result in results:
+                if result.get("tool_executed"):
+                    emit(f"✅ Result: {result.get('result', 'Success')}")
+                else:
+                    emit(f"❌ Error: {result.get('error', 'Unknown error')}")
+                    if self.verbose and "exc_info" in result:
+                        emit(f"Traceback:\n{self.environment.render_traceback(result)}")
             
             # Update memory
+            if len(calls) == 1:
+                result = results[0]
+            else:
+                result = {
+                    "tool_executed": all(r.get("tool_executed") for r in results),
+                    "results": [
+                        {"tool": action.name, **_without_exc_info(r)}
+                        for (action, _), r in zip(calls, results)
+                    ],
+                }
             self.update_memory(memory, response, result)
             
             # Check termination
-            if self.should_terminate(response):
-                print("\n" + "=" * 70)
-                print("✅ AGENT COMPLETED TASK")
-                print("=" * 70)
+            if any(action.terminal for action, _ in calls):
+                emit("\n" + HEAVY_RULE)
+                emit("✅ AGENT COMPLETED TASK")
+                emit(HEAVY_RULE)
                 break
+            
+            flush()
         
+        flush()
         return memory
 
 
@@ -767,7 +1317,8 @@ def create_file_agent() -> Agent:
     # Define actions
     def list_project_files() -> List[str]:
         """List all Python files in current directory."""
-        return sorted([f for f in os.listdir(".") if f.endswith(".py")])
+        with os.scandir(".") as entries:
+            return sorted(e.name for e in entries if e.name.endswith(".py") and e.is_file())
     
     def read_project_file(name: str) -> str:
         """Read a project file."""
@@ -841,7 +1392,8 @@ def create_file_agent() -> Agent:
         agent_language=agent_language,
         action_registry=action_registry,
         generate_response_fn=generate_response,
-        environment=environment
+        environment=environment,
+        agenerate_response_fn=agenerate_response
     )
 
 
@@ -0,0 +1,232 @@
+"""
+Agent Loop Helpers
+
+Shared by agent_loop_with_function_calling.py and
+agent_loop_with_function_calling2.py: fast JSON, the compact GLYPH format for
+tool payloads in memory, client-side rate limiting, memory compaction,
+streamed completions and tool dispatch.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import re
+import time
+from typing import Callable, List, Dict
+
+from litellm import acompletion, get_supported_openai_params, token_counter
+
+# orjson is several times faster than the stdlib json module; use it when installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def json_dumps(value) -> str:
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+# Compact GLYPH-style serialization for tool payloads in memory. JSON quoting
+# and punctuation make up a large share of the tokens for structured results;
+# {key=value ...} carries the same information in far fewer tokens.
+_BARE_TOKEN = re.compile(r"^[A-Za-z_./][A-Za-z0-9_./-]*$")
+
+def to_glyph(value) -> str:
+    """Serialize a JSON-compatible value as {key=value ...} / [item ...]."""
+    if isinstance(value, dict):
+        return "{" + " ".join(f"{to_glyph(str(k))}={to_glyph(v)}" for k, v in value.items()) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + " ".join(to_glyph(v) for v in value) + "]"
+    if isinstance(value, str):
+        if _BARE_TOKEN.match(value) and value not in ("true", "false", "null"):
+            return value
+        return json_dumps(value)
+    return json_dumps(value)
+
+
+def cached_prompt_tokens(usage) -> int:
+    """Return how many prompt tokens the provider served from its cache."""
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+# The tool schemas never change while a script runs: each list is serialized
+# and counted once rather than on every turn. Keyed by id(); the list itself
+# is kept alongside so the id cannot be reused.
+_tools_tokens: Dict[int, tuple] = {}
+
+def tools_tokens(model: str, tools: List[Dict]) -> int:
+    """Token cost of sending the tools list to model."""
+    entry = _tools_tokens.get(id(tools))
+    if entry is None:
+        entry = _tools_tokens[id(tools)] = (tools, token_counter(model=model, text=json_dumps(tools)))
+    return entry[1]
+
+# Client-side rate limiting: one token bucket for requests per minute and one
+# for tokens per minute, so bursts wait briefly here instead of tripping the
+# provider's RateLimitError and its much longer backoff.
+LLM_RPM = int(os.getenv("LLM_RPM", "60"))
+LLM_TPM = int(os.getenv("LLM_TPM", "100000"))
+
+class AsyncTokenBucket:
+    """Token bucket refilled continuously at capacity/period units per second."""
+
+    def __init__(self, capacity: float, period: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until `amount` units are available, then take them."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """Return units that were reserved but not used."""
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+_request_bucket = AsyncTokenBucket(LLM_RPM)
+_token_bucket = AsyncTokenBucket(LLM_TPM)
+
+async def _reserve_tokens(kwargs: Dict) -> int:
+    """Wait for one request and prompt tokens + max_tokens; return the tokens reserved."""
+    reserved = token_counter(model=kwargs["model"], messages=kwargs["messages"]) + kwargs.get("max_tokens", 0)
+    if kwargs.get("tools"):
+        reserved += tools_tokens(kwargs["model"], kwargs["tools"])
+    await _request_bucket.acquire()
+    await _token_bucket.acquire(reserved)
+    return reserved
+
+def _refund_unused(reserved: int, usage) -> None:
+    """Give back the part of a reservation that usage shows was not consumed."""
+    used = getattr(usage, "total_tokens", None)
+    if used is not None and used < reserved:
+        _token_bucket.refund(reserved - used)
+
+async def rate_limited_acompletion(**kwargs):
+    """acompletion() gated by the RPM and TPM buckets.
+
+    Reserves prompt tokens + max_tokens up front, then refunds whatever the
+    response's usage shows was not consumed.
+    """
+    reserved = await _reserve_tokens(kwargs)
+    response = await acompletion(**kwargs)
+    _refund_unused(reserved, getattr(response, "usage", None))
+    return response
+
+
+# Memory compaction: every turn re-sends the whole history, so once it grows
+# past MAX_CONTEXT_TOKENS the older turns are replaced by a short summary.
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "8000"))
+KEEP_RECENT_MESSAGES = 6  # last three assistant/result pairs stay verbatim
+
+async def maybe_compact(memory: List[Dict], model: str, tools: List[Dict],
+                        max_tokens: int = MAX_CONTEXT_TOKENS,
+                        keep: int = KEEP_RECENT_MESSAGES) -> List[Dict]:
+    """Summarize older turns when memory plus tool schemas exceed max_tokens.
+
+    The original task (memory[0]) and the last `keep` messages are kept as-is.
+    """
+    if len(memory) <= keep + 2:
+        return memory
+    if tools_tokens(model, tools) + token_counter(model=model, messages=memory) <= max_tokens:
+        return memory
+    task, old, recent = memory[0], memory[1:-keep], memory[-keep:]
+    response = await rate_limited_acompletion(
+        model=model,
+        messages=[{"role": "user", "content": "Summarize prior tool interactions:\n" + json_dumps(old)}],
+        max_tokens=256
+    )
+    summary = response.choices[0].message.content
+    return [task, {"role": "system", "content": "Prior context: " + summary}, *recent]
+
+
+def _is_complete_json(text: str) -> bool:
+    try:
+        json_loads(text)
+        return True
+    except ValueError:
+        return False
+
+async def _collect_stream(stream) -> tuple[str, List[Dict], object]:
+    """Accumulate a streamed completion into (content, tool_calls, usage).
+
+    Text is printed as it arrives. As soon as a complete "terminate" call has
+    streamed in, the stream is closed so no further output tokens are spent.
+    """
+    content_parts: List[str] = []
+    calls: Dict[int, Dict] = {}
+    usage = None
+    async for chunk in stream:
+        usage = getattr(chunk, "usage", None) or usage
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            if not content_parts:
+                print("Response: ", end="")
+            print(delta.content, end="", flush=True)
+            content_parts.append(delta.content)
+        for tool_delta in delta.tool_calls or []:
+            call = calls.setdefault(tool_delta.index or 0, {"name": "", "arguments": ""})
+            if tool_delta.function.name:
+                call["name"] = tool_delta.function.name
+            if tool_delta.function.arguments:
+                call["arguments"] += tool_delta.function.arguments
+        first = calls.get(0)
+        if first and first["name"] == "terminate" and _is_complete_json(first["arguments"]):
+            # litellm's stream wrapper closes the provider's HTTP response here
+            await stream.aclose()
+            break
+    if content_parts:
+        print()
+    return "".join(content_parts), [calls[i] for i in sorted(calls)], usage
+
+@functools.lru_cache(maxsize=None)
+def _supports_stream_usage(model: str) -> bool:
+    """Whether model's provider accepts stream_options (without it litellm raises)."""
+    return "stream_options" in (get_supported_openai_params(model=model) or [])
+
+async def rate_limited_astream(**kwargs) -> tuple[str, List[Dict], object]:
+    """Streaming counterpart of rate_limited_acompletion; returns _collect_stream()'s result.
+
+    A stream carries its usage only in the final chunk, so the refund happens
+    once the stream has been drained. A stream closed early on terminate, or
+    from a provider that can't report usage on a stream, keeps its full
+    reservation.
+    """
+    reserved = await _reserve_tokens(kwargs)
+    if _supports_stream_usage(kwargs["model"]):
+        kwargs["stream_options"] = {"include_usage": True}
+    stream = await acompletion(**kwargs, stream=True)
+    content, tool_calls, usage = await _collect_stream(stream)
+    _refund_unused(reserved, usage)
+    return content, tool_calls, usage
+
+
+async def execute_tool(tool_functions: Dict[str, Callable], tool_name: str, tool_args: Dict) -> Dict:
+    """Run a tool in a worker thread so file I/O doesn't block the event loop."""
+    if tool_name not in tool_functions:
+        return {"error": f"Unknown tool: {tool_name}"}
+    try:
+        return {"result": await asyncio.to_thread(tool_functions[tool_name], **tool_args)}
+    except Exception as e:
+        return {"error":f"Error executing {tool_name}: {str(e)}"}
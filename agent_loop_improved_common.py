@@ -0,0 +1,472 @@
+"""
+Improved Agent Loop Helpers
+
+Shared by agent_loop_with_function_calling_improved.py and
+agent_loop_with_function_calling2_improved.py: fast JSON, the pooled HTTP
+session, the directory listing and tool result caches, memory compaction,
+streamed tool calls, stuck-loop detection and the agent loop itself. Each
+script supplies its own tools, system prompt and result display.
+
+litellm (and httpx) is imported where a model is actually called, so
+importing this module stays fast.
+"""
+
+import asyncio
+import fnmatch
+import functools
+import json
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Dict, Any, Callable, Optional, Tuple
+
+if TYPE_CHECKING:
+    import httpx
+
+# orjson is several times faster than the stdlib json module; use it when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def json_dumps(value, sort_keys: bool = False) -> str:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, sort_keys=sort_keys)
+
+
+def _make_http_client() -> "httpx.AsyncClient":
+    """
+    Build the keep-alive connection pool shared by every acompletion() call.
+    
+    HTTP/2 needs the optional 'h2' package; without it the pool still reuses
+    HTTP/1.1 connections, which is what saves the TCP+TLS handshake.
+    """
+    import httpx  # installed with litellm
+    
+    limits = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+    try:
+        return httpx.AsyncClient(http2=True, limits=limits, timeout=60.0)
+    except ImportError:
+        return httpx.AsyncClient(limits=limits, timeout=60.0)
+
+
+async def with_http_session(coro):
+    """Await coro with one AsyncClient installed as litellm's session, then close it."""
+    import litellm
+    
+    async with _make_http_client() as client:
+        litellm.aclient_session = client
+        try:
+            return await coro
+        finally:
+            litellm.aclient_session = None
+
+
+HEAVY_RULE = "=" * 70
+LIGHT_RULE = "─" * 70
+ITERATION_HEADER = f"{LIGHT_RULE}\nIteration {{}}/{{}}\n{LIGHT_RULE}"
+TOOL_CACHE_MAX_ENTRIES = 128
+KEEP_RECENT_TURNS = 6
+SUMMARY_PREFIX = "[Prior actions summary]:\n"
+STUCK_HINT = (
+    "You appear to be repeating yourself with no new information. "
+    "Call terminate with a summary of what you found."
+)
+# The agent counts as stuck after this many identical tool-call turns in a
+# row, or this many failed tool calls in a row
+STUCK_REPEAT_LIMIT = 3
+STUCK_ERROR_LIMIT = 3
+
+DIR_CACHE_MAX_ENTRIES = 256
+
+# Directory listings keyed by (directory, [pattern,] mtime_ns). Adding or
+# removing an entry bumps the directory's mtime, so stale keys never match.
+_DIR_CACHE: "OrderedDict[Tuple, List[str]]" = OrderedDict()
+_dir_cache_lock = threading.Lock()
+
+
+# ============================================================================
+# DIRECTORY LISTINGS
+# ============================================================================
+
+def _dir_cache_get(key: Tuple) -> Optional[List[str]]:
+    with _dir_cache_lock:
+        listing = _DIR_CACHE.get(key)
+        if listing is not None:
+            _DIR_CACHE.move_to_end(key)
+        return listing
+
+
+def _dir_cache_put(key: Tuple, listing: List[str]) -> None:
+    with _dir_cache_lock:
+        _DIR_CACHE[key] = listing
+        if len(_DIR_CACHE) > DIR_CACHE_MAX_ENTRIES:
+            _DIR_CACHE.popitem(last=False)
+
+
+def list_dir_files(directory: str, st: os.stat_result) -> List[str]:
+    """
+    Sorted names of the regular files in directory.
+    
+    Args:
+        directory: Directory to list
+        st: Its os.stat() result; the mtime keys the listing cache
+    
+    Returns:
+        A new list (callers may modify it)
+    """
+    key = (os.path.abspath(directory), st.st_mtime_ns)
+    items = _dir_cache_get(key)
+    if items is None:
+        # DirEntry.is_file() uses the type from the directory read, no stat()
+        with os.scandir(directory) as entries:
+            items = sorted(entry.name for entry in entries if entry.is_file())
+        _dir_cache_put(key, items)
+    return list(items)
+
+
+@functools.lru_cache(maxsize=128)
+def _glob_regex(pattern: str) -> "re.Pattern[str]":
+    """Compile a flat glob pattern once; later searches reuse the regex."""
+    return re.compile(fnmatch.translate(pattern))
+
+
+def glob_dir_files(directory: str, pattern: str, mtime_ns: int) -> List[str]:
+    """
+    Sorted names of the files in directory matching a glob pattern.
+    
+    Args:
+        directory: Directory to search
+        pattern: Glob pattern (e.g., "*.py", "src/*.py")
+        mtime_ns: The directory's st_mtime_ns; keys the listing cache
+    
+    Returns:
+        A new list (callers may modify it)
+    """
+    if "/" in pattern or os.sep in pattern or "**" in pattern:
+        # The directory's mtime says nothing about changes inside
+        # subdirectories, so these are never cached
+        return sorted(p.name for p in Path(directory).glob(pattern) if p.is_file())
+    key = (os.path.abspath(directory), pattern, mtime_ns)
+    matches = _dir_cache_get(key)
+    if matches is None:
+        # Flat pattern: one scandir pass, no per-entry stat(). Like
+        # Path.glob, wildcards also match hidden (dot) files.
+        match = _glob_regex(pattern).match
+        with os.scandir(directory) as entries:
+            matches = sorted(
+                entry.name for entry in entries
+                if match(entry.name) and entry.is_file()
+            )
+        _dir_cache_put(key, matches)
+    return list(matches)
+
+
+# ============================================================================
+# AGENT EXECUTION
+# ============================================================================
+
+# Guards every per-run tool_cache: execute_tool runs in worker threads, and
+# concurrent OrderedDict mutation (move_to_end/popitem) is not thread-safe
+_tool_cache_lock = threading.Lock()
+
+
+def tool_cache_get(cache: "OrderedDict[str, Any]", key: str) -> Any:
+    """Return the cached result for key (marking it recently used), or None."""
+    with _tool_cache_lock:
+        result = cache.get(key)
+        if result is not None:
+            cache.move_to_end(key)
+        return result
+
+
+def tool_cache_put(cache: "OrderedDict[str, Any]", key: str, result: Any) -> None:
+    with _tool_cache_lock:
+        cache[key] = result
+        if len(cache) > TOOL_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+
+
+def _is_tool_error(result: Dict) -> bool:
+    """True for a failed call: an 'error' key, or a tool's own "Error: ..." message."""
+    if "error" in result:
+        return True
+    data = result.get("result")
+    if isinstance(data, list) and len(data) == 1:
+        data = data[0]
+    elif isinstance(data, dict) and len(data) == 1:
+        return "error" in data
+    return isinstance(data, str) and data.startswith("Error")
+
+
+def summarize_tool_output(content: str) -> str:
+    """Shorten a serialized tool result for the prior-actions summary."""
+    return content if len(content) <= 100 else f"{content[:100]}... ({len(content)} characters)"
+
+
+def compact_memory(
+    memory: List[Dict],
+    keep_turns: int = KEEP_RECENT_TURNS,
+    summarize: Callable[[str], str] = summarize_tool_output
+) -> None:
+    """
+    Fold older tool turns into one summary message, in place.
+    
+    The system prompt, the task and the last keep_turns assistant turns
+    (each with its tool results) are kept verbatim; everything in between
+    becomes a single "[Prior actions summary]" user message, one line per
+    tool call. An existing summary is extended rather than replaced.
+    
+    Args:
+        memory: Conversation messages, modified in place
+        keep_turns: Number of recent assistant turns to keep verbatim
+        summarize: Shortens one serialized tool result for its summary line
+    """
+    head, rest = memory[:2], memory[2:]
+    lines: List[str] = []
+    if rest and rest[0]["role"] == "user" and rest[0]["content"].startswith(SUMMARY_PREFIX):
+        lines.append(rest[0]["content"][len(SUMMARY_PREFIX):])
+        rest = rest[1:]
+    
+    turn_starts = [i for i, message in enumerate(rest) if message["role"] == "assistant"]
+    if len(turn_starts) <= keep_turns:
+        return
+    cut = turn_starts[-keep_turns]
+    
+    outputs = {m["tool_call_id"]: m["content"] for m in rest[:cut] if m["role"] == "tool"}
+    for message in rest[:cut]:
+        for call in message.get("tool_calls") or []:
+            function = call["function"]
+            output = summarize(outputs.get(call["id"], ""))
+            lines.append(f"- {function['name']}({function['arguments']}) -> {output}")
+    
+    memory[:] = head + [{"role": "user", "content": SUMMARY_PREFIX + "\n".join(lines)}] + rest[cut:]
+
+
+async def _stream_tool_calls(stream, dispatch: Callable[[str, Dict], "asyncio.Task"]) -> Tuple[str, List[Dict]]:
+    """
+    Drain a streamed completion, starting each tool call as soon as its
+    arguments are complete JSON instead of after the whole response.
+    
+    Args:
+        stream: Async iterator from acompletion(..., stream=True)
+        dispatch: Starts a tool call and returns its task
+    
+    Returns:
+        (text content, tool calls); each call is a dict with id, name,
+        arguments (raw JSON), args (parsed) and the running task
+    """
+    content_parts: List[str] = []
+    calls: Dict[int, Dict] = {}
+    
+    def start(call: Dict) -> None:
+        call["args"] = json_loads(call["arguments"] or "{}")
+        call["task"] = dispatch(call["name"], call["args"])
+    
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content_parts.append(delta.content)
+        for tool_delta in delta.tool_calls or []:
+            call = calls.setdefault(
+                tool_delta.index or 0,
+                {"id": None, "name": "", "arguments": "", "task": None},
+            )
+            if getattr(tool_delta, "id", None):
+                call["id"] = tool_delta.id
+            if tool_delta.function.name:
+                call["name"] = tool_delta.function.name
+            if tool_delta.function.arguments:
+                call["arguments"] += tool_delta.function.arguments
+            if call["task"] is None and call["name"] and call["arguments"]:
+                try:
+                    start(call)
+                except ValueError:
+                    pass  # arguments still streaming in
+    
+    for index, call in calls.items():
+        if call["id"] is None:
+            call["id"] = f"call_{index}"
+        if call["task"] is None:
+            start(call)
+    return "".join(content_parts), [calls[index] for index in sorted(calls)]
+
+
+async def run_agent_loop(
+    task: str,
+    *,
+    model: str,
+    max_iterations: int,
+    verbose: bool,
+    title: str,
+    tools_line: str,
+    tools: List[Dict],
+    system_message: Dict[str, str],
+    execute_tool: Callable[[str, Dict, bool, "OrderedDict[str, Any]"], Dict],
+    show_result: Callable[[Any, Callable[[str], None], bool], None],
+    max_arg_chars: Optional[int] = None,
+    summarize: Callable[[str], str] = summarize_tool_output
+) -> None:
+    """
+    Run the agent loop with native function calling.
+    
+    Args:
+        task: User's task description
+        model: LLM model to use
+        max_iterations: Maximum loop iterations
+        verbose: Whether to print detailed output
+        title: Banner shown at the start of the run
+        tools_line: Banner line describing the available tools
+        tools: Tool definitions for the LLM
+        system_message: First message of the run's memory
+        execute_tool: Runs one call as execute_tool(name, args, verbose, cache),
+            in a worker thread
+        show_result: Displays a successful call's result as
+            show_result(result_data, emit, verbose)
+        max_arg_chars: Truncate each displayed argument to this many characters
+        summarize: Shortens a tool result for the prior-actions summary
+    """
+    # Output is buffered and written once before each wait on the LLM or
+    # tools (and once at the end) instead of one write per line
+    from litellm import acompletion
+    
+    lines: List[str] = []
+    emit = lines.append
+    
+    def flush() -> None:
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+            lines.clear()
+    
+    emit(f"\n{HEAVY_RULE}\n🤖 {title}\n{HEAVY_RULE}")
+    emit(f"\n📋 Task: {task}")
+    emit(tools_line)
+    emit(f"🔄 Max iterations: {max_iterations}\n")
+    
+    # Initialize conversation memory
+    memory = [
+        system_message,
+        {"role": "user", "content": task}
+    ]
+    
+    # Results of earlier tool calls in this run (terminate is never cached)
+    tool_cache: "OrderedDict[str, Any]" = OrderedDict()
+    # Stuck-loop signals: the same tool calls (names and arguments) turn
+    # after turn, and tool calls failing one after another
+    last_calls: Optional[str] = None
+    repeat_count = 0
+    error_streak = 0
+    hinted = False
+    
+    iteration = 0
+    
+    # Main agent loop
+    while iteration < max_iterations:
+        iteration += 1
+        
+        emit(ITERATION_HEADER.format(iteration, max_iterations))
+        
+        # Call LLM with function calling
+        emit("🧠 Agent thinking...")
+        flush()
+        
+        try:
+            stream = await acompletion(
+                model=model,
+                messages=memory,
+                tools=tools,
+                max_tokens=1024,
+                stream=True
+            )
+            # Tools start while the rest of the response is still streaming
+            content, tool_calls = await _stream_tool_calls(
+                stream,
+                lambda name, args: asyncio.create_task(
+                    asyncio.to_thread(execute_tool, name, args, verbose, tool_cache)
+                ),
+            )
+        except Exception as e:
+            emit(f"❌ Error calling LLM: {e}")
+            break
+        
+        # Check if LLM wants to call a function
+        if not tool_calls:
+            # No tool call - just text response
+            emit(f"💬 Agent response: {content}")
+            break
+        
+        for call in tool_calls:
+            emit(f"🔧 Tool: {call['name']}")
+            tool_args = call["args"]
+            if tool_args:
+                args_str = ", ".join(f"{k}={repr(v)[:max_arg_chars]}" for k, v in tool_args.items())
+                emit(f"   Args: {args_str}")
+        
+        flush()
+        
+        # Wait for the tools, which run concurrently in worker threads
+        results = await asyncio.gather(*(call["task"] for call in tool_calls))
+        
+        # Display results
+        for result in results:
+            if "error" in result:
+                emit(f"❌ Error: {result['error']}")
+                continue
+            show_result(result["result"], emit, verbose)
+        
+        # Check for termination
+        if any(result.get("terminated") for result in results):
+            emit(f"\n{HEAVY_RULE}\n✅ AGENT COMPLETED TASK\n{HEAVY_RULE}")
+            break
+        
+        # Update conversation memory with the tool calls and one tool
+        # message per result, linked by tool_call_id
+        memory.append({
+            "role": "assistant",
+            "content": content or None,
+            "tool_calls": [
+                {
+                    "id": call["id"],
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": call["arguments"]},
+                }
+                for call in tool_calls
+            ],
+        })
+        memory.extend(
+            {"role": "tool", "tool_call_id": call["id"], "content": json_dumps(result)}
+            for call, result in zip(tool_calls, results)
+        )
+        compact_memory(memory, summarize=summarize)
+        
+        calls_key = json_dumps([[call["name"], call["args"]] for call in tool_calls], sort_keys=True)
+        repeat_count = repeat_count + 1 if calls_key == last_calls else 1
+        last_calls = calls_key
+        for result in results:
+            error_streak = error_streak + 1 if _is_tool_error(result) else 0
+        if repeat_count >= STUCK_REPEAT_LIMIT or error_streak >= STUCK_ERROR_LIMIT:
+            if hinted:
+                emit("⚠️  Agent still stuck after a hint; stopping to avoid a loop")
+                break
+            emit("⚠️  Repeated tool calls or errors detected; asking the agent to wrap up")
+            memory.append({"role": "user", "content": STUCK_HINT})
+            hinted = True
+            repeat_count = error_streak = 0
+    
+    if iteration >= max_iterations:
+        emit(f"\n{HEAVY_RULE}\n⚠️  MAXIMUM ITERATIONS REACHED\n{HEAVY_RULE}")
+        emit("The agent may not have completed the task.")
+    
+    flush()
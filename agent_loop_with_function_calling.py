@@ -6,8 +6,8 @@ except ModuleNotFoundError:
 import os
 import json
 import argparse
+import asyncio
 import time
-from litellm import completion
 from litellm import exceptions as litellm_exceptions
 
 # Load environment variables from .env file
@@ -19,7 +19,14 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("GEMINI_API_KEY not found. Make sure it's in your .env file!")
 
-from litellm import completion
+from agent_loop_common import (
+    cached_prompt_tokens,
+    execute_tool,
+    json_loads,
+    maybe_compact,
+    rate_limited_astream,
+    to_glyph,
+)
 from typing import List, Dict
 
 
@@ -84,65 +91,84 @@ tools = [
     }
 ]
 
-agent_rules = [{
-    "role": "system",
-    "content": """
+# Static prompt prefix: built once at import and never mutated, so the provider
+# sees byte-identical system + tools on every turn and can serve them from its
+# prompt cache. OpenAI caches identical prefixes automatically; Anthropic needs
+# an explicit cache_control marker on the last system content block.
+SYSTEM_PROMPT = """
 You are an AI agent that can perform tasks by using available tools.
 
 If a user asks about files, documents, or content, first list the files before reading them.
 
 When you are done, terminate the conversation by using the "terminate" tool and I will provide the results to the user.
-"""
-}]
-
-# Initialize agent parameters
-iterations = 0
-max_iterations = 10
-
-user_task = input("What would you like me to do? ")
 
-memory = [{"role": "user", "content": user_task}]
-
-# The Agent Loop
-while iterations < max_iterations:
-
-    messages = agent_rules + memory
-
-    response = completion(
-        model=DEFAULT_MODEL,
-        messages=messages,
-        tools=tools,
-        max_tokens=1024
-    )
+Tool calls and results in the conversation are written in a compact format:
+{key=value ...} is an object, [a b c] is a list, and quoted strings are JSON strings.
+"""
 
-    if response.choices[0].message.tool_calls:
-        tool = response.choices[0].message.tool_calls[0]
-        tool_name = tool.function.name
-        tool_args = json.loads(tool.function.arguments)
+if DEFAULT_MODEL.startswith("anthropic/"):
+    SYSTEM_BLOCK = {
+        "role": "system",
+        "content": [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+    }
+else:
+    SYSTEM_BLOCK = {"role": "system", "content": SYSTEM_PROMPT}
+
+
+
+
+async def run_agent_loop(user_task: str, max_iterations: int = 10) -> None:
+    """The Agent Loop: LLM -> tool -> LLM until terminate or max_iterations."""
+    iterations = 0
+    memory = [{"role": "user", "content": user_task}]
+
+    while iterations < max_iterations:
+        iterations += 1
+
+        memory = await maybe_compact(memory, DEFAULT_MODEL, tools)
+
+        # Dynamic memory is strictly appended after the static prefix
+        messages = [SYSTEM_BLOCK, *memory]
+
+        content, tool_calls, usage = await rate_limited_astream(
+            model=DEFAULT_MODEL,
+            messages=messages,
+            tools=tools,
+            max_tokens=1024
+        )
+
+        cached = cached_prompt_tokens(usage)
+        if cached:
+            print(f"Prompt cache hit: {cached} tokens")
+
+        if tool_calls:
+            actions = [
+                {"tool_name": tool["name"], "args": json_loads(tool["arguments"] or "{}")}
+                for tool in tool_calls
+            ]
+            # Calls before a terminate are run. The tools only read, so the
+            # independent calls from one response run concurrently.
+            stop = next((i for i, action in enumerate(actions) if action["tool_name"] == "terminate"), None)
+            batch = actions[:stop]
+            results = await asyncio.gather(*(
+                execute_tool(tool_functions, action["tool_name"], action["args"]) for action in batch
+            ))
+
+            for action, result in zip(batch, results):
+                print(f"Executing: {action['tool_name']} with args {action['args']}")
+                print(f"Result: {result}")
+                memory.extend([
+                    {"role": "assistant", "content": to_glyph(action)},
+                    {"role": "user", "content": to_glyph(result)}
+                ])
+
+            if stop is not None:
+                print(f"Termination message: {actions[stop]['args']['message']}")
+                break
+        else:
+            # The text answer was already printed while streaming
+            break
 
-        action = {
-            "tool_name": tool_name,
-            "args": tool_args
-        }
 
-        if tool_name == "terminate":
-            print(f"Termination message: {tool_args['message']}")
-            break
-        elif tool_name in tool_functions:
-            try:
-                result = {"result": tool_functions[tool_name](**tool_args)}
-            except Exception as e:
-                result = {"error":f"Error executing {tool_name}: {str(e)}"}
-        else:
-            result = {"error": f"Unknown tool: {tool_name}"}
-
-        print(f"Executing: {tool_name} with args {tool_args}")
-        print(f"Result: {result}")
-        memory.extend([
-            {"role": "assistant", "content": json.dumps(action)},
-            {"role": "user", "content": json.dumps(result)}
-        ])
-    else:
-        result = response.choices[0].message.content
-        print(f"Response: {result}")
-        break
+user_task = input("What would you like me to do? ")
+asyncio.run(run_agent_loop(user_task))
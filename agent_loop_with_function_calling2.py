@@ -6,8 +6,8 @@ except ModuleNotFoundError:
 import os
 import json
 import argparse
+import asyncio
 import time
-from litellm import completion
 from litellm import exceptions as litellm_exceptions
 
 # Load environment variables from .env file
@@ -19,8 +19,23 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("GEMINI_API_KEY not found. Make sure it's in your .env file!")
 
-from litellm import completion
+from agent_loop_common import (
+    cached_prompt_tokens,
+    execute_tool,
+    json_loads,
+    maybe_compact,
+    rate_limited_astream,
+    to_glyph,
+)
 from typing import List, Dict
+from pathlib import Path
+
+# Optional io_uring support (Linux only): batches file reads into a single
+# submission instead of one read syscall per file.
+try:
+    import liburing
+except ImportError:
+    liburing = None
 
 
 def list_files(path: str = ".") -> List[str]:
@@ -48,25 +63,97 @@ def terminate(message: str) -> None:
     print(f"Termination message: {message}")
 
 
+# Per-file content cache keyed by path -> (st_mtime_ns, st_size, content).
+# Unchanged files are served without reopening them on later iterations.
+_FILE_CACHE: Dict[str, tuple[int, int, str]] = {}
+
+_URING_BATCH = 64
+
+def _read_batch_uring(jobs: List[tuple[str, int]]) -> List[bytes]:
+    """Read (path, size) jobs with io_uring, submitting up to _URING_BATCH reads at once."""
+    ring = liburing.io_uring()
+    cqe = liburing.io_uring_cqe()
+    liburing.io_uring_queue_init(_URING_BATCH, ring, 0)
+    results: List[bytes] = [b""] * len(jobs)
+    try:
+        for start in range(0, len(jobs), _URING_BATCH):
+            batch = jobs[start:start + _URING_BATCH]
+            fds, buffers, iovecs = [], [], []
+            try:
+                for offset, (path, size) in enumerate(batch):
+                    fds.append(os.open(path, os.O_RDONLY))
+                    buffers.append(bytearray(size))
+                    iovecs.append(liburing.iovec(buffers[-1]))
+                    sqe = liburing.io_uring_get_sqe(ring)
+                    liburing.io_uring_prep_read(sqe, fds[-1], iovecs[-1].iov_base, iovecs[-1].iov_len, 0)
+                    liburing.io_uring_sqe_set_data64(sqe, offset)
+                liburing.io_uring_submit_and_wait(ring, len(batch))
+                for _ in batch:
+                    liburing.io_uring_wait_cqe(ring, cqe)
+                    offset = liburing.io_uring_cqe_get_data64(cqe[0])
+                    length = liburing.trap_error(cqe[0].res)
+                    liburing.io_uring_cqe_seen(ring, cqe[0])
+                    results[start + offset] = bytes(buffers[offset][:length])
+            finally:
+                for fd in fds:
+                    os.close(fd)
+    finally:
+        liburing.io_uring_queue_exit(ring)
+    return results
+
+
+def _read_batch(jobs: List[tuple[str, int]]) -> List[bytes]:
+    """Read many files at once, using io_uring when available and pathlib otherwise."""
+    if liburing is not None and len(jobs) > 1:
+        try:
+            return _read_batch_uring(jobs)
+        except Exception:
+            pass  # fall back to plain reads (e.g. kernel without io_uring)
+    return [Path(path).read_bytes() for path, _ in jobs]
+
+
 def read_all_files(directory: str) -> Dict[str, str]:
     """Read all files in a directory and return a mapping filename -> content.
 
     Only reads regular files (not directories). Returns error messages for unreadable files.
+    Files whose mtime and size are unchanged since the last read come from _FILE_CACHE;
+    the rest are read together in one batch.
     """
     out: Dict[str, str] = {}
+    pending: List[tuple[os.DirEntry, os.stat_result]] = []
     try:
-        for name in os.listdir(directory):
-            path = os.path.join(directory, name)
-            if os.path.isfile(path):
+        with os.scandir(directory) as entries:
+            for entry in entries:
                 try:
-                    with open(path, 'r', encoding='utf-8') as f:
-                        out[name] = f.read()
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    cached = _FILE_CACHE.get(entry.path)
+                    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                        out[entry.name] = cached[2]
+                    else:
+                        pending.append((entry, st))
                 except Exception as e:
-                    out[name] = f"Error reading file: {e}"
-        return out
+                    out[entry.name] = f"Error reading file: {e}"
     except Exception as e:
         return {"error": str(e)}
 
+    try:
+        contents = _read_batch([(entry.path, st.st_size) for entry, st in pending])
+    except Exception:
+        contents = None  # a file failed mid-batch; read one by one to isolate it
+    for i, (entry, st) in enumerate(pending):
+        try:
+            data = contents[i] if contents is not None else Path(entry.path).read_bytes()
+            # Same result as open(path, 'r', encoding='utf-8').read(): strict
+            # decoding (binary files report an error) and universal newlines
+            content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+            _FILE_CACHE[entry.path] = (st.st_mtime_ns, st.st_size, content)
+            out[entry.name] = content
+        except Exception as e:
+            out[entry.name] = f"Error reading file: {e}"
+    return out
+
 tool_functions = {
     "list_files": list_files,
     "read_file": read_file,
@@ -123,20 +210,31 @@ tools = [
     }
 ]
 
-agent_rules = [{
-    "role": "system",
-    "content": """
+# Static prompt prefix: built once at import and never mutated, so the provider
+# sees byte-identical system + tools on every turn and can serve them from its
+# prompt cache. OpenAI caches identical prefixes automatically; Anthropic needs
+# an explicit cache_control marker on the last system content block.
+SYSTEM_PROMPT = """
 You are an AI agent that can perform tasks by using available tools.
 
 If a user asks about files, documents, or content, first list the files before reading them.
 
 When you are done, terminate the conversation by using the "terminate" tool and I will provide the results to the user.
+
+Tool calls and results in the conversation are written in a compact format:
+{key=value ...} is an object, [a b c] is a list, and quoted strings are JSON strings.
 """
-}]
 
-# Initialize agent parameters
-iterations = 0
-max_iterations = 10
+if DEFAULT_MODEL.startswith("anthropic/"):
+    SYSTEM_BLOCK = {
+        "role": "system",
+        "content": [{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+    }
+else:
+    SYSTEM_BLOCK = {"role": "system", "content": SYSTEM_PROMPT}
+
+
+
 
 # CLI args: support --mock and optional --task to run non-interactively
 parser = argparse.ArgumentParser()
@@ -149,8 +247,6 @@ if args.task:
 else:
     user_task = input("What would you like me to do? ")
 
-memory = [{"role": "user", "content": user_task}]
-
 def summarize_file_content(name: str, content: str) -> str:
     """Return a one-line summary for a file's content using simple heuristics."""
     if not content:
@@ -170,82 +266,93 @@ def summarize_file_content(name: str, content: str) -> str:
     return f"{name}: {excerpt}"
 
 
-# The Agent Loop
-while iterations < max_iterations:
-
-    messages = agent_rules + memory
-
-
-    # # If mock mode is enabled, bypass the LLM and perform heuristic actions
-    # if args.mock:
-    #     task = user_task.lower()
-    #     # handle list files
-    #     if 'list' in task and 'file' in task:
-    #         path = '.'
-    #         # try to detect 'in <dir>' phrase
-    #         import re as _re
-    #         m = _re.search(r'in\s+([\w\\/\.-]+)', user_task, flags=_re.IGNORECASE)
-    #         if m:
-    #             path = m.group(1)
-    #         files = list_files(path)
-    #         print('Mock mode - files:')
-    #         for f in files:
-    #             print(' -', f)
-    #         break
-    #     # handle read all files
-    #     if 'read all' in task or 'read each' in task or ('read' in task and 'files' in task):
-    #         import re as _re
-    #         m = _re.search(r'in\s+([\w\\/\.-]+)', user_task, flags=_re.IGNORECASE)
-    #         directory = m.group(1) if m else '.'
-    #         contents = read_all_files(directory)
-    #         if isinstance(contents, dict) and 'error' in contents:
-    #             print('Mock mode error:', contents['error'])
-    #             break
-    #         print(f"Mock mode - reading files in: {directory}")
-    #         for name, content in contents.items():
-    #             summary = summarize_file_content(name, content)
-    #             print(summary)
-    #         break
-    #     # fallback: echo the task
-    #     print('Mock mode - echoing task:')
-    #     print(user_task)
-    #     break
-
-    response = completion(
-        model=DEFAULT_MODEL,
-        messages=messages,
-        tools=tools,
-        max_tokens=1024
-    )
-
-    if response.choices[0].message.tool_calls:
-        tool = response.choices[0].message.tool_calls[0]
-        tool_name = tool.function.name
-        tool_args = json.loads(tool.function.arguments)
-
-        action = {
-            "tool_name": tool_name,
-            "args": tool_args
-        }
-
-        if tool_name == "terminate":
-            print(f"Termination message: {tool_args['message']}")
-            break
-        elif tool_name in tool_functions:
-            try:
-                result = {"result": tool_functions[tool_name](**tool_args)}
-            except Exception as e:
-                result = {"error":f"Error executing {tool_name}: {str(e)}"}
+async def run_agent_loop(user_task: str, max_iterations: int = 10) -> None:
+    """The Agent Loop: LLM -> tool -> LLM until terminate or max_iterations."""
+    iterations = 0
+    memory = [{"role": "user", "content": user_task}]
+
+    while iterations < max_iterations:
+        iterations += 1
+
+        memory = await maybe_compact(memory, DEFAULT_MODEL, tools)
+
+        # Dynamic memory is strictly appended after the static prefix
+        messages = [SYSTEM_BLOCK, *memory]
+
+
+        # # If mock mode is enabled, bypass the LLM and perform heuristic actions
+        # if args.mock:
+        #     task = user_task.lower()
+        #     # handle list files
+        #     if 'list' in task and 'file' in task:
+        #         path = '.'
+        #         # try to detect 'in <dir>' phrase
+        #         import re as _re
+        #         m = _re.search(r'in\s+([\w\\/\.-]+)', user_task, flags=_re.IGNORECASE)
+        #         if m:
+        #             path = m.group(1)
+        #         files = list_files(path)
+        #         print('Mock mode - files:')
+        #         for f in files:
+        #             print(' -', f)
+        #         break
+        #     # handle read all files
+        #     if 'read all' in task or 'read each' in task or ('read' in task and 'files' in task):
+        #         import re as _re
+        #         m = _re.search(r'in\s+([\w\\/\.-]+)', user_task, flags=_re.IGNORECASE)
+        #         directory = m.group(1) if m else '.'
+        #         contents = read_all_files(directory)
+        #         if isinstance(contents, dict) and 'error' in contents:
+        #             print('Mock mode error:', contents['error'])
+        #             break
+        #         print(f"Mock mode - reading files in: {directory}")
+        #         for name, content in contents.items():
+        #             summary = summarize_file_content(name, content)
+        #             print(summary)
+        #         break
+        #     # fallback: echo the task
+        #     print('Mock mode - echoing task:')
+        #     print(user_task)
+        #     break
+
+        content, tool_calls, usage = await rate_limited_astream(
+            model=DEFAULT_MODEL,
+            messages=messages,
+            tools=tools,
+            max_tokens=1024
+        )
+
+        cached = cached_prompt_tokens(usage)
+        if cached:
+            print(f"Prompt cache hit: {cached} tokens")
+
+        if tool_calls:
+            actions = [
+                {"tool_name": tool["name"], "args": json_loads(tool["arguments"] or "{}")}
+                for tool in tool_calls
+            ]
+            # Calls before a terminate are run. The tools only read, so the
+            # independent calls from one response run concurrently.
+            stop = next((i for i, action in enumerate(actions) if action["tool_name"] == "terminate"), None)
+            batch = actions[:stop]
+            results = await asyncio.gather(*(
+                execute_tool(tool_functions, action["tool_name"], action["args"]) for action in batch
+            ))
+
+            for action, result in zip(batch, results):
+                print(f"Executing: {action['tool_name']} with args {action['args']}")
+                print(f"Result: {result}")
+                memory.extend([
+                    {"role": "assistant", "content": to_glyph(action)},
+                    {"role": "user", "content": to_glyph(result)}
+                ])
+
+            if stop is not None:
+                print(f"Termination message: {actions[stop]['args']['message']}")
+                break
         else:
-            result = {"error": f"Unknown tool: {tool_name}"}
-
-        print(f"Executing: {tool_name} with args {tool_args}")
-        print(f"Result: {result}")
-        memory.extend([
-            {"role": "assistant", "content": json.dumps(action)},
-            {"role": "user", "content": json.dumps(result)}
-        ])
-    else:
-        result = response.choices[0].message.content
-        print(f"Response: {result}")
-        break
+            # The text answer was already printed while streaming
+            break
+
+
+asyncio.run(run_agent_loop(user_task))
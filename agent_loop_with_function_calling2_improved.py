@@ -21,12 +21,30 @@ except ModuleNotFoundError:
     )
 
 import os
-import json
+import stat
 import argparse
 import sys
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Callable, Optional
-from litellm import completion
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+# litellm pulls in every provider SDK and takes seconds to import, so the
+# shared loop imports it only where a model is actually called; --help,
+# argument errors and importing the tools stay fast
+from agent_loop_improved_common import (
+    HEAVY_RULE,
+    glob_dir_files,
+    json_dumps,
+    json_loads,
+    list_dir_files,
+    run_agent_loop,
+    tool_cache_get,
+    tool_cache_put,
+    with_http_session,
+)
 
 # Load environment variables
 load_dotenv()
@@ -34,6 +52,32 @@ load_dotenv()
 # Configuration
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gemini/gemini-1.5-flash")
 DEFAULT_MAX_ITERATIONS = int(os.getenv("DEFAULT_MAX_ITERATIONS", "10"))
+FILE_CACHE_MAX_BYTES = int(os.getenv("FILE_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+
+# File contents keyed by (absolute path, mtime_ns, size); an edit changes the
+# key, so stale entries are never returned. Evicted oldest-first by size.
+_FILE_CACHE: Dict[Tuple[str, int, int], str] = {}
+_file_cache_bytes = 0
+_file_cache_lock = threading.Lock()
+
+
+def _file_cache_key(path: Path, st: os.stat_result) -> Tuple[str, int, int]:
+    return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+
+
+def _file_cache_put(key: Tuple[str, int, int], content: str) -> None:
+    global _file_cache_bytes
+    size = len(content)
+    if size > FILE_CACHE_MAX_BYTES:
+        return
+    with _file_cache_lock:
+        if key in _FILE_CACHE:
+            return
+        while _FILE_CACHE and _file_cache_bytes + size > FILE_CACHE_MAX_BYTES:
+            oldest = next(iter(_FILE_CACHE))
+            _file_cache_bytes -= len(_FILE_CACHE.pop(oldest))
+        _FILE_CACHE[key] = content
+        _file_cache_bytes += size
 
 
 # ============================================================================
@@ -53,15 +97,15 @@ def list_files(path: str = ".") -> List[str]:
         List of filenames or error message
     """
     try:
-        directory = Path(path)
-        if not directory.exists():
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
             return [f"Error: Directory '{path}' not found"]
         
-        if not directory.is_dir():
+        if not stat.S_ISDIR(st.st_mode):
             return [f"Error: '{path}' is not a directory"]
         
-        items = [item.name for item in directory.iterdir() if item.is_file()]
-        return sorted(items)
+        return list_dir_files(path, st)
         
     except Exception as e:
         return [f"Error listing files: {str(e)}"]
@@ -80,18 +124,25 @@ def read_file(file_name: str) -> str:
     try:
         path = Path(file_name)
         
-        if not path.exists():
+        try:
+            st = path.stat()
+        except FileNotFoundError:
             return f"Error: File '{file_name}' not found"
         
-        if not path.is_file():
+        if not stat.S_ISREG(st.st_mode):
             return f"Error: '{file_name}' is not a file"
         
         # Check file size (limit to 10MB)
-        size_mb = path.stat().st_size / (1024 * 1024)
+        size_mb = st.st_size / (1024 * 1024)
         if size_mb > 10:
             return f"Error: File too large ({size_mb:.1f}MB). Max 10MB"
         
-        return path.read_text(encoding='utf-8')
+        key = _file_cache_key(path, st)
+        content = _FILE_CACHE.get(key)
+        if content is None:
+            content = path.read_text(encoding='utf-8')
+            _file_cache_put(key, content)
+        return content
         
     except UnicodeDecodeError:
         return f"Error: Cannot read '{file_name}' - not a text file"
@@ -99,6 +150,28 @@ def read_file(file_name: str) -> str:
         return f"Error reading file: {str(e)}"
 
 
+def _read_one_file(entry: os.DirEntry) -> Tuple[str, str]:
+    """Read one file for read_all_files, returning (name, contents or error)."""
+    path = Path(entry.path)
+    try:
+        # One open() serves both the size check and the read
+        with open(path, encoding='utf-8') as f:
+            st = os.fstat(f.fileno())
+            size_mb = st.st_size / (1024 * 1024)
+            if size_mb > 10:
+                return path.name, f"Error: File too large ({size_mb:.1f}MB)"
+            key = _file_cache_key(path, st)
+            content = _FILE_CACHE.get(key)
+            if content is None:
+                content = f.read()
+                _file_cache_put(key, content)
+            return path.name, content
+    except UnicodeDecodeError:
+        return path.name, "Error: Not a text file"
+    except Exception as e:
+        return path.name, f"Error: {str(e)}"
+
+
 def read_all_files(directory: str = ".") -> Dict[str, str]:
     """
     Read all files in a directory at once.
@@ -115,34 +188,20 @@ def read_all_files(directory: str = ".") -> Dict[str, str]:
     result: Dict[str, str] = {}
     
     try:
-        dir_path = Path(directory)
-        
-        if not dir_path.exists():
+        try:
+            st = os.stat(directory)
+        except FileNotFoundError:
             return {"error": f"Directory '{directory}' not found"}
         
-        if not dir_path.is_dir():
+        if not stat.S_ISDIR(st.st_mode):
             return {"error": f"'{directory}' is not a directory"}
         
-        # Read all files
-        for item in dir_path.iterdir():
-            if not item.is_file():
-                continue
-            
-            try:
-                # Check size before reading
-                size_mb = item.stat().st_size / (1024 * 1024)
-                if size_mb > 10:
-                    result[item.name] = f"Error: File too large ({size_mb:.1f}MB)"
-                    continue
-                
-                # Try to read as text
-                content = item.read_text(encoding='utf-8')
-                result[item.name] = content
-                
-            except UnicodeDecodeError:
-                result[item.name] = "Error: Not a text file"
-            except Exception as e:
-                result[item.name] = f"Error: {str(e)}"
+        # Read all files concurrently; file reads release the GIL
+        with os.scandir(directory) as entries:
+            files = [entry for entry in entries if entry.is_file()]
+        if files:
+            with ThreadPoolExecutor(max_workers=min(32, len(files))) as pool:
+                result = dict(pool.map(_read_one_file, files))
         
         if not result:
             return {"info": "No files found in directory"}
@@ -165,17 +224,17 @@ def search_files(pattern: str, directory: str = ".") -> List[str]:
         List of matching filenames
     """
     try:
-        dir_path = Path(directory)
-        
-        if not dir_path.exists():
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
             return [f"Error: Directory '{directory}' not found"]
         
-        matches = [p.name for p in dir_path.glob(pattern) if p.is_file()]
+        matches = glob_dir_files(directory, pattern, mtime)
         
         if not matches:
             return [f"No files found matching '{pattern}' in '{directory}'"]
         
-        return sorted(matches)
+        return matches
         
     except Exception as e:
         return [f"Error searching files: {str(e)}"]
@@ -329,6 +388,9 @@ EFFICIENCY TIP: If a task requires reading multiple files, use read_all_files in
 reading files individually. This reduces the number of iterations and completes tasks faster.
 """
 
+# Shared, never-mutated first message of every run's memory
+SYSTEM_MESSAGE: Dict[str, str] = {"role": "system", "content": SYSTEM_PROMPT}
+
 
 # ============================================================================
 # AGENT EXECUTION
@@ -337,7 +399,8 @@ reading files individually. This reduces the number of iterations and completes
 def execute_tool(
     tool_name: str,
     tool_args: Dict,
-    verbose: bool = False
+    verbose: bool = False,
+    cache: Optional["OrderedDict[str, Any]"] = None
 ) -> Dict[str, Any]:
     """
     Execute a tool function with arguments.
@@ -346,6 +409,8 @@ def execute_tool(
         tool_name: Name of tool to execute
         tool_args: Arguments for the tool
         verbose: Whether to print debug info
+        cache: Per-run LRU of earlier results; repeated calls with the same
+            arguments are answered from it
     
     Returns:
         Result dictionary with 'result' or 'error'
@@ -357,11 +422,22 @@ def execute_tool(
     if tool_name not in TOOL_FUNCTIONS:
         return {"error": f"Unknown tool: {tool_name}"}
     
+    key = f"{tool_name}:{json_dumps(tool_args, sort_keys=True)}"
+    cached = tool_cache_get(cache, key) if cache is not None else None
+    if cached is not None:
+        return {
+            "result": cached,
+            "cached": True,
+            "note": "This tool was already called with these arguments; reuse the earlier result.",
+        }
+    
     try:
         if verbose:
             print(f"   Executing: {tool_name}({tool_args})")
         
         result = TOOL_FUNCTIONS[tool_name](**tool_args)
+        if cache is not None:
+            tool_cache_put(cache, key, result)
         return {"result": result}
         
     except TypeError as e:
@@ -400,7 +476,33 @@ def format_result_summary(result_data: Any) -> str:
     return str(result_data)
 
 
-def run_agent(
+def _summarize_tool_output(content: str) -> str:
+    """Shorten a serialized tool result for the prior-actions summary."""
+    try:
+        result = json_loads(content)
+    except ValueError:
+        return content[:100]
+    if "error" in result:
+        return f"Error: {result['error']}"
+    return format_result_summary(result.get("result"))
+
+
+def _show_result(result_data: Any, emit: Callable[[str], None], verbose: bool) -> None:
+    """Display one successful tool result; details only in verbose mode."""
+    emit(f"✅ Result: {format_result_summary(result_data)}")
+    if verbose:
+        if isinstance(result_data, dict) and len(result_data) <= 5:
+            emit("   Details:")
+            for key, value in result_data.items():
+                value_preview = str(value)[:100]
+                emit(f"     {key}: {value_preview}...")
+        elif isinstance(result_data, list) and len(result_data) <= 10:
+            emit("   Items:")
+            for item in result_data:
+                emit(f"     • {item}")
+
+
+async def run_agent(
     task: str,
     model: str = DEFAULT_MODEL,
     max_iterations: int = DEFAULT_MAX_ITERATIONS,
@@ -415,100 +517,20 @@ def run_agent(
         max_iterations: Maximum iterations
         verbose: Show detailed output
     """
-    print("\n" + "=" * 70)
-    print("🤖 ENHANCED AGENT WITH BATCH OPERATIONS")
-    print("=" * 70)
-    print(f"\n📋 Task: {task}")
-    print(f"🔧 Tools: {', '.join(TOOL_FUNCTIONS.keys())}")
-    print(f"🔄 Max iterations: {max_iterations}\n")
-    
-    # Initialize conversation
-    memory = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": task}
-    ]
-    
-    iteration = 0
-    
-    while iteration < max_iterations:
-        iteration += 1
-        
-        print(f"{'─' * 70}")
-        print(f"Iteration {iteration}/{max_iterations}")
-        print(f"{'─' * 70}")
-        
-        # Call LLM
-        print("🧠 Agent thinking...")
-        
-        try:
-            response = completion(
-                model=model,
-                messages=memory,
-                tools=TOOLS,
-                max_tokens=1024
-            )
-        except Exception as e:
-            print(f"❌ Error calling LLM: {e}")
-            break
-        
-        # Check for tool call
-        if not response.choices[0].message.tool_calls:
-            text_response = response.choices[0].message.content
-            print(f"💬 Agent response: {text_response}")
-            break
-        
-        # Extract tool call
-        tool_call = response.choices[0].message.tool_calls[0]
-        tool_name = tool_call.function.name
-        tool_args = json.loads(tool_call.function.arguments)
-        
-        print(f"🔧 Tool: {tool_name}")
-        if tool_args:
-            args_display = ", ".join(f"{k}={repr(v)[:50]}" for k, v in tool_args.items())
-            print(f"   Args: {args_display}")
-        
-        # Execute tool
-        result = execute_tool(tool_name, tool_args, verbose=verbose)
-        
-        # Display result
-        if "error" in result:
-            print(f"❌ Error: {result['error']}")
-        else:
-            result_data = result["result"]
-            summary = format_result_summary(result_data)
-            print(f"✅ Result: {summary}")
-            
-            # Show details in verbose mode
-            if verbose:
-                if isinstance(result_data, dict) and len(result_data) <= 5:
-                    print("   Details:")
-                    for key, value in result_data.items():
-                        value_preview = str(value)[:100]
-                        print(f"     {key}: {value_preview}...")
-                elif isinstance(result_data, list) and len(result_data) <= 10:
-                    print("   Items:")
-                    for item in result_data:
-                        print(f"     • {item}")
-        
-        # Check termination
-        if result.get("terminated"):
-            print("\n" + "=" * 70)
-            print("✅ AGENT COMPLETED TASK")
-            print("=" * 70)
-            break
-        
-        # Update memory
-        action_summary = {"tool_name": tool_name, "args": tool_args}
-        memory.extend([
-            {"role": "assistant", "content": json.dumps(action_summary)},
-            {"role": "user", "content": json.dumps(result)}
-        ])
-    
-    if iteration >= max_iterations:
-        print("\n" + "=" * 70)
-        print("⚠️  MAXIMUM ITERATIONS REACHED")
-        print("=" * 70)
-        print("The agent may not have completed the task.")
+    await run_agent_loop(
+        task,
+        model=model,
+        max_iterations=max_iterations,
+        verbose=verbose,
+        title="ENHANCED AGENT WITH BATCH OPERATIONS",
+        tools_line=f"🔧 Tools: {', '.join(TOOL_FUNCTIONS.keys())}",
+        tools=TOOLS,
+        system_message=SYSTEM_MESSAGE,
+        execute_tool=execute_tool,
+        show_result=_show_result,
+        max_arg_chars=50,
+        summarize=_summarize_tool_output,
+    )
 
 
 # ============================================================================
@@ -591,9 +613,7 @@ Example Tasks:
     if args.task:
         task = args.task
     else:
-        print("\n" + "=" * 70)
-        print("🤖 ENHANCED AGENT WITH BATCH OPERATIONS")
-        print("=" * 70)
+        print(f"\n{HEAVY_RULE}\n🤖 ENHANCED AGENT WITH BATCH OPERATIONS\n{HEAVY_RULE}")
         print("\nWhat would you like me to do?")
         print("\nExample tasks:")
         print("  • Read all files in this directory")
@@ -609,12 +629,12 @@ Example Tasks:
     
     try:
         # Run agent
-        run_agent(
+        asyncio.run(with_http_session(run_agent(
             task=task,
             model=args.model,
             max_iterations=args.max_iterations,
             verbose=args.verbose
-        )
+        )))
         
         return 0
         
@@ -21,13 +21,38 @@ except ModuleNotFoundError:
     )
 
 import os
-import json
 import argparse
+import codecs
 import sys
+import hashlib
+import stat
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List, Dict, Any, Callable
-from litellm import completion
-from litellm import exceptions as litellm_exceptions
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+# litellm pulls in every provider SDK and takes seconds to import, so the
+# shared loop imports it only where a model is actually called; --help,
+# argument errors and importing the tools stay fast
+from agent_loop_improved_common import (
+    HEAVY_RULE,
+    glob_dir_files,
+    json_dumps,
+    list_dir_files,
+    run_agent_loop,
+    tool_cache_get,
+    tool_cache_put,
+    with_http_session,
+)
+
+# Optional io_uring bindings (pip install liburing, Linux only); read_files
+# falls back to its thread pool without them
+try:
+    import liburing
+except ImportError:
+    liburing = None
 
 # Load environment variables
 load_dotenv()
@@ -35,6 +60,21 @@ load_dotenv()
 # Configuration
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gemini/gemini-1.5-flash")
 DEFAULT_MAX_ITERATIONS = int(os.getenv("DEFAULT_MAX_ITERATIONS", "10"))
+READ_FILES_MAX_TOTAL_MB = int(os.getenv("READ_FILES_MAX_TOTAL_MB", "50"))
+
+# Shared pool for read_files; file reads release the GIL, so threads overlap I/O
+_READ_POOL = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 4) * 4))
+
+READ_FILE_DEFAULT_LENGTH = 65536
+SEARCH_AND_READ_MAX_BYTES = 4096
+
+# Speculative reads started after a listing, while the LLM is thinking.
+# Keyed by absolute path; each future yields (st_mtime_ns, first page text).
+# At most PREFETCH_MAX_FILES reads of READ_FILE_DEFAULT_LENGTH bytes each.
+PREFETCH_MAX_FILES = 8
+PREFETCH_EXTENSIONS = (".py", ".md", ".txt", ".json", ".yaml", ".yml")
+_PREFETCH: Dict[str, Future] = {}
+_prefetch_lock = threading.Lock()
 
 
 # ============================================================================
@@ -52,22 +92,76 @@ def list_files(directory: str = ".") -> List[str]:
         List of filenames, or error message in list
     """
     try:
-        path = Path(directory)
-        if not path.exists():
+        try:
+            st = os.stat(directory)
+        except FileNotFoundError:
             return [f"Error: Directory '{directory}' not found"]
         
-        items = [item.name for item in path.iterdir() if item.is_file()]
-        return sorted(items)
+        if not stat.S_ISDIR(st.st_mode):
+            return [f"Error: '{directory}' is not a directory"]
+        
+        return list_dir_files(directory, st)
     except Exception as e:
         return [f"Error listing files: {str(e)}"]
 
 
-def read_file(file_name: str) -> str:
+def _prefetched(path: Path, st: os.stat_result) -> Optional[str]:
+    """Claim a prefetched first page of path, if it is still up to date."""
+    with _prefetch_lock:
+        future = _PREFETCH.pop(os.path.abspath(path), None)
+    if future is None:
+        return None
+    mtime_ns, text = future.result()
+    return text if mtime_ns == st.st_mtime_ns else None
+
+
+def _prefetch_one(file_name: str) -> Tuple[int, str]:
+    try:
+        st = os.stat(file_name)
+        if not stat.S_ISREG(st.st_mode):
+            return -1, ""
+        return st.st_mtime_ns, _read_range(file_name, st, 0, READ_FILE_DEFAULT_LENGTH)
+    except Exception:
+        return -1, ""  # never matches; read_file will report the error itself
+
+
+def prefetch_files(directory: str, names: List[str]) -> None:
     """
-    Read contents of a file.
+    Start background reads of the first text-like files in a listing.
+    
+    Args:
+        directory: Directory the names were listed from
+        names: File names returned by list_files or search_files
+    """
+    with _prefetch_lock:
+        # A new listing supersedes unclaimed reads from earlier ones
+        for key in [key for key, future in _PREFETCH.items() if future.done()]:
+            del _PREFETCH[key]
+        started = 0
+        for name in names:
+            if started >= PREFETCH_MAX_FILES or len(_PREFETCH) >= PREFETCH_MAX_FILES:
+                break
+            if not name.endswith(PREFETCH_EXTENSIONS):
+                continue
+            path = os.path.join(directory, name)
+            key = os.path.abspath(path)
+            if key not in _PREFETCH:
+                _PREFETCH[key] = _READ_POOL.submit(_prefetch_one, path)
+                started += 1
+
+
+def read_file(file_name: str, offset: int = 0, length: int = READ_FILE_DEFAULT_LENGTH) -> str:
+    """
+    Read part of a file.
+    
+    Only the requested byte range is read from disk. When the range doesn't
+    cover the whole file, a "[bytes start-end of size]" header line tells
+    the model how to page through the rest.
     
     Args:
         file_name: Name or path of file to read
+        offset: Byte offset to start reading at
+        length: Maximum number of bytes to return
     
     Returns:
         File contents or error message
@@ -75,18 +169,78 @@ def read_file(file_name: str) -> str:
     try:
         path = Path(file_name)
         
-        if not path.exists():
+        try:
+            st = path.stat()
+        except FileNotFoundError:
             return f"Error: File '{file_name}' not found"
         
-        if not path.is_file():
+        if not stat.S_ISREG(st.st_mode):
+            return f"Error: '{file_name}' is not a file"
+        
+        if offset == 0 and length == READ_FILE_DEFAULT_LENGTH:
+            text = _prefetched(path, st)
+            if text is not None:
+                return text
+        
+        return _read_range(file_name, st, offset, length)
+        
+    except Exception as e:
+        return f"Error reading file: {str(e)}"
+
+
+def _read_range(file_name: str, st: os.stat_result, offset: int, length: int) -> str:
+    """Read and decode one byte range of a regular file for read_file."""
+    offset = max(0, offset)
+    with open(file_name, 'rb') as f:
+        f.seek(offset)
+        data = f.read(max(0, length))
+    
+    partial = offset > 0 or offset + len(data) < st.st_size
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        # A range may cut a multi-byte character, but only at an edge that
+        # lies inside the file. Skip the continuation bytes of a character
+        # begun before offset and let the incremental decoder hold back one
+        # left incomplete at the end; anything else means the file isn't text.
+        body = data
+        if offset > 0:
+            skip = 0
+            while skip < min(3, len(body)) and 0x80 <= body[skip] < 0xC0:
+                skip += 1
+            body = body[skip:]
+        try:
+            if offset + len(data) < st.st_size:
+                codecs.getincrementaldecoder('utf-8')().decode(body, final=False)
+            else:
+                body.decode('utf-8')
+        except UnicodeDecodeError:
+            return f"Error: Cannot read '{file_name}' - not a text file"
+        text = data.decode('utf-8', errors='replace')
+    
+    if partial:
+        return f"[bytes {offset}-{offset + len(data)} of {st.st_size}]\n{text}"
+    return text
+
+
+def _read_whole_file(file_name: str) -> str:
+    """Read a whole text file (up to 10MB) for read_files."""
+    try:
+        try:
+            st = os.stat(file_name)
+        except FileNotFoundError:
+            return f"Error: File '{file_name}' not found"
+        
+        if not stat.S_ISREG(st.st_mode):
             return f"Error: '{file_name}' is not a file"
         
         # Check file size (limit to 10MB)
-        size_mb = path.stat().st_size / (1024 * 1024)
+        size_mb = st.st_size / (1024 * 1024)
         if size_mb > 10:
             return f"Error: File too large ({size_mb:.1f}MB). Max 10MB"
         
-        return path.read_text(encoding='utf-8')
+        with open(file_name, 'r', encoding='utf-8') as f:
+            return f.read()
         
     except UnicodeDecodeError:
         return f"Error: Cannot read '{file_name}' - not a text file"
@@ -94,6 +248,111 @@ def read_file(file_name: str) -> str:
         return f"Error reading file: {str(e)}"
 
 
+_URING_BATCH = 64
+
+
+def _uring_read_batch(jobs: List[Tuple[str, int]]) -> List[bytes]:
+    """Read (path, size) jobs with io_uring, one submission per _URING_BATCH files."""
+    ring = liburing.io_uring()
+    cqe = liburing.io_uring_cqe()
+    liburing.io_uring_queue_init(_URING_BATCH * 2, ring, 0)
+    results: List[bytes] = [b""] * len(jobs)
+    try:
+        for start in range(0, len(jobs), _URING_BATCH):
+            batch = jobs[start:start + _URING_BATCH]
+            fds, buffers, iovecs = [], [], []
+            try:
+                for offset, (path, size) in enumerate(batch):
+                    fds.append(os.open(path, os.O_RDONLY))
+                    buffers.append(bytearray(size))
+                    iovecs.append(liburing.iovec(buffers[-1]))
+                    sqe = liburing.io_uring_get_sqe(ring)
+                    liburing.io_uring_prep_read(sqe, fds[-1], iovecs[-1].iov_base, iovecs[-1].iov_len, 0)
+                    liburing.io_uring_sqe_set_data64(sqe, offset)
+                liburing.io_uring_submit_and_wait(ring, len(batch))
+                for _ in batch:
+                    liburing.io_uring_wait_cqe(ring, cqe)
+                    offset = liburing.io_uring_cqe_get_data64(cqe[0])
+                    length = liburing.trap_error(cqe[0].res)
+                    liburing.io_uring_cqe_seen(ring, cqe[0])
+                    results[start + offset] = bytes(buffers[offset][:length])
+            finally:
+                for fd in fds:
+                    os.close(fd)
+    finally:
+        liburing.io_uring_queue_exit(ring)
+    return results
+
+
+def _decode_text(name: str, data: bytes) -> str:
+    """Decode file bytes the way _read_whole_file's text-mode read would.
+    
+    Like open(..., 'r'), "\r\n" and "\r" become "\n", so read_files returns
+    the same text with or without io_uring. read_file's byte ranges are
+    left as they are on disk.
+    """
+    try:
+        return data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    except UnicodeDecodeError:
+        return f"Error: Cannot read '{name}' - not a text file"
+
+
+def read_files(file_names: List[str]) -> Dict[str, str]:
+    """
+    Read several files at once, in parallel.
+    
+    Sizes are checked before any read starts: files over 10MB are skipped,
+    and so is every file past READ_FILES_MAX_TOTAL_MB in total. With the
+    optional liburing bindings the reads go to io_uring as one batch;
+    otherwise they run on a shared thread pool.
+    
+    Args:
+        file_names: Names or paths of files to read
+    
+    Returns:
+        Dictionary mapping each file name to its contents or an error message
+    """
+    result: Dict[str, str] = {}
+    to_read: List[str] = []
+    ring_jobs: List[Tuple[str, int]] = []
+    budget = READ_FILES_MAX_TOTAL_MB * 1024 * 1024
+    
+    for name in file_names:
+        try:
+            st = os.stat(name)
+        except OSError:
+            to_read.append(name)  # _read_whole_file reports it with its usual message
+            continue
+        size = st.st_size
+        if not stat.S_ISREG(st.st_mode):
+            to_read.append(name)
+        elif size > 10 * 1024 * 1024:
+            result[name] = f"Error: File too large ({size / (1024 * 1024):.1f}MB). Max 10MB"
+        elif size > budget:
+            result[name] = f"Error: Skipped, over the {READ_FILES_MAX_TOTAL_MB}MB total read limit"
+        else:
+            budget -= size
+            ring_jobs.append((name, size))
+    
+    # Several regular files: submit all reads to io_uring in one batch.
+    # A single file isn't worth setting up a ring for.
+    if liburing is not None and len(ring_jobs) > 1:
+        try:
+            for (name, _), data in zip(ring_jobs, _uring_read_batch(ring_jobs)):
+                result[name] = _decode_text(name, data)
+            ring_jobs = []
+        except OSError:
+            pass  # e.g. io_uring disabled by the kernel; use the thread pool
+    to_read.extend(name for name, _ in ring_jobs)
+    
+    futures = {_READ_POOL.submit(_read_whole_file, name): name for name in to_read}
+    for future in as_completed(futures):
+        result[futures[future]] = future.result()
+    
+    # Preserve the requested order
+    return {name: result[name] for name in file_names if name in result}
+
+
 def search_files(pattern: str, directory: str = ".") -> List[str]:
     """
     Search for files matching a pattern.
@@ -106,21 +365,121 @@ def search_files(pattern: str, directory: str = ".") -> List[str]:
         List of matching files or error message
     """
     try:
-        path = Path(directory)
-        if not path.exists():
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
             return [f"Error: Directory '{directory}' not found"]
         
-        matches = [str(p.name) for p in path.glob(pattern) if p.is_file()]
-        
+        matches = glob_dir_files(directory, pattern, mtime)
         if not matches:
             return [f"No files found matching '{pattern}' in '{directory}'"]
         
-        return sorted(matches)
+        return matches
         
     except Exception as e:
         return [f"Error searching files: {str(e)}"]
 
 
+def _read_head(file_name: str, max_bytes: int) -> str:
+    """Read the first max_bytes of a file for search_and_read."""
+    try:
+        try:
+            st = os.stat(file_name)
+        except FileNotFoundError:
+            return f"Error: File '{file_name}' not found"
+        if not stat.S_ISREG(st.st_mode):
+            return f"Error: '{file_name}' is not a file"
+        return _read_range(file_name, st, 0, max_bytes)
+    except Exception as e:
+        return f"Error reading file: {str(e)}"
+
+
+def search_and_read(pattern: str, directory: str = ".", max_bytes: int = SEARCH_AND_READ_MAX_BYTES) -> Dict[str, str]:
+    """
+    Find files matching a pattern and return the start of each one.
+    
+    Replaces a search_files call followed by one read_file per match, so
+    exploring a directory takes one round-trip to the model instead of N+1.
+    The reads run in parallel on the shared read pool.
+    
+    Args:
+        pattern: Glob pattern (e.g., "*.py", "test_*")
+        directory: Directory to search (default: current)
+        max_bytes: Bytes to read from the start of each file
+    
+    Returns:
+        Dictionary mapping each matching file name to its first max_bytes
+        (with a "[bytes start-end of size]" line when truncated), or an
+        error/info message
+    """
+    matches = search_files(pattern, directory)
+    if len(matches) == 1 and matches[0].startswith("Error"):
+        return {"error": matches[0]}
+    if len(matches) == 1 and matches[0].startswith("No files found"):
+        return {"info": matches[0]}
+    
+    paths = [os.path.join(directory, name) for name in matches]
+    heads = _READ_POOL.map(_read_head, paths, [max_bytes] * len(paths))
+    return dict(zip(matches, heads))
+
+
+# Large tool outputs are kept here and the model gets a handle plus a
+# preview; read_blob pages through the full text on demand. Ids are content
+# hashes, so the same output is stored once.
+BLOB_THRESHOLD = 16 * 1024
+BLOB_PREVIEW = 512
+BLOB_STORE_MAX_ENTRIES = 256
+_BLOBS: "OrderedDict[str, str]" = OrderedDict()
+_blob_lock = threading.Lock()
+
+
+def _to_blob(text: str) -> Dict[str, Any]:
+    blob_id = "blob_" + hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+    with _blob_lock:
+        _BLOBS[blob_id] = text
+        _BLOBS.move_to_end(blob_id)
+        if len(_BLOBS) > BLOB_STORE_MAX_ENTRIES:
+            _BLOBS.popitem(last=False)
+    return {"blob_id": blob_id, "size": len(text), "preview": text[:BLOB_PREVIEW]}
+
+
+def _store_large_values(tool_name: str, result: Any) -> Any:
+    """Replace large strings in a tool result with blob handles."""
+    if tool_name in ("read_file", "read_blob"):
+        return result  # these already return bounded pages
+    if isinstance(result, str) and len(result) > BLOB_THRESHOLD:
+        return _to_blob(result)
+    if isinstance(result, dict):
+        return {
+            key: _to_blob(value) if isinstance(value, str) and len(value) > BLOB_THRESHOLD else value
+            for key, value in result.items()
+        }
+    return result
+
+
+def read_blob(blob_id: str, offset: int = 0, length: int = READ_FILE_DEFAULT_LENGTH) -> str:
+    """
+    Read part of a large tool output that was returned as a blob handle.
+    
+    Args:
+        blob_id: Handle from an earlier tool result
+        offset: Character offset to start at
+        length: Maximum number of characters to return
+    
+    Returns:
+        The requested slice, or an error message
+    """
+    with _blob_lock:
+        text = _BLOBS.get(blob_id)
+    if text is None:
+        return f"Error: Unknown or expired blob '{blob_id}'"
+    offset = max(0, offset)
+    chunk = text[offset:offset + max(0, length)]
+    if offset > 0 or offset + len(chunk) < len(text):
+        return f"[chars {offset}-{offset + len(chunk)} of {len(text)}]\n{chunk}"
+    return chunk
+
+
 def terminate(message: str) -> str:
     """
     Terminate the agent loop with a summary.
@@ -142,7 +501,10 @@ def terminate(message: str) -> str:
 TOOL_FUNCTIONS: Dict[str, Callable] = {
     "list_files": list_files,
     "read_file": read_file,
+    "read_files": read_files,
     "search_files": search_files,
+    "search_and_read": search_and_read,
+    "read_blob": read_blob,
     "terminate": terminate,
 }
 
@@ -170,19 +532,47 @@ TOOLS: List[Dict] = [
         "type": "function",
         "function": {
             "name": "read_file",
-            "description": "Reads and returns the complete contents of a text file.",
+            "description": "Reads a text file, 64KB at a time by default. Larger files start "
+                          "with a '[bytes start-end of size]' line; pass offset to read further.",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "file_name": {
                         "type": "string",
                         "description": "Name or path of the file to read"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Byte offset to start reading at (default: 0)"
+                    },
+                    "length": {
+                        "type": "integer",
+                        "description": "Maximum number of bytes to read (default: 65536)"
                     }
                 },
                 "required": ["file_name"]
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_files",
+            "description": "Reads several text files in parallel. Prefer this over repeated "
+                          "read_file calls. Returns a mapping of file name to contents.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "file_names": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Names or paths of the files to read"
+                    }
+                },
+                "required": ["file_names"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -204,6 +594,58 @@ TOOLS: List[Dict] = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_and_read",
+            "description": "Finds files matching a glob pattern and returns the first part of each. "
+                          "Use this instead of calling search_files + multiple read_file — one round-trip.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "pattern": {
+                        "type": "string",
+                        "description": "Glob pattern to match files (e.g., '*.py', 'test_*')"
+                    },
+                    "directory": {
+                        "type": "string",
+                        "description": "Directory to search in (default: current directory)"
+                    },
+                    "max_bytes": {
+                        "type": "integer",
+                        "description": "Bytes to return from the start of each file (default: 4096)"
+                    }
+                },
+                "required": ["pattern"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_blob",
+            "description": "Reads a large tool output that was returned as a {blob_id, size, preview} "
+                          "handle, 64K characters at a time. Pass offset to read further.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "blob_id": {
+                        "type": "string",
+                        "description": "The blob_id from the earlier tool result"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Character offset to start at (default: 0)"
+                    },
+                    "length": {
+                        "type": "integer",
+                        "description": "Maximum number of characters to read (default: 65536)"
+                    }
+                },
+                "required": ["blob_id"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -234,8 +676,8 @@ SYSTEM_PROMPT = """You are an AI agent that can perform tasks by using available
 
 IMPORTANT GUIDELINES:
 1. If the user asks about files or directories, first list them to see what's available
-2. Use search_files when looking for specific file types or patterns
-3. Read files one at a time to understand their contents
+2. Use search_and_read to find files by pattern and see their contents in one step
+3. Use read_file with an offset when you need more of a file than search_and_read returned
 4. When you have completed the task, use the "terminate" tool with a comprehensive summary
 5. Be thorough and systematic in your approach
 6. If you encounter errors, explain them and try alternative approaches
@@ -243,12 +685,20 @@ IMPORTANT GUIDELINES:
 Available tools will be provided to you automatically.
 """
 
+# Shared, never-mutated first message of every run's memory
+SYSTEM_MESSAGE: Dict[str, str] = {"role": "system", "content": SYSTEM_PROMPT}
+
 
 # ============================================================================
 # AGENT EXECUTION
 # ============================================================================
 
-def execute_tool(tool_name: str, tool_args: Dict, verbose: bool = False) -> Dict:
+def execute_tool(
+    tool_name: str,
+    tool_args: Dict,
+    verbose: bool = False,
+    cache: Optional["OrderedDict[str, Any]"] = None
+) -> Dict:
     """
     Execute a tool function with given arguments.
     
@@ -256,6 +706,8 @@ def execute_tool(tool_name: str, tool_args: Dict, verbose: bool = False) -> Dict
         tool_name: Name of the tool to execute
         tool_args: Dictionary of arguments
         verbose: Whether to print debug info
+        cache: Per-run LRU of earlier results; repeated calls with the same
+            arguments are answered from it
     
     Returns:
         Result dictionary with 'result' or 'error' key
@@ -268,12 +720,26 @@ def execute_tool(tool_name: str, tool_args: Dict, verbose: bool = False) -> Dict
     if tool_name not in TOOL_FUNCTIONS:
         return {"error": f"Unknown tool: {tool_name}"}
     
+    key = f"{tool_name}:{json_dumps(tool_args, sort_keys=True)}"
+    cached = tool_cache_get(cache, key) if cache is not None else None
+    if cached is not None:
+        return {
+            "result": _store_large_values(tool_name, cached),
+            "cached": True,
+            "note": "This tool was already called with these arguments; reuse the earlier result.",
+        }
+    
     try:
         if verbose:
             print(f"   Executing: {tool_name}({tool_args})")
         
         result = TOOL_FUNCTIONS[tool_name](**tool_args)
-        return {"result": result}
+        if tool_name in ("list_files", "search_files") and isinstance(result, list):
+            # The model usually reads some of these next; start while it thinks
+            prefetch_files(tool_args.get("directory", "."), result)
+        if cache is not None:
+            tool_cache_put(cache, key, result)
+        return {"result": _store_large_values(tool_name, result)}
         
     except TypeError as e:
         return {"error": f"Invalid arguments for {tool_name}: {str(e)}"}
@@ -281,7 +747,29 @@ def execute_tool(tool_name: str, tool_args: Dict, verbose: bool = False) -> Dict
         return {"error": f"Error executing {tool_name}: {str(e)}"}
 
 
-def run_agent(
+def _show_result(result_data: Any, emit: Callable[[str], None], verbose: bool) -> None:
+    """Display one successful tool result."""
+    if isinstance(result_data, list):
+        emit(f"✅ Result: {len(result_data)} items")
+        if verbose or len(result_data) <= 10:
+            for item in result_data:
+                emit(f"   • {item}")
+        elif len(result_data) > 10:
+            for item in result_data[:5]:
+                emit(f"   • {item}")
+            emit(f"   ... and {len(result_data) - 5} more")
+    
+    elif isinstance(result_data, str):
+        if len(result_data) > 300 and not verbose:
+            emit(f"✅ Result: {result_data[:300]}...")
+            emit(f"   (Total: {len(result_data)} characters)")
+        else:
+            emit(f"✅ Result: {result_data}")
+    else:
+        emit(f"✅ Result: {result_data}")
+
+
+async def run_agent(
     task: str,
     model: str = DEFAULT_MODEL,
     max_iterations: int = DEFAULT_MAX_ITERATIONS,
@@ -301,110 +789,18 @@ def run_agent(
         max_iterations: Maximum loop iterations
         verbose: Whether to print detailed output
     """
-    print("\n" + "=" * 70)
-    print("🤖 SIMPLE AGENT WITH NATIVE FUNCTION CALLING")
-    print("=" * 70)
-    print(f"\n📋 Task: {task}")
-    print(f"🔧 Available tools: {len(TOOL_FUNCTIONS)}")
-    print(f"🔄 Max iterations: {max_iterations}\n")
-    
-    # Initialize conversation memory
-    memory = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": task}
-    ]
-    
-    iteration = 0
-    
-    # Main agent loop
-    while iteration < max_iterations:
-        iteration += 1
-        
-        print(f"{'─' * 70}")
-        print(f"Iteration {iteration}/{max_iterations}")
-        print(f"{'─' * 70}")
-        
-        # Call LLM with function calling
-        print("🧠 Agent thinking...")
-        
-        try:
-            response = completion(
-                model=model,
-                messages=memory,
-                tools=TOOLS,
-                max_tokens=1024
-            )
-        except Exception as e:
-            print(f"❌ Error calling LLM: {e}")
-            break
-        
-        # Check if LLM wants to call a function
-        if not response.choices[0].message.tool_calls:
-            # No tool call - just text response
-            text_response = response.choices[0].message.content
-            print(f"💬 Agent response: {text_response}")
-            break
-        
-        # Extract tool call information
-        tool_call = response.choices[0].message.tool_calls[0]
-        tool_name = tool_call.function.name
-        tool_args = json.loads(tool_call.function.arguments)
-        
-        print(f"🔧 Tool: {tool_name}")
-        if tool_args:
-            args_str = ", ".join(f"{k}={repr(v)}" for k, v in tool_args.items())
-            print(f"   Args: {args_str}")
-        
-        # Execute the tool
-        result = execute_tool(tool_name, tool_args, verbose=verbose)
-        
-        # Display result
-        if "error" in result:
-            print(f"❌ Error: {result['error']}")
-        else:
-            result_data = result["result"]
-            
-            if isinstance(result_data, list):
-                print(f"✅ Result: {len(result_data)} items")
-                if verbose or len(result_data) <= 10:
-                    for item in result_data:
-                        print(f"   • {item}")
-                elif len(result_data) > 10:
-                    for item in result_data[:5]:
-                        print(f"   • {item}")
-                    print(f"   ... and {len(result_data) - 5} more")
-            
-            elif isinstance(result_data, str):
-                if len(result_data) > 300 and not verbose:
-                    print(f"✅ Result: {result_data[:300]}...")
-                    print(f"   (Total: {len(result_data)} characters)")
-                else:
-                    print(f"✅ Result: {result_data}")
-            else:
-                print(f"✅ Result: {result_data}")
-        
-        # Check for termination
-        if result.get("terminated"):
-            print("\n" + "=" * 70)
-            print("✅ AGENT COMPLETED TASK")
-            print("=" * 70)
-            break
-        
-        # Update conversation memory
-        action_summary = {
-            "tool_name": tool_name,
-            "args": tool_args
-        }
-        
-        memory.extend([
-            {"role": "assistant", "content": json.dumps(action_summary)},
-            {"role": "user", "content": json.dumps(result)}
-        ])
-    
-    if iteration >= max_iterations:
-        print("\n" + "=" * 70)
-        print("⚠️  MAXIMUM ITERATIONS REACHED")
-        print("=" * 70)
+    await run_agent_loop(
+        task,
+        model=model,
+        max_iterations=max_iterations,
+        verbose=verbose,
+        title="SIMPLE AGENT WITH NATIVE FUNCTION CALLING",
+        tools_line=f"🔧 Available tools: {len(TOOL_FUNCTIONS)}",
+        tools=TOOLS,
+        system_message=SYSTEM_MESSAGE,
+        execute_tool=execute_tool,
+        show_result=_show_result,
+    )
 
 
 # ============================================================================
@@ -479,9 +875,7 @@ Example Tasks:
     if args.task:
         task = args.task
     else:
-        print("\n" + "=" * 70)
-        print("🤖 SIMPLE AGENT WITH NATIVE FUNCTION CALLING")
-        print("=" * 70)
+        print(f"\n{HEAVY_RULE}\n🤖 SIMPLE AGENT WITH NATIVE FUNCTION CALLING\n{HEAVY_RULE}")
         print("\nWhat would you like me to do?")
         print("\nExample tasks:")
         print("  • What Python files are in this directory?")
@@ -497,12 +891,12 @@ Example Tasks:
     
     try:
         # Run the agent
-        run_agent(
+        asyncio.run(with_http_session(run_agent(
             task=task,
             model=args.model,
             max_iterations=args.max_iterations,
             verbose=args.verbose
-        )
+        )))
         
         return 0
         
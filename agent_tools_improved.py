@@ -19,15 +19,44 @@ except ModuleNotFoundError:
     )
 
 import os
+import stat
 import json
+import re
 import argparse
+import asyncio
+import fnmatch
+import functools
+import hashlib
+import inspect
+import itertools
+import mmap
 import time
 import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import List, Dict, Optional, Any, Callable
-from litellm import completion
+from typing import List, Dict, Optional, Any, Callable, Tuple
+import httpx  # installed with litellm
+import litellm
+from litellm import acompletion
 from litellm import exceptions as litellm_exceptions
 
+# orjson is several times faster than the stdlib json module; use it when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def json_dumps(value) -> str:
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
 # Load environment variables
 load_dotenv()
 
@@ -36,6 +65,38 @@ DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "gemini/gemini-1.5-flash")
 DEFAULT_MAX_ITERATIONS = int(os.getenv("DEFAULT_MAX_ITERATIONS", "10"))
 DEFAULT_MAX_TOKENS = int(os.getenv("DEFAULT_MAX_TOKENS", "1024"))
 
+# Once memory is estimated above MEMORY_TOKEN_BUDGET tokens, everything but
+# the last KEEP_RECENT_TURNS turns is folded into one summary message
+MEMORY_TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "4000"))
+KEEP_RECENT_TURNS = 4
+SUMMARY_PREFIX = "[Prior actions summary]:\n"
+# Results at least this long are sent once; repeats within the kept turns
+# point back to the earlier iteration instead
+DEDUP_MIN_CHARS = 200
+
+# Prompt-cache breakpoint for providers that need explicit markers
+EPHEMERAL_CACHE = {"type": "ephemeral"}
+
+# One ```action block; compiled once and shared by the streaming scan and
+# parse_actions. The lazy body can't backtrack past the closing fence.
+ACTION_BLOCK_RE = re.compile(r"```action\s*(.*?)```", re.DOTALL)
+
+# Tool results longer than RESULT_INLINE_LIMIT characters go into memory as
+# a preview plus a reference; fetch_result returns slices of the full text
+RESULT_INLINE_LIMIT = 4096
+RESULT_PREVIEW = 512
+RESULT_FETCH_MAX = 16 * 1024
+RESULT_STORE_MAX_ENTRIES = 256
+
+DIR_CACHE_MAX_ENTRIES = 256
+
+# read_file decodes files at least this large straight from an mmap of the
+# page cache instead of reading them into a buffer first
+READ_MMAP_MIN_BYTES = 1024 * 1024
+
+# read_files keeps at most this many reads in flight
+READ_FILES_CONCURRENCY = 8
+
 
 # ============================================================================
 # UTILITY FUNCTIONS
@@ -86,7 +147,7 @@ def safe_json_parse(text: str) -> Optional[Dict]:
         Parsed dictionary or None if parsing fails
     """
     try:
-        return json.loads(text)
+        return json_loads(text)
     except json.JSONDecodeError as e:
         print(f"⚠️  JSON parse error: {e}")
         return None
@@ -96,20 +157,51 @@ def safe_json_parse(text: str) -> Optional[Dict]:
 # LLM INTERACTION
 # ============================================================================
 
-def generate_response(
+def _make_http_client() -> httpx.AsyncClient:
+    """
+    Build the keep-alive connection pool shared by every acompletion() call.
+    
+    HTTP/2 needs the optional 'h2' package; without it the pool still reuses
+    HTTP/1.1 connections, which is what saves the TCP+TLS handshake.
+    """
+    limits = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+    try:
+        return httpx.AsyncClient(http2=True, limits=limits, timeout=60.0)
+    except ImportError:
+        return httpx.AsyncClient(limits=limits, timeout=60.0)
+
+
+async def with_http_session(coro):
+    """Await coro with one AsyncClient installed as litellm's session, then close it."""
+    async with _make_http_client() as client:
+        litellm.aclient_session = client
+        try:
+            return await coro
+        finally:
+            litellm.aclient_session = None
+
+
+async def generate_response(
     messages: List[Dict],
     model: str = DEFAULT_MODEL,
     max_tokens: int = DEFAULT_MAX_TOKENS,
-    verbose: bool = False
+    verbose: bool = False,
+    on_action: Optional[Callable[[str], None]] = None
 ) -> str:
     """
-    Generate a response from the LLM.
+    Stream a response from the LLM.
+    
+    Chunks are collected in a list and joined once at the end. When
+    on_action is given, it is called with the text of each ```action block
+    as soon as the block's closing fence arrives, so tools can start while
+    the rest of the response is still being generated.
     
     Args:
         messages: List of conversation messages
         model: Model identifier
         max_tokens: Maximum tokens in response
         verbose: Whether to print debug info
+        on_action: Called with each complete action block's text
     
     Returns:
         The generated response text
@@ -117,23 +209,86 @@ def generate_response(
     if verbose:
         print(f"🔄 Calling LLM ({model})...")
     
+    in_on_action = False  # exceptions raised by on_action are not LLM errors
     try:
-        response = completion(
+        stream = await acompletion(
             model=model,
             messages=messages,
-            max_tokens=max_tokens
+            max_tokens=max_tokens,
+            stream=True
         )
-        return response.choices[0].message.content.strip()
+        parts: List[str] = []
+        pending = ""  # text after the last complete action block
+        async for chunk in stream:
+            if not chunk.choices:
+                continue  # e.g. a trailing usage-only chunk
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            parts.append(delta)
+            if on_action is None:
+                continue
+            pending += delta
+            if "`" not in delta:
+                continue  # a block can only complete on a chunk holding its closing fence
+            while True:
+                match = ACTION_BLOCK_RE.search(pending)
+                if match is None:
+                    break
+                pending_action, pending = match.group(1), pending[match.end():]
+                in_on_action = True
+                on_action(pending_action)
+                in_on_action = False
+        return "".join(parts).strip()
     except Exception as e:
-        print(f"❌ Error calling LLM: {e}")
+        if not in_on_action:
+            print(f"❌ Error calling LLM: {e}")
         raise
 
 
-def parse_action(response: str, verbose: bool = False) -> Dict:
+def _validate_action(action_text: str) -> Dict:
+    """
+    Parse one action block's JSON into an action dictionary.
+    
+    Args:
+        action_text: The JSON text inside an action block
+    
+    Returns:
+        Dictionary with 'tool_name' and 'args' keys; an 'error' action if the
+        text isn't a valid action
+    """
+    action_json = safe_json_parse(action_text)
+    
+    if not action_json:
+        return {
+            "tool_name": "error",
+            "args": {"message": "Failed to parse action JSON"}
+        }
+    
+    # Valid JSON that isn't an object (e.g. `5` or a list)
+    if not isinstance(action_json, dict):
+        return {
+            "tool_name": "error",
+            "args": {"message": "Action must be a JSON object"}
+        }
+    
+    # Validate required fields
+    if "tool_name" not in action_json or not isinstance(action_json.get("args"), dict):
+        return {
+            "tool_name": "error",
+            "args": {
+                "message": "Action must contain 'tool_name' and 'args' fields"
+            }
+        }
+    
+    return action_json
+
+
+def parse_actions(response: str, verbose: bool = False) -> List[Dict]:
     """
-    Parse the LLM response into a structured action dictionary.
+    Parse the LLM response into a list of structured action dictionaries.
     
-    Expected format:
+    Expected format (one or more blocks, run in order):
     ```action
     {
         "tool_name": "read_file",
@@ -141,51 +296,61 @@ def parse_action(response: str, verbose: bool = False) -> Dict:
     }
     ```
     
+    Several blocks in one response let the model batch independent steps
+    (e.g. reading three files) into a single LLM call.
+    
     Args:
         response: The raw LLM response
         verbose: Whether to print debug info
     
     Returns:
-        Dictionary with 'tool_name' and 'args' keys
+        List of dictionaries with 'tool_name' and 'args' keys
     """
     try:
-        # Extract the action block
-        action_text = extract_markdown_block(response, "action")
+        blocks = ACTION_BLOCK_RE.findall(response)
+        if not blocks:
+            # No explicit action block; fall back to the first code block
+            blocks = [extract_markdown_block(response, "action")]
         
-        # Parse JSON
-        action_json = safe_json_parse(action_text)
-        
-        if not action_json:
-            return {
-                "tool_name": "error",
-                "args": {"message": "Failed to parse action JSON"}
-            }
-        
-        # Validate required fields
-        if "tool_name" not in action_json or "args" not in action_json:
-            return {
-                "tool_name": "error",
-                "args": {
-                    "message": "Action must contain 'tool_name' and 'args' fields"
-                }
-            }
+        actions = [_validate_action(block) for block in blocks]
         
         if verbose:
-            print(f"✓ Parsed action: {action_json['tool_name']}")
+            print(f"✓ Parsed actions: {', '.join(a['tool_name'] for a in actions)}")
         
-        return action_json
+        return actions
         
     except Exception as e:
-        return {
+        return [{
             "tool_name": "error",
             "args": {"message": f"Error parsing action: {str(e)}"}
-        }
+        }]
 
 
 # ============================================================================
 # TOOL DEFINITIONS
 # ============================================================================
 
+# Directory listings keyed by (directory, [pattern,] mtime_ns). Adding or
+# removing an entry bumps the directory's mtime, so stale keys never match.
+_DIR_CACHE: "OrderedDict[Tuple, List[str]]" = OrderedDict()
+_dir_cache_lock = threading.Lock()
+
+
+def _dir_cache_get(key: Tuple) -> Optional[List[str]]:
+    with _dir_cache_lock:
+        listing = _DIR_CACHE.get(key)
+        if listing is not None:
+            _DIR_CACHE.move_to_end(key)
+        return listing
+
+
+def _dir_cache_put(key: Tuple, listing: List[str]) -> None:
+    with _dir_cache_lock:
+        _DIR_CACHE[key] = listing
+        if len(_DIR_CACHE) > DIR_CACHE_MAX_ENTRIES:
+            _DIR_CACHE.popitem(last=False)
+
+
 def list_files(directory: str = ".") -> List[str]:
     """
     List files in a directory.
@@ -197,12 +362,19 @@ def list_files(directory: str = ".") -> List[str]:
         List of file and directory names
     """
     try:
-        path = Path(directory)
-        if not path.exists():
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
             return [f"Error: Directory '{directory}' not found"]
         
-        items = [item.name for item in path.iterdir()]
-        return sorted(items)
+        key = (os.path.abspath(directory), mtime)
+        items = _dir_cache_get(key)
+        if items is None:
+            # scandir yields plain names; no Path object per entry
+            with os.scandir(directory) as entries:
+                items = sorted(entry.name for entry in entries)
+            _dir_cache_put(key, items)
+        return list(items)
     except Exception as e:
         return [f"Error listing files: {str(e)}"]
 
@@ -218,19 +390,32 @@ def read_file(file_name: str) -> str:
         File contents as a string, or error message
     """
     try:
-        path = Path(file_name)
-        if not path.exists():
+        # One stat answers existence, type and size
+        try:
+            st = os.stat(file_name)
+        except FileNotFoundError:
             return f"Error: File '{file_name}' not found"
         
-        if not path.is_file():
+        if not stat.S_ISREG(st.st_mode):
             return f"Error: '{file_name}' is not a file"
         
         # Check file size to avoid reading huge files
-        size_mb = path.stat().st_size / (1024 * 1024)
+        size_mb = st.st_size / (1024 * 1024)
         if size_mb > 10:
             return f"Error: File too large ({size_mb:.1f} MB). Maximum 10 MB."
         
-        return path.read_text(encoding='utf-8')
+        if st.st_size < READ_MMAP_MIN_BYTES:
+            with open(file_name, 'r', encoding='utf-8') as f:
+                return f.read()
+        
+        # Large file: decode from the mapping, so the only copy made is the
+        # resulting str. Newlines are normalized the way text mode would.
+        with open(file_name, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                text = str(mm, 'utf-8')
+        if '\r' in text:
+            text = text.replace('\r\n', '\n').replace('\r', '\n')
+        return text
         
     except UnicodeDecodeError:
         return f"Error: Cannot read '{file_name}' - not a text file"
@@ -238,6 +423,30 @@ def read_file(file_name: str) -> str:
         return f"Error reading file: {str(e)}"
 
 
+async def read_files(file_names: List[str]) -> Dict[str, str]:
+    """
+    Read several files concurrently.
+    
+    Each read runs read_file in a worker thread; a semaphore keeps at most
+    READ_FILES_CONCURRENCY of them in flight, enough to overlap I/O waits
+    without thrashing the disk.
+    
+    Args:
+        file_names: Names or paths of the files to read
+    
+    Returns:
+        Dictionary mapping each file name to its contents or an error message
+    """
+    semaphore = asyncio.Semaphore(READ_FILES_CONCURRENCY)
+    
+    async def read_one(file_name: str) -> str:
+        async with semaphore:
+            return await asyncio.to_thread(read_file, file_name)
+    
+    contents = await asyncio.gather(*(read_one(name) for name in file_names))
+    return dict(zip(file_names, contents))
+
+
 def write_file(file_name: str, content: str) -> str:
     """
     Write content to a file.
@@ -257,6 +466,17 @@ def write_file(file_name: str, content: str) -> str:
         return f"Error writing file: {str(e)}"
 
 
+@functools.lru_cache(maxsize=128)
+def _glob_regex(pattern: str) -> "re.Pattern[str]":
+    """Compile a flat glob pattern once; later searches reuse the regex."""
+    return re.compile(fnmatch.translate(pattern))
+
+
+def _is_flat(pattern: str) -> bool:
+    """True if a glob pattern only matches names inside one directory."""
+    return "/" not in pattern and "**" not in pattern
+
+
 def search_files(pattern: str, directory: str = ".") -> List[str]:
     """
     Search for files matching a pattern.
@@ -270,22 +490,149 @@ def search_files(pattern: str, directory: str = ".") -> List[str]:
     """
     try:
         path = Path(directory)
-        if not path.exists():
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except FileNotFoundError:
             return [f"Error: Directory '{directory}' not found"]
         
-        matches = [str(p.relative_to(path)) for p in path.glob(pattern)]
-        return sorted(matches) if matches else ["No files found matching pattern"]
+        # Only flat patterns are cached: the directory's mtime says nothing
+        # about changes inside subdirectories
+        cacheable = _is_flat(pattern)
+        key = (os.path.abspath(directory), pattern, mtime)
+        matches = _dir_cache_get(key) if cacheable else None
+        if matches is None:
+            if cacheable:
+                # Flat pattern: match names from one scandir pass instead
+                # of building and relativizing a Path per entry
+                match = _glob_regex(pattern).match
+                with os.scandir(directory) as entries:
+                    matches = sorted(entry.name for entry in entries if match(entry.name))
+                _dir_cache_put(key, matches)
+            elif pattern.startswith("**/") and _is_flat(pattern[3:]):
+                # "**/<name pattern>": match raw names during one os.walk,
+                # tracking each directory's relative prefix as a string
+                match = _glob_regex(pattern[3:]).match
+                matches = []
+                for root, dirs, files in os.walk(directory):
+                    prefix = os.path.relpath(root, directory)
+                    prefix = "" if prefix == "." else prefix + os.sep
+                    matches.extend(prefix + name for name in dirs if match(name))
+                    matches.extend(prefix + name for name in files if match(name))
+                matches.sort()
+            else:
+                matches = sorted(str(p.relative_to(path)) for p in path.glob(pattern))
+        return list(matches) if matches else ["No files found matching pattern"]
         
     except Exception as e:
         return [f"Error searching files: {str(e)}"]
 
 
+# Full text of results that were deferred out of memory, by reference
+_RESULTS: "OrderedDict[str, str]" = OrderedDict()
+_result_ids = itertools.count(1)
+
+
+def _defer_large_result(tool_name: str, result: Dict) -> Dict:
+    """
+    Swap a large tool result for a preview and a reference before it goes into memory.
+    
+    The model sees the first RESULT_PREVIEW characters and can fetch_result
+    only the parts it needs, instead of every later prompt carrying the
+    whole output.
+    
+    Args:
+        tool_name: Tool that produced the result
+        result: execute_tool's result dictionary
+    
+    Returns:
+        The result dictionary, with 'result' replaced by a reference if large
+    """
+    value = result.get("result")
+    if value is None or tool_name == "fetch_result":
+        return result  # fetch_result already returns a bounded slice
+    
+    text = value if isinstance(value, str) else json_dumps(value)
+    if len(text) <= RESULT_INLINE_LIMIT:
+        return result
+    
+    result_ref = f"res_{next(_result_ids)}"
+    _RESULTS[result_ref] = text
+    if len(_RESULTS) > RESULT_STORE_MAX_ENTRIES:
+        _RESULTS.popitem(last=False)
+    
+    return {
+        **result,
+        "result": {"result_ref": result_ref, "size": len(text), "preview": text[:RESULT_PREVIEW]},
+    }
+
+
+def fetch_result(result_ref: str, start: int = 0, end: Optional[int] = None) -> str:
+    """
+    Return part of a tool result that was stored by reference.
+    
+    Args:
+        result_ref: Reference from an earlier tool result (e.g. "res_3")
+        start: Character offset to start at
+        end: Character offset to stop at (default: start + 16K characters)
+    
+    Returns:
+        The requested slice, or an error message
+    """
+    text = _RESULTS.get(result_ref)
+    if text is None:
+        return f"Error: Unknown or expired result reference '{result_ref}'"
+    
+    start = max(0, start)
+    end = start + RESULT_FETCH_MAX if end is None else min(end, start + RESULT_FETCH_MAX)
+    chunk = text[start:end]
+    if start > 0 or start + len(chunk) < len(text):
+        return f"[chars {start}-{start + len(chunk)} of {len(text)}]\n{chunk}"
+    return chunk
+
+
 # Tool registry - maps tool names to their functions
 TOOLS: Dict[str, Callable] = {
     "list_files": list_files,
     "read_file": read_file,
+    "read_files": read_files,
     "write_file": write_file,
     "search_files": search_files,
+    "fetch_result": fetch_result,
+}
+
+
+def _make_caller(func: Callable) -> Callable[[Dict[str, Any]], Any]:
+    """
+    Bind a tool's parameter names once, at import.
+    
+    The returned caller checks the model's arguments against precomputed
+    required/allowed name sets and passes them positionally, so a bad call
+    is reported without invoking the tool.
+    """
+    params = tuple(
+        (p.name, p.default) for p in inspect.signature(func).parameters.values()
+    )
+    required = frozenset(name for name, default in params if default is inspect.Parameter.empty)
+    allowed = frozenset(name for name, _ in params)
+    
+    def call(args: Dict[str, Any]) -> Any:
+        keys = args.keys()
+        if not required <= keys:
+            raise TypeError(f"missing required argument(s): {', '.join(sorted(required - keys))}")
+        if not keys <= allowed:
+            raise TypeError(f"unexpected argument(s): {', '.join(sorted(keys - allowed))}")
+        return func(*[args.get(name, default) for name, default in params])
+    
+    if inspect.iscoroutinefunction(func):
+        # execute_tool runs in a worker thread, which has no event loop of
+        # its own; run async tools to completion there
+        return lambda args: asyncio.run(call(args))
+    return call
+
+
+# Tool name -> prebound caller, built once from TOOLS
+_DISPATCH: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    name: _make_caller(func) for name, func in TOOLS.items()
 }
 
 
@@ -310,6 +657,17 @@ TOOL_SCHEMAS = {
             }
         }
     },
+    "read_files": {
+        "description": "Reads several text files concurrently and returns a mapping of file name "
+                       "to content. Prefer this over several read_file actions.",
+        "parameters": {
+            "file_names": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "Names or paths of the files to read"
+            }
+        }
+    },
     "write_file": {
         "description": "Writes content to a file, creating or overwriting it.",
         "parameters": {
@@ -337,6 +695,26 @@ TOOL_SCHEMAS = {
             }
         }
     },
+    "fetch_result": {
+        "description": "Returns part of a large earlier result that was given as a "
+                       "{result_ref, size, preview} reference (at most 16K characters per call).",
+        "parameters": {
+            "result_ref": {
+                "type": "string",
+                "description": "The result_ref from the earlier result"
+            },
+            "start": {
+                "type": "integer",
+                "description": "Character offset to start at (default: 0)",
+                "optional": True
+            },
+            "end": {
+                "type": "integer",
+                "description": "Character offset to stop at (default: start + 16384)",
+                "optional": True
+            }
+        }
+    },
     "terminate": {
         "description": "Ends the agent loop and provides a final summary to the user.",
         "parameters": {
@@ -349,25 +727,31 @@ TOOL_SCHEMAS = {
 }
 
 
+# The schemas never change, so they are serialized once. The compact form
+# also costs fewer prompt tokens than an indented dump.
+TOOLS_JSON = json_dumps(TOOL_SCHEMAS)
+
+
 # ============================================================================
 # AGENT SYSTEM PROMPT
 # ============================================================================
 
+@functools.lru_cache(maxsize=1)
 def get_system_prompt() -> str:
     """
     Generate the system prompt that defines agent behavior.
     
+    The prompt is static, so it is built once and reused by every run.
+    
     Returns:
         The complete system prompt as a string
     """
-    tools_json = json.dumps(TOOL_SCHEMAS, indent=2)
-    
     return f"""You are an autonomous AI agent that can perform tasks by using available tools.
 
 Available tools:
 
 ```json
-{tools_json}
+{TOOLS_JSON}
 ```
 
 IMPORTANT RULES:
@@ -377,6 +761,9 @@ IMPORTANT RULES:
 4. Always provide reasoning before choosing a tool
 5. When you've completed the task, use the "terminate" tool with a summary
 6. EVERY response MUST include an action in the specified format
+7. When several independent tool calls are needed (e.g. reading files A, B and C),
+   put one action block per call in the same response; they run in order and
+   their results come back together as a numbered list
 
 RESPONSE FORMAT:
 You must ALWAYS respond in this exact format:
@@ -408,6 +795,54 @@ Example response:
 # AGENT EXECUTION
 # ============================================================================
 
+def _describe_actions(response: str) -> str:
+    """Render the action blocks of one response as 'tool(args)' for the summary."""
+    calls = []
+    for block in ACTION_BLOCK_RE.findall(response):
+        try:
+            action = json_loads(block)
+            calls.append(f"{action['tool_name']}({json_dumps(action.get('args', {}))})")
+        except (ValueError, KeyError, TypeError, AttributeError):
+            calls.append("(invalid action)")
+    return "; ".join(calls) or "(no action)"
+
+
+def _summarize_tool_output(content: str) -> str:
+    """Shorten a serialized tool result for the prior-actions summary."""
+    return content if len(content) <= 100 else f"{content[:100]}... ({len(content)} characters)"
+
+
+def compact_memory(memory: List[Dict], keep_turns: int = KEEP_RECENT_TURNS) -> None:
+    """
+    Fold older turns into one summary message, in place.
+    
+    The system prompt, the task and the last keep_turns turns (assistant
+    response plus its results) are kept verbatim; everything in between
+    becomes a single "[Prior actions summary]" user message, one line per
+    turn. An existing summary is extended rather than replaced.
+    
+    Args:
+        memory: Conversation messages, modified in place
+        keep_turns: Number of recent turns to keep verbatim
+    """
+    head, rest = memory[:2], memory[2:]
+    lines: List[str] = []
+    if rest and rest[0]["role"] == "user" and rest[0]["content"].startswith(SUMMARY_PREFIX):
+        lines.append(rest[0]["content"][len(SUMMARY_PREFIX):])
+        rest = rest[1:]
+    
+    # rest alternates assistant response, user results
+    cut = len(rest) - 2 * keep_turns
+    if cut <= 0:
+        return
+    for response, results in zip(rest[:cut:2], rest[1:cut:2]):
+        lines.append(
+            f"- {_describe_actions(response['content'])} -> {_summarize_tool_output(results['content'])}"
+        )
+    
+    memory[:] = head + [{"role": "user", "content": SUMMARY_PREFIX + "\n".join(lines)}] + rest[cut:]
+
+
 def execute_tool(tool_name: str, args: Dict[str, Any], verbose: bool = False) -> Dict:
     """
     Execute a tool with the given arguments.
@@ -426,15 +861,18 @@ def execute_tool(tool_name: str, args: Dict[str, Any], verbose: bool = False) ->
     if tool_name == "error":
         return {"error": args.get("message", "Unknown error")}
     
-    if tool_name not in TOOLS:
+    caller = _DISPATCH.get(tool_name)
+    if caller is None:
         return {"error": f"Unknown tool: {tool_name}"}
     
+    if not isinstance(args, dict):
+        return {"error": f"Invalid arguments for {tool_name}: 'args' must be an object"}
+    
     try:
         if verbose:
             print(f"🔧 Executing: {tool_name}({args})")
         
-        tool_func = TOOLS[tool_name]
-        result = tool_func(**args)
+        result = caller(args)
         
         return {"result": result}
         
@@ -444,7 +882,19 @@ def execute_tool(tool_name: str, args: Dict[str, Any], verbose: bool = False) ->
         return {"error": f"Error executing {tool_name}: {str(e)}"}
 
 
-def run_agent(
+async def _run_after(
+    previous: Optional["asyncio.Task"],
+    tool_name: str,
+    args: Dict[str, Any],
+    verbose: bool
+) -> Dict:
+    """Run one tool in a worker thread once the previous action in its batch has finished."""
+    if previous is not None:
+        await asyncio.gather(previous, return_exceptions=True)
+    return await asyncio.to_thread(execute_tool, tool_name, args, verbose)
+
+
+async def run_agent(
     task: str,
     model: str = DEFAULT_MODEL,
     max_iterations: int = DEFAULT_MAX_ITERATIONS,
@@ -468,98 +918,188 @@ def run_agent(
     Returns:
         The final summary message from the agent
     """
-    print("\n" + "=" * 70)
-    print("🤖 AI AGENT WITH TOOL CALLING")
-    print("=" * 70)
-    print(f"\n📋 Task: {task}")
-    print(f"🔧 Available tools: {', '.join(TOOLS.keys())}")
-    print(f"🔄 Max iterations: {max_iterations}")
-    print("\n" + "-" * 70)
+    # Output is buffered and written once before each wait on the LLM or
+    # tools (and once before returning) instead of one write per line
+    lines: List[str] = []
+    emit = lines.append
+    
+    def flush() -> None:
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+            lines.clear()
     
-    # Initialize agent memory
+    emit("\n" + "=" * 70)
+    emit("🤖 AI AGENT WITH TOOL CALLING")
+    emit("=" * 70)
+    emit(f"\n📋 Task: {task}")
+    emit(f"🔧 Available tools: {', '.join(TOOLS.keys())}")
+    emit(f"🔄 Max iterations: {max_iterations}")
+    emit("\n" + "-" * 70)
+    
+    # Initialize agent memory. The system prompt is the same on every call;
+    # Anthropic only reuses a cached prefix up to an explicit marker, while
+    # OpenAI and Gemini cache identical prefixes automatically.
     system_prompt = get_system_prompt()
+    if model.startswith("anthropic/"):
+        system_content: Any = [{"type": "text", "text": system_prompt, "cache_control": EPHEMERAL_CACHE}]
+    else:
+        system_content = system_prompt
     memory = [
-        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": system_content},
         {"role": "user", "content": task}
     ]
     
+    # Digest of each large result -> iteration it was last sent in full
+    sent_results: Dict[bytes, int] = {}
+    
     iteration = 0
     
     # Main agent loop
     while iteration < max_iterations:
         iteration += 1
         
-        print(f"\n🔄 Iteration {iteration}/{max_iterations}")
-        print("-" * 70)
+        emit(f"\n🔄 Iteration {iteration}/{max_iterations}")
+        emit("-" * 70)
+        
+        # Step 1: Generate response from LLM. Each action block starts
+        # executing as soon as it has streamed in; actions still run one
+        # after another in the order they were written.
+        actions: List[Dict] = []
+        tasks: List["asyncio.Task"] = []
+        
+        def schedule(action: Dict) -> None:
+            if actions and actions[-1]["tool_name"] == "terminate":
+                return  # nothing runs after terminate
+            actions.append(action)
+            tasks.append(asyncio.create_task(_run_after(
+                tasks[-1] if tasks else None, action["tool_name"], action["args"], verbose
+            )))
         
-        # Step 1: Generate response from LLM
-        print("🧠 Agent thinking...")
+        # Set when scheduling an action (not the LLM call) raised
+        action_errors: List[Exception] = []
+        
+        def on_action(action_text: str) -> None:
+            try:
+                schedule(_validate_action(action_text))
+            except Exception as e:
+                action_errors.append(e)
+                raise
+        
+        emit("🧠 Agent thinking...")
+        flush()
         try:
-            response = generate_response(memory, model=model, verbose=verbose)
+            response = await generate_response(
+                memory, model=model, verbose=verbose, on_action=on_action
+            )
         except Exception as e:
-            print(f"❌ Failed to generate response: {e}")
+            for pending_task in tasks:
+                pending_task.cancel()
+            if action_errors:
+                raise
+            emit(f"❌ Failed to generate response: {e}")
+            flush()
             return "Agent failed due to LLM error"
         
         if verbose:
-            print(f"\n📝 Full response:\n{response}\n")
+            emit(f"\n📝 Full response:\n{response}\n")
         else:
             # Show just the reasoning part (before the action)
-            reasoning = response.split("```")[0].strip()
-            print(f"💭 Reasoning: {reasoning[:200]}...")
-        
-        # Step 2: Parse the action
-        action = parse_action(response, verbose=verbose)
-        tool_name = action["tool_name"]
-        tool_args = action["args"]
+            fence = response.find("```")
+            reasoning = (response if fence < 0 else response[:fence]).strip()
+            emit(f"💭 Reasoning: {reasoning[:200]}...")
         
-        print(f"🔧 Action: {tool_name}")
-        if tool_args:
-            print(f"   Args: {tool_args}")
+        # Step 2: Parse the actions (one or more batched steps). Responses
+        # without a fenced action block are parsed once streaming is done.
+        if not actions:
+            for action in parse_actions(response, verbose=verbose):
+                schedule(action)
+        elif verbose:
+            emit(f"✓ Parsed actions: {', '.join(a['tool_name'] for a in actions)}")
         
-        # Step 3: Execute the tool
-        result = execute_tool(tool_name, tool_args, verbose=verbose)
+        # Step 3: Wait for the tools (most have finished by now)
+        flush()
+        executed = await asyncio.gather(*tasks)
+        results = []
         
-        # Step 4: Display result
-        if "error" in result:
-            print(f"❌ Error: {result['error']}")
-        else:
-            print(f"✅ Result: ", end="")
-            result_data = result.get("result", "")
-            if isinstance(result_data, list):
-                print(f"{len(result_data)} items")
-                if verbose:
-                    for item in result_data[:10]:
-                        print(f"   - {item}")
-                    if len(result_data) > 10:
-                        print(f"   ... and {len(result_data) - 10} more")
-            elif isinstance(result_data, str):
-                if len(result_data) > 200 and not verbose:
-                    print(f"{result_data[:200]}... ({len(result_data)} chars total)")
-                else:
-                    print(result_data)
+        for number, (action, result) in enumerate(zip(actions, executed), 1):
+            tool_name = action["tool_name"]
+            tool_args = action["args"]
+            
+            label = f" {number}/{len(actions)}" if len(actions) > 1 else ""
+            emit(f"🔧 Action{label}: {tool_name}")
+            if tool_args:
+                emit(f"   Args: {tool_args}")
+            
+            results.append(result)
+            
+            # Step 4: Display result
+            if "error" in result:
+                emit(f"❌ Error: {result['error']}")
             else:
-                print(result_data)
-        
-        # Step 5: Check for termination
-        if tool_name == "terminate":
-            print("\n" + "=" * 70)
-            print("✅ AGENT COMPLETED TASK")
-            print("=" * 70)
-            return tool_args.get("message", "Task completed")
+                result_data = result.get("result", "")
+                if isinstance(result_data, list):
+                    emit(f"✅ Result: {len(result_data)} items")
+                    if verbose:
+                        for item in result_data[:10]:
+                            emit(f"   - {item}")
+                        if len(result_data) > 10:
+                            emit(f"   ... and {len(result_data) - 10} more")
+                elif isinstance(result_data, str):
+                    if len(result_data) > 200 and not verbose:
+                        emit(f"✅ Result: {result_data[:200]}... ({len(result_data)} chars total)")
+                    else:
+                        emit(f"✅ Result: {result_data}")
+                else:
+                    emit(f"✅ Result: {result_data}")
+            
+            # Step 5: Check for termination
+            if tool_name == "terminate":
+                emit("\n" + "=" * 70)
+                emit("✅ AGENT COMPLETED TASK")
+                emit("=" * 70)
+                flush()
+                return tool_args.get("message", "Task completed")
         
-        # Step 6: Update memory
+        # Step 6: Update memory. A batch's results are numbered so the model
+        # can tell which steps are done and only re-issue the ones that failed.
+        # A large result identical to one sent in a turn that is still kept
+        # verbatim (e.g. re-reading an unchanged file) is sent as a pointer.
+        for index, result in enumerate(results):
+            text = json_dumps(result)
+            if len(text) < DEDUP_MIN_CHARS:
+                continue
+            digest = hashlib.blake2b(text.encode(), digest_size=16).digest()
+            previous = sent_results.get(digest)
+            if previous is not None and iteration - previous < KEEP_RECENT_TURNS:
+                turns_ago = iteration - previous
+                results[index] = {"result": f"Unchanged: identical to the result {turns_ago} turn(s) ago"}
+            else:
+                sent_results[digest] = iteration
+        results = [
+            _defer_large_result(action["tool_name"], result)
+            for action, result in zip(actions, results)
+        ]
+        if len(results) == 1:
+            feedback = json_dumps(results[0])
+        else:
+            feedback = json_dumps([{"action": number, **result} for number, result in enumerate(results, 1)])
         memory.extend([
             {"role": "assistant", "content": response},
-            {"role": "user", "content": json.dumps(result)}
+            {"role": "user", "content": feedback}
         ])
+        if litellm.token_counter(model=model, messages=memory) > MEMORY_TOKEN_BUDGET:
+            compact_memory(memory)
         
         # Prevent infinite loops
         if iteration >= max_iterations:
-            print("\n" + "=" * 70)
-            print("⚠️  MAXIMUM ITERATIONS REACHED")
-            print("=" * 70)
+            emit("\n" + "=" * 70)
+            emit("⚠️  MAXIMUM ITERATIONS REACHED")
+            emit("=" * 70)
+            flush()
             return "Agent reached maximum iterations without completing task"
     
+    flush()
     return "Agent loop completed"
 
 
@@ -652,12 +1192,12 @@ Example Tasks:
     
     try:
         # Run the agent
-        final_message = run_agent(
+        final_message = asyncio.run(with_http_session(run_agent(
             task=task,
             model=args.model,
             max_iterations=args.max_iterations,
             verbose=args.verbose
-        )
+        )))
         
         print(f"\n📊 Final Summary:\n{final_message}\n")
         return 0
@@ -1,3 +1,26 @@
+# numba (with numpy) compiles the generation loop to native code; without
+# them fibonacci runs the same loop in Python
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    njit = None
+
+# F(92) is the largest Fibonacci number that fits in int64. For n up to it
+# the compiled loop stops before computing anything past F(93), and at most
+# F(0)..F(91) are returned.
+FIB_INT64_LIMIT = 7540113804746346429
+FIB_INT64_COUNT = 92
+
+if njit is not None:
+    @njit(cache=True)
+    def _fib_core(n, out):
+        a, b, i = 0, 1, 0
+        while a < n:
+            out[i] = a
+            i += 1
+            a, b = b, a + b
+        return i
 
 
 def fibonacci(n):
@@ -26,6 +49,13 @@ def fibonacci(n):
     Note: If you'd like the Fibonacci series to a specific term or position rather than up to a number, 
     you will need a different function.
     """
+    # Positive integer limits whose sequence fits in int64 take the compiled
+    # path; anything larger needs Python's big integers, and n <= 0 (which
+    # may not fit in int64 either) just returns []
+    if njit is not None and type(n) is int and 0 < n <= FIB_INT64_LIMIT:
+        out = np.empty(FIB_INT64_COUNT, dtype=np.int64)
+        count = _fib_core(n, out)
+        return out[:count].tolist()
 
     result = []
     a, b = 0, 1
@@ -39,15 +69,6 @@ def fibonacci(n):
 import unittest
 
 
-def fibonacci(n):
-    result = []
-    a, b = 0, 1
-    while a < n:
-        result.append(a)
-        a, b = b, a+b
-    return result
-
-
 class TestFibonacci(unittest.TestCase):
 
     def test_basic_functionality(self):
@@ -61,6 +82,7 @@ class TestFibonacci(unittest.TestCase):
     def test_edge_cases(self):
         self.assertEqual(fibonacci(0), [])
         self.assertEqual(fibonacci(-2), [])
+        self.assertEqual(fibonacci(-2**70), [])
 
     def test_error_cases(self):
         with self.assertRaises(TypeError):
@@ -53,30 +53,37 @@ def insert_interval(intervals, new_interval):
         - New interval is completely before or after all existing intervals.
         - Intervals with zero length (start == end), if such cases are valid.
     """
-    result = []
-    i = 0
     n = len(intervals)
 
-    # Add all intervals before the new interval
-    while i < n and intervals[i][1] < new_interval[0]:
-        result.append(intervals[i])
-        i += 1
+    # The intervals are sorted and disjoint, so both their starts and their
+    # ends are ascending: two binary searches find the merge window.
+    # lo: first interval that ends at or after the new interval starts
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if intervals[mid][1] < new_interval[0]:
+            lo = mid + 1
+        else:
+            hi = mid
+    left = lo
+
+    # right: first interval that starts after the new interval ends
+    lo, hi = left, n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if intervals[mid][0] <= new_interval[1]:
+            lo = mid + 1
+        else:
+            hi = mid
+    right = lo
 
     # Merge overlapping intervals with the new interval
-    while i < n and intervals[i][0] <= new_interval[1]:
-        new_interval[0] = min(new_interval[0], intervals[i][0])
-        new_interval[1] = max(new_interval[1], intervals[i][1])
-        i += 1
+    if left < right:
+        new_interval[0] = min(new_interval[0], intervals[left][0])
+        new_interval[1] = max(new_interval[1], intervals[right - 1][1])
 
-    # Add the merged new interval
-    result.append(new_interval)
-
-    # Add remaining intervals after the new interval
-    while i < n:
-        result.append(intervals[i])
-        i += 1
-
-    return result
+    # Intervals before, the merged new interval, then the remaining intervals
+    return intervals[:left] + [new_interval] + intervals[right:]
 
 
 import unittest
@@ -0,0 +1,155 @@
+"""
+LLM Response Cache
+
+Small disk cache shared by the scripts in this repo. Responses are stored
+one file per request, sharded into 256 subdirectories and keyed by a hash
+of the messages and model options, so identical deterministic
+(temperature=0) requests can be answered without another API call.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+# Entries kept in memory in front of the disk cache
+MEMORY_CACHE_MAX_ENTRIES = 1024
+
+# Mixed into every key; bump it when the key or value layout changes so old
+# entries simply stop matching
+CACHE_SCHEMA_VERSION = 2
+
+# BLAKE3 hashes several times faster than SHA-256; use it when installed
+try:
+    from blake3 import blake3 as _key_hash
+except ImportError:
+    _key_hash = hashlib.sha256
+
+# Keys over this size are hashed on all cores (blake3 only)
+PARALLEL_HASH_MIN_BYTES = 1 << 20
+
+# orjson sorts keys and serializes in native code; use it when installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# The two serializers disagree on some values (float formatting, NaN,
+# non-string dict keys), so the one in use is part of every key
+_SERIALIZER = "orjson" if orjson is not None else "json"
+
+
+def _canonical_json(value) -> bytes:
+    """Serialize value with sorted keys, as UTF-8 bytes ready for hashing."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SORT_KEYS, default=str)
+    return json.dumps(value, sort_keys=True, default=str, separators=(",", ":"),
+                      ensure_ascii=False).encode('utf-8')
+
+
+# Recently read or written values keyed by (cache_dir, key), so a repeat
+# hit in the same process skips the file read. Misses are not remembered,
+# since another process may write the entry later.
+_MEMORY_CACHE: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+_memory_cache_lock = threading.Lock()
+
+# Shard directories already created by write_cache in this process
+_created_dirs = set()
+
+
+def _memory_cache_put(slot: Tuple[str, str], value: str) -> None:
+    with _memory_cache_lock:
+        _MEMORY_CACHE[slot] = value
+        _MEMORY_CACHE.move_to_end(slot)
+        if len(_MEMORY_CACHE) > MEMORY_CACHE_MAX_ENTRIES:
+            _MEMORY_CACHE.popitem(last=False)
+
+
+def _entry_path(cache_dir: str, key: str) -> Path:
+    """Shard entries by the first two hex digits so no directory grows huge."""
+    return Path(cache_dir) / key[:2] / key[2:]
+
+
+def make_cache_key(messages: List[Dict], options: Dict) -> str:
+    """
+    Create a unique cache key based on messages and model options.
+
+    This allows us to reuse previous API responses when the exact same
+    request is made, saving both time and money.
+
+    Args:
+        messages: The conversation messages
+        options: Model configuration options; include the model and every
+            sampling parameter sent with the request
+
+    Returns:
+        A BLAKE3 (or SHA-256, without the blake3 package) hex digest
+    """
+    key_obj = {
+        "version": CACHE_SCHEMA_VERSION,
+        "serializer": _SERIALIZER,
+        "messages": messages,
+        "options": options,
+    }
+    data = _canonical_json(key_obj)
+    if len(data) >= PARALLEL_HASH_MIN_BYTES and _key_hash is not hashlib.sha256:
+        return _key_hash(data, max_threads=_key_hash.AUTO).hexdigest()
+    return _key_hash(data).hexdigest()
+
+
+def read_cache(cache_dir: str, key: str) -> Optional[str]:
+    """
+    Read a cached response from disk.
+
+    Args:
+        cache_dir: Directory where cache files are stored
+        key: The cache key to look up
+
+    Returns:
+        The cached response text, or None if not found
+    """
+    slot = (str(cache_dir), key)
+    with _memory_cache_lock:
+        value = _MEMORY_CACHE.get(slot)
+        if value is not None:
+            _MEMORY_CACHE.move_to_end(slot)
+            return value
+
+    # Just try the read: a hit costs no extra stat and a miss costs nothing more
+    try:
+        value = _entry_path(cache_dir, key).read_bytes().decode('utf-8')
+    except FileNotFoundError:
+        return None
+    _memory_cache_put(slot, value)
+    return value
+
+
+def write_cache(cache_dir: str, key: str, value: str) -> None:
+    """
+    Write a response to the cache.
+
+    Args:
+        cache_dir: Directory where cache files are stored
+        key: The cache key to store under
+        value: The response text to cache
+    """
+    path = _entry_path(cache_dir, key)
+    if path.parent not in _created_dirs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _created_dirs.add(path.parent)
+    # Write to a private temp file and rename it into place, so a crash or a
+    # concurrent reader never sees a partially written entry
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    data = value.encode('utf-8')
+    try:
+        tmp.write_bytes(data)
+    except FileNotFoundError:
+        # The directory was removed after we created it (e.g. cache cleared)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(data)
+    os.replace(tmp, path)
+    _memory_cache_put((str(cache_dir), key), value)
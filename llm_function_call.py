@@ -5,9 +5,11 @@ except ModuleNotFoundError:
 
 import os
 import json
+import mmap
+import asyncio
 import argparse
 import time
-from litellm import completion
+from litellm import acompletion
 from litellm import exceptions as litellm_exceptions
 
 # Load environment variables from .env file
@@ -19,18 +21,38 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("GEMINI_API_KEY not found. Make sure it's in your .env file!")
 
-from litellm import completion
 from typing import List, Dict
 
+# Files at least this large are decoded from an mmap instead of read() into a buffer
+READ_MMAP_MIN_BYTES = 1024 * 1024
+
+# Last listing of "." and the directory mtime it was taken at; any entry
+# added, removed or renamed bumps the mtime and forces a rescan
+_dir_cache = {"mtime": None, "entries": None}
+
 def list_files() -> List[str]:
     """List files in the current directory."""
-    return os.listdir(".")
+    mtime = os.stat(".").st_mtime_ns
+    if mtime != _dir_cache["mtime"]:
+        _dir_cache["entries"] = tuple(os.listdir("."))
+        _dir_cache["mtime"] = mtime
+    # A fresh list each call, so callers can't alter the cached listing
+    return list(_dir_cache["entries"])
 
 def read_file(file_name: str) -> str:
     """Read a file's contents."""
     try:
-        with open(file_name, "r") as file:
-            return file.read()
+        with open(file_name, "rb") as file:
+            if os.fstat(file.fileno()).st_size < READ_MMAP_MIN_BYTES:
+                text = file.read().decode("utf-8")
+            else:
+                # Decode straight from the mapping, so the only copy is the str
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    text = str(mm, "utf-8")
+        # Normalize newlines the way text mode would
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
     except FileNotFoundError:
         return f"Error: {file_name} not found."
     except Exception as e:
@@ -66,34 +88,58 @@ tools = [
 ]
 
 # Our rules are simplified since we don't have to worry about getting a specific output format
-agent_rules = [{
-    "role": "system",
-    "content": """
+AGENT_RULES_TEXT = """
 You are an AI agent that can perform tasks by using available tools.
 
 If a user asks about files, documents, or content, first list the files before reading them.
 """
-}]
-
-user_task = input("What would you like me to do? ")
-
-memory = [{"role": "user", "content": user_task}]
-
-messages = agent_rules + memory
-
-response = completion(
-    model=DEFAULT_MODEL,
-    messages=messages,
-    tools=tools,
-    max_tokens=1024
-)
-
-# Extract the tool call from the response, note we don't have to parse now!
-tool = response.choices[0].message.tool_calls[0]
-tool_name = tool.function.name
-tool_args = json.loads(tool.function.arguments)
-result = tool_functions[tool_name](**tool_args)
 
-print(f"Tool Name: {tool_name}")
-print(f"Tool Arguments: {tool_args}")
-print(f"Result: {result}")
\ No newline at end of file
+# The tools + system prefix never changes, so let the provider cache it.
+# OpenAI and Gemini cache identical prefixes automatically; Anthropic needs
+# an explicit breakpoint, which also covers the tool schemas before it.
+if DEFAULT_MODEL.startswith("anthropic/"):
+    agent_rules = [{
+        "role": "system",
+        "content": [{"type": "text", "text": AGENT_RULES_TEXT, "cache_control": {"type": "ephemeral"}}]
+    }]
+else:
+    agent_rules = [{"role": "system", "content": AGENT_RULES_TEXT}]
+
+async def run_tools(calls: List[tuple]) -> List:
+    """Run every (tool_name, tool_args) call at once; file reads overlap in worker threads."""
+    return await asyncio.gather(*(
+        asyncio.to_thread(tool_functions[tool_name], **tool_args)
+        for tool_name, tool_args in calls
+    ))
+
+
+async def main():
+    user_task = input("What would you like me to do? ")
+
+    memory = [{"role": "user", "content": user_task}]
+
+    messages = agent_rules + memory
+
+    response = await acompletion(
+        model=DEFAULT_MODEL,
+        messages=messages,
+        tools=tools,
+        max_tokens=1024
+    )
+
+    # Extract the tool calls from the response, note we don't have to parse now!
+    # The model may ask for several (e.g. one read_file per file); run them together
+    calls = [
+        (tool.function.name, json.loads(tool.function.arguments))
+        for tool in response.choices[0].message.tool_calls or []
+    ]
+    results = await run_tools(calls)
+
+    for (tool_name, tool_args), result in zip(calls, results):
+        print(f"Tool Name: {tool_name}")
+        print(f"Tool Arguments: {tool_args}")
+        print(f"Result: {result}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
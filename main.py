@@ -5,9 +5,14 @@ except ModuleNotFoundError:
 
 import os
 import argparse
+import json
 import time
-from litellm import completion
+from typing import Optional
+import httpx  # installed with litellm
+import litellm
+from litellm import completion, ModelResponse
 from litellm import exceptions as litellm_exceptions
+from llm_cache import make_cache_key, read_cache, write_cache
 
 # Load environment variables from .env file
 load_dotenv()
@@ -18,15 +23,54 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     raise ValueError("OPENAI_API_KEY not found. Make sure it's in your .env file!")
 
-def call_with_retries(api_key: str, model: str, messages: list, max_attempts: int = 3, base_sleep: float = 1.0):
+# Used only with --cache: this script checks that the key and endpoint work,
+# so by default every run makes a real call
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+
+def make_http_client() -> httpx.Client:
+    """
+    Build one keep-alive connection pool for every completion() call, so retries
+    reuse the open connection instead of repeating the TCP+TLS handshake.
+    HTTP/2 needs the optional 'h2' package; without it HTTP/1.1 keep-alive is used.
+    """
+    limits = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+    try:
+        return httpx.Client(http2=True, limits=limits, timeout=60.0)
+    except ImportError:
+        return httpx.Client(limits=limits, timeout=60.0)
+
+def retry_after_seconds(error: Exception):
+    """
+    Return the server's Retry-After hint in seconds, or None if it sent none.
+    Only the delta-seconds form is used; an HTTP-date falls back to backoff.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+def call_with_retries(api_key: str, model: str, messages: list, max_attempts: int = 3, base_sleep: float = 1.0, cache_dir: Optional[str] = None):
     """
     Call litellm.completion with retry/backoff for RateLimitError.
+    When cache_dir is given, a response stored there for the same request is reused.
     """
+    cache_key = None
+    if cache_dir:
+        cache_key = make_cache_key(messages, {"model": model, "format": "model_response"})
+        cached_value = read_cache(cache_dir, cache_key)
+        if cached_value is not None:
+            return ModelResponse(**json.loads(cached_value))
     attempt = 0
     while True:
         attempt += 1
         try:
-            return completion(model=model, api_key=api_key, messages=messages)
+            response = completion(model=model, api_key=api_key, messages=messages)
+            if cache_key:
+                write_cache(cache_dir, cache_key, response.model_dump_json())
+            return response
         except litellm_exceptions.RateLimitError as e:
             # Friendly, actionable message for rate limiting
             print(f"RateLimitError (attempt {attempt}/{max_attempts}): {e}")
@@ -34,6 +78,9 @@ def call_with_retries(api_key: str, model: str, messages: list, max_attempts: in
                 print("Exceeded max retry attempts due to rate limiting. Please check your API plan, quota, and billing details: https://platform.openai.com/account/usage")
                 raise
             sleep_seconds = base_sleep * (2 ** (attempt - 1))
+            retry_after = retry_after_seconds(e)
+            if retry_after is not None:
+                sleep_seconds = min(sleep_seconds, retry_after)
             print(f"Sleeping for {sleep_seconds} seconds before retrying...")
             time.sleep(sleep_seconds)
         except Exception as e:
@@ -46,6 +93,7 @@ def main():
     parser = argparse.ArgumentParser(description="Test LiteLLM completion call (with retry & mock mode)")
     parser.add_argument('--mock', action='store_true', help='Skip the real API call and return a mock response')
     parser.add_argument('--retries', type=int, default=3, help='Max retry attempts for rate limits')
+    parser.add_argument('--cache', action='store_true', help=f'Reuse a response cached in {CACHE_DIR} (LLM_CACHE_DIR) instead of calling the API again')
     args = parser.parse_args()
 
     messages = [{"role": "user", "content": "Say hello using LiteLLM"}]
@@ -55,8 +103,9 @@ def main():
         print("Mock mode enabled — skipping real API call.")
         response = {"role": "assistant", "content": "Hello from LiteLLM (mock)!"}
     else:
+        litellm.client_session = make_http_client()
         # Call with a small retry/backoff loop for rate limits
-        response = call_with_retries(api_key=api_key, model="gpt-4.1", messages=messages, max_attempts=args.retries)
+        response = call_with_retries(api_key=api_key, model="gpt-4.1", messages=messages, max_attempts=args.retries, cache_dir=CACHE_DIR if args.cache else None)
 
     if response is not None:
         print("API response:")
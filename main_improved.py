@@ -13,9 +13,17 @@ except ModuleNotFoundError:
 
 import os
 import argparse
+import json
 import time
-from litellm import completion
-from litellm import exceptions as litellm_exceptions
+from typing import Optional
+from llm_cache import make_cache_key, read_cache, write_cache
+
+RETRIES_EXCEEDED_HELP = (
+    "\n❌ Exceeded maximum retry attempts.\n"
+    "   Please check:\n"
+    "   - Your API quota: https://platform.openai.com/account/usage\n"
+    "   - Your billing status: https://platform.openai.com/account/billing"
+)
 
 
 def load_api_key():
@@ -41,12 +49,33 @@ def load_api_key():
     return api_key
 
 
+def ensure_http_session():
+    """
+    Install one keep-alive connection pool as litellm's client session.
+    
+    Every completion() call (including retries) then reuses the open
+    connection instead of repeating the TCP+TLS handshake. HTTP/2 needs
+    the optional 'h2' package; without it HTTP/1.1 keep-alive is used.
+    """
+    import httpx  # installed with litellm
+    import litellm
+    
+    if litellm.client_session is not None:
+        return
+    limits = httpx.Limits(max_keepalive_connections=16, max_connections=32)
+    try:
+        litellm.client_session = httpx.Client(http2=True, limits=limits, timeout=60.0)
+    except ImportError:
+        litellm.client_session = httpx.Client(limits=limits, timeout=60.0)
+
+
 def call_with_retries(
     api_key: str,
     model: str,
     messages: list,
     max_attempts: int = 3,
-    base_sleep: float = 1.0
+    base_sleep: float = 1.0,
+    cache_dir: Optional[str] = None
 ):
     """
     Call the LiteLLM API with automatic retry logic for rate limit errors.
@@ -54,12 +83,16 @@ def call_with_retries(
     This function implements exponential backoff: if the API returns a rate limit
     error, it waits an increasing amount of time before retrying (1s, 2s, 4s, etc.)
     
+    With a cache_dir, responses are stored on disk and repeating the same
+    request returns the stored response without calling the API again.
+    
     Args:
         api_key: Your OpenAI API key
         model: The model to use (e.g., "gpt-4", "gpt-3.5-turbo")
         messages: List of message dictionaries with 'role' and 'content' keys
         max_attempts: Maximum number of retry attempts (default: 3)
         base_sleep: Base sleep time in seconds for exponential backoff (default: 1.0)
+        cache_dir: Directory for cached responses, or None (default) to always call the API
     
     Returns:
         dict: The API response object
@@ -68,40 +101,69 @@ def call_with_retries(
         RateLimitError: If max retry attempts are exceeded
         Exception: For any other API errors
     """
+    # litellm takes a second or more to import, so only pay for it here
+    # (--mock never gets this far)
+    from litellm import completion, ModelResponse
+    from litellm import exceptions as litellm_exceptions
+    
+    ensure_http_session()
+    
+    cache_key = None
+    if cache_dir:
+        cache_key = make_cache_key(messages, {"model": model, "format": "model_response"})
+        cached_value = read_cache(cache_dir, cache_key)
+        if cached_value is not None:
+            print(f"💾 Cache hit: {cache_key[:16]}...")
+            return ModelResponse(**json.loads(cached_value))
+    
     attempt = 0
     
     while True:
         attempt += 1
         try:
             print(f"Attempt {attempt}/{max_attempts}: Calling API...")
-            response = completion(model=model, api_key=api_key, messages=messages)
+            response = completion(
+                model=model,
+                api_key=api_key,
+                messages=messages
+            )
             print("✓ API call successful!")
+            if cache_key:
+                write_cache(cache_dir, cache_key, response.model_dump_json())
             return response
             
         except litellm_exceptions.RateLimitError as e:
-            print(f"⚠ Rate limit error on attempt {attempt}/{max_attempts}")
-            print(f"   Error details: {e}")
+            # Each report is written with a single print() call
+            report = (
+                f"⚠ Rate limit error on attempt {attempt}/{max_attempts}\n"
+                f"   Error details: {e}"
+            )
             
             if attempt >= max_attempts:
-                print("\n❌ Exceeded maximum retry attempts.")
-                print("   Please check:")
-                print("   - Your API quota: https://platform.openai.com/account/usage")
-                print("   - Your billing status: https://platform.openai.com/account/billing")
+                print(f"{report}\n{RETRIES_EXCEEDED_HELP}")
                 raise
             
             # Exponential backoff: wait longer after each failure
             sleep_seconds = base_sleep * (2 ** (attempt - 1))
-            print(f"   Retrying in {sleep_seconds} seconds...\n")
+            print(f"{report}\n   Retrying in {sleep_seconds} seconds...\n")
             time.sleep(sleep_seconds)
             
         except Exception as e:
-            print(f"\n❌ Unexpected error occurred:")
-            print(f"   Type: {type(e).__name__}")
-            print(f"   Message: {str(e)}")
+            print(
+                f"\n❌ Unexpected error occurred:\n"
+                f"   Type: {type(e).__name__}\n"
+                f"   Message: {str(e)}"
+            )
             raise
 
 
-def run_test_call(api_key: str, model: str = "gpt-3.5-turbo", mock: bool = False, max_retries: int = 3):
+def run_test_call(
+    api_key: str,
+    model: str = "gpt-3.5-turbo",
+    mock: bool = False,
+    max_retries: int = 3,
+    cache_dir: Optional[str] = None
+):
     """
     Run a test API call to verify everything is working.
     
@@ -110,6 +172,7 @@ def run_test_call(api_key: str, model: str = "gpt-3.5-turbo", mock: bool = False
         model: The model to use for the test
         mock: If True, skip the real API call and return a mock response
         max_retries: Maximum number of retry attempts for rate limits
+        cache_dir: Directory for cached responses, or None (default) to always call the API
     
     Returns:
         dict: The API response (real or mocked)
@@ -137,7 +200,8 @@ def run_test_call(api_key: str, model: str = "gpt-3.5-turbo", mock: bool = False
         api_key=api_key,
         model=model,
         messages=messages,
-        max_attempts=max_retries
+        max_attempts=max_retries,
+        cache_dir=cache_dir
     )
 
 
@@ -152,6 +216,7 @@ Examples:
   python main.py --mock             # Test without using API credits
   python main.py --model gpt-4      # Use a specific model
   python main.py --retries 5        # Allow more retry attempts
+  python main.py --cache            # Reuse a cached response if there is one
         """
     )
     
@@ -175,6 +240,13 @@ Examples:
         help='Maximum retry attempts for rate limits (default: 3)'
     )
     
+    parser.add_argument(
+        '--cache',
+        action='store_true',
+        help='Reuse a response cached in LLM_CACHE_DIR (default: .llm_cache) '
+             'instead of calling the API again'
+    )
+    
     args = parser.parse_args()
     
     print("=" * 60)
@@ -191,7 +263,8 @@ Examples:
             api_key=api_key,
             model=args.model,
             mock=args.mock,
-            max_retries=args.retries
+            max_retries=args.retries,
+            cache_dir=os.getenv("LLM_CACHE_DIR", ".llm_cache") if args.cache else None
         )
         
         # Display response
@@ -1,3 +1,5 @@
+from bisect import bisect_right
+from itertools import accumulate
 
 def max_running_time(tasks, N):
     """
@@ -41,26 +43,31 @@ def max_running_time(tasks, N):
     if not tasks:
         return 0
     
+    # prefix[i] is the sum of the first i tasks, so a segment starting at task
+    # s can extend to the last index e with prefix[e] <= prefix[s] + mid.
+    # Each feasibility check then jumps one segment per bisect instead of
+    # stepping through every task.
+    prefix = [0, *accumulate(tasks)]
+    n = len(tasks)
+
     # Helper function to check if tasks can be assigned within 'mid' time
     def can_assign(mid):
-        count = 1
-        total = 0
-        for task in tasks:
-            if task > mid:
+        count = 0
+        start = 0
+        while start < n:
+            end = bisect_right(prefix, prefix[start] + mid, start) - 1
+            if end == start:
                 return False  # Single task exceeds mid, impossible
-            if total + task <= mid:
-                total += task
-            else:
-                count += 1
-                total = task
-                if count > N:
-                    return False
+            count += 1
+            if count > N:
+                return False
+            start = end
         return True
 
     # The minimum possible maximum running time is at least the largest task
     low = max(tasks)
     # The maximum possible running time is the sum of all tasks
-    high = sum(tasks)
+    high = prefix[-1]
 
     max_time = 0
     while low <= high:
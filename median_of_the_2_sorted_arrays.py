@@ -1,3 +1,59 @@
+# numba (with numpy) compiles the partition search for numpy array inputs;
+# lists and other sequences always take the pure Python loop below
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(cache=True)
+    def _median_parts(nums1, nums2):
+        # Same search as find_median_sorted_arrays; returns (max_of_left,
+        # min_of_right), where min_of_right is only meaningful for even totals
+        if nums1.size > nums2.size:
+            nums1, nums2 = nums2, nums1
+        m, n = nums1.size, nums2.size
+        imin, imax = 0, m
+        half_len = (m + n + 1) // 2
+        while imin <= imax:
+            i = (imin + imax) // 2
+            j = half_len - i
+            if i < m and nums2[j - 1] > nums1[i]:
+                imin = i + 1
+            elif i > 0 and nums1[i - 1] > nums2[j]:
+                imax = i - 1
+            else:
+                if i == 0:
+                    max_of_left = nums2[j - 1]
+                elif j == 0:
+                    max_of_left = nums1[i - 1]
+                else:
+                    max_of_left = max(nums1[i - 1], nums2[j - 1])
+                if (m + n) % 2 == 1:
+                    return max_of_left, max_of_left
+                if i == m:
+                    min_of_right = nums2[j]
+                elif j == n:
+                    min_of_right = nums1[i]
+                else:
+                    min_of_right = min(nums1[i], nums2[j])
+                return max_of_left, min_of_right
+        raise ValueError("input arrays must be sorted")
+
+
+def _use_compiled(nums1, nums2):
+    """True for two 1-D int64 or float64 arrays of the same dtype, not both empty."""
+    return (
+        njit is not None
+        and isinstance(nums1, np.ndarray)
+        and isinstance(nums2, np.ndarray)
+        and nums1.ndim == 1
+        and nums2.ndim == 1
+        and nums1.dtype == nums2.dtype
+        and nums1.dtype in (np.int64, np.float64)
+        and nums1.size + nums2.size > 0
+    )
 
 def find_median_sorted_arrays(nums1, nums2):
     """
@@ -30,11 +86,19 @@ def find_median_sorted_arrays(nums1, nums2):
     - Arrays with negative numbers or floating point numbers.
     """
 
+    if _use_compiled(nums1, nums2):
+        max_of_left, min_of_right = _median_parts(nums1, nums2)
+        if (nums1.size + nums2.size) % 2 == 1:
+            return max_of_left
+        return (max_of_left + min_of_right) / 2.0
+
     # Ensure nums1 is the smaller array to optimize the binary search
     if len(nums1) > len(nums2):
         nums1, nums2 = nums2, nums1
 
     m, n = len(nums1), len(nums2)
+    if m + n == 0:
+        raise IndexError("cannot take the median of two empty arrays")
     imin, imax = 0, m
     half_len = (m + n + 1) // 2
 
@@ -42,36 +106,43 @@ def find_median_sorted_arrays(nums1, nums2):
         i = (imin + imax) // 2
         j = half_len - i
 
+        # Read the four partition neighbours once; None marks an edge.
+        # i < m implies j > 0 and i > 0 implies j < n, so the comparisons
+        # below never see None on the nums2 side.
+        left1 = nums1[i - 1] if i > 0 else None
+        right1 = nums1[i] if i < m else None
+        left2 = nums2[j - 1] if j > 0 else None
+        right2 = nums2[j] if j < n else None
+
         # Check if i is too small, need to move right
-        if i < m and nums2[j - 1] > nums1[i]:
+        if right1 is not None and left2 > right1:
             imin = i + 1
         # Check if i is too big, need to move left
-        elif i > 0 and nums1[i - 1] > nums2[j]:
+        elif left1 is not None and left1 > right2:
             imax = i - 1
         else:
             # i is perfect
-            if i == 0:
-                max_of_left = nums2[j - 1]
-            elif j == 0:
-                max_of_left = nums1[i - 1]
+            if left1 is None:
+                max_of_left = left2
+            elif left2 is None:
+                max_of_left = left1
             else:
-                max_of_left = max(nums1[i - 1], nums2[j - 1])
+                max_of_left = left1 if left1 >= left2 else left2
 
             # If total length is odd, median is max of left
             if (m + n) % 2 == 1:
                 return max_of_left
 
             # For even total length, need to find min of right
-            if i == m:
-                min_of_right = nums2[j]
-            elif j == n:
-                min_of_right = nums1[i]
+            if right1 is None:
+                min_of_right = right2
+            elif right2 is None:
+                min_of_right = right1
             else:
-                min_of_right = min(nums1[i], nums2[j])
+                min_of_right = right1 if right1 <= right2 else right2
 
             return (max_of_left + min_of_right) / 2.0
 
-
 import unittest
 
 class TestFindMedianSortedArrays(unittest.TestCase):
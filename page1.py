@@ -4,6 +4,7 @@ except ModuleNotFoundError:
     raise RuntimeError("Missing dependency: python-dotenv. Run 'python -m pip install -r requirements.txt' in your virtual environment.")
 
 import os
+import sys
 import argparse
 import time
 from litellm import completion
@@ -23,13 +24,24 @@ from typing import List, Dict
 
 
 def generate_response(messages: List[Dict]) -> str:
-    """Call LLM to get response"""
+    """Call LLM to get response, printing tokens as they arrive"""
     response = completion(
         model=DEFAULT_MODEL,
         messages=messages,
-        max_tokens=1024
+        max_tokens=1024,
+        stream=True
     )
-    return response.choices[0].message.content
+    parts = []
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        text = chunk.choices[0].delta.content or ""
+        if text:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+            parts.append(text)
+    sys.stdout.write("\n")
+    return "".join(parts)
 
 
 messages = [
@@ -37,8 +49,8 @@ messages = [
     {"role": "user", "content": "Write a function to swap the keys and values in a dictionary."}
 ]
 
+# The response is printed while it streams in
 response = generate_response(messages)
-print(response)
 
 # Respose of the model:
 
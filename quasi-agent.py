@@ -5,12 +5,17 @@ except ModuleNotFoundError:
 
 import os
 import argparse
+import asyncio
+import atexit
+import random
+import threading
 import time
-from litellm import completion
-from litellm import exceptions as litellm_exceptions
+# litellm is imported where it is first needed: it takes most of a second to
+# load, which --help and --mock runs never need to pay
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from .env file (set _LLMLITE_SKIP_DOTENV=1 to skip)
+if os.getenv("_LLMLITE_SKIP_DOTENV") != "1":
+   load_dotenv()
 
 # Read API key for Gemini Or OpenAI
 # api_key = os.getenv("OPENAI_API_KEY")
@@ -21,12 +26,52 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("GEMINI_API_KEY not found. Make sure it's in your .env file!")
 
-from typing import List, Dict
+from typing import Callable, List, Dict
 import sys
 import hashlib
+import functools
 import json
+import re
+import sqlite3
+import zlib
 from pathlib import Path
 
+# BLAKE3 is much faster than SHA-256 for large message histories; fall back to
+# the stdlib's BLAKE2b (also faster than SHA-256) when it is not installed.
+try:
+   from blake3 import blake3 as _cache_hasher
+except ImportError:
+   _cache_hasher = hashlib.blake2b
+# Keys over this size are hashed on all cores (blake3 only)
+PARALLEL_HASH_MIN_BYTES = 1 << 20
+
+# orjson serializes message histories several times faster than the stdlib;
+# the fallback uses the same compact separators so keys match either way.
+try:
+   import orjson
+except ImportError:
+   orjson = None
+
+# Cached responses are compressed with zstd when available (faster and smaller),
+# otherwise with the stdlib's zlib.
+try:
+   import zstandard
+   _ZC = zstandard.ZstdCompressor(level=3)
+   _ZD = zstandard.ZstdDecompressor()
+except ImportError:
+   _ZC = _ZD = None
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Optional semantic cache: near-duplicate prompts are served from a FAISS index
+# of sentence embeddings. Only used when SEMANTIC_CACHE is on and the extras
+# are installed.
+try:
+   import faiss
+   import numpy as np
+   from sentence_transformers import SentenceTransformer
+except ImportError:
+   faiss = None
+
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "openai/gpt-4")
 DEFAULT_MAX_TOKENS = int(os.getenv("DEFAULT_MAX_TOKENS", "1024"))
 DEFAULT_TEMPERATURE = float(os.getenv("DEFAULT_TEMPERATURE", "0.0"))
@@ -34,39 +79,370 @@ DEFAULT_TOP_P = float(os.getenv("DEFAULT_TOP_P", "1.0"))
 DEFAULT_RETRIES = int(os.getenv("DEFAULT_RETRIES", "3"))
 DEFAULT_BASE_SLEEP = float(os.getenv("DEFAULT_BASE_SLEEP", "1.0"))
 DEFAULT_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+MAX_BACKOFF_SECONDS = 30.0
+# Upper bound on in-flight requests when fanning out with agenerate_responses
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("DEFAULT_MAX_CONCURRENCY", "8"))
+# Where cached responses live: a local SQLite file under the cache dir, or a
+# Redis/Memcached server shared by every process pointed at LLM_CACHE_URL
+CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "sqlite").lower()
+CACHE_URL = os.getenv("LLM_CACHE_URL")
+if CACHE_BACKEND not in ("sqlite", "redis", "memcached"):
+   raise ValueError(f"LLM_CACHE_BACKEND must be sqlite, redis or memcached, not {CACHE_BACKEND!r}")
+# Cache is only enabled when LLM_CACHE_DIR (or a remote backend) is explicitly
+# set; resolved once at import
+CACHE_DIR = DEFAULT_CACHE_DIR if os.getenv("LLM_CACHE_DIR") or CACHE_BACKEND != "sqlite" else None
+# One pass over the response: optional language tag (python/python3/py), then
+# everything up to the closing fence (or end of text if the fence is missing).
+_CODE_BLOCK_RE = re.compile(r"```[ \t]*(?:python3?|py)?[ \t]*\n?(.*?)(?:```|\Z)", re.DOTALL)
+# Everything that is neither alphanumeric nor whitespace (\w also admits '_');
+# same characters as the str.isalnum()/isspace() test, removed in one C pass
+_FILENAME_UNSAFE_RE = re.compile(r"[^\w\s]|_")
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL", "0"))  # 0 = entries never expire
+# Semantic (near-duplicate) lookups are opt-in: LLM_SEMANTIC_CACHE=1 or --semantic-cache
+SEMANTIC_CACHE = os.getenv("LLM_SEMANTIC_CACHE", "0") == "1"
+SEMANTIC_CACHE_MODEL = os.getenv("SEMANTIC_CACHE_MODEL", "all-MiniLM-L6-v2")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+# Nearest neighbours checked for a matching conversation context per lookup
+SEMANTIC_CACHE_CANDIDATES = 8
+# Responses are appended to a JSONL file as they arrive; the FAISS index is
+# rewritten after this many new entries, and once more at exit
+SEMANTIC_INDEX_SAVE_EVERY = 32
+
+# cache_dir (or the remote backend's name) -> _SQLiteCache/_RedisCache/_MemcachedCache
+_cache_backends: Dict[str, object] = {}
+_cache_backends_lock = threading.Lock()
+_semantic_encoder = None
+_semantic_indexes: Dict[str, tuple] = {}
+# (cache_dir, scope) -> entries added to the index since it was last written
+_semantic_unsaved: Dict[tuple, int] = {}
+_semantic_lock = threading.Lock()
+# Model -> time.monotonic() before which requests to it wait locally (last 429)
+_cooldown_until: Dict[str, float] = {}
+# Models whose combined JSON answer was rejected or unparseable; later calls go
+# straight to the two plain requests
+_json_mode_failed: set = set()
+
+
+def _canonical_json(value) -> bytes:
+   """Key-sorted, compact JSON bytes used for cache keys."""
+   if orjson is not None:
+      return orjson.dumps(value, default=str, option=orjson.OPT_SORT_KEYS)
+   return json.dumps(value, sort_keys=True, default=str, separators=(",", ":"),
+                     ensure_ascii=False).encode('utf-8')
+
+
+@functools.lru_cache(maxsize=32)
+def _options_json(frozen_options: tuple) -> bytes:
+   """Serialize the (small, rarely changing) options once per distinct value."""
+   return _canonical_json(dict(frozen_options))
 
 
 def _make_cache_key(messages: List[Dict], options: Dict) -> str:
-   key_obj = {"messages": messages, "options": options}
-   key_json = json.dumps(key_obj, sort_keys=True, default=str)
-   return hashlib.sha256(key_json.encode('utf-8')).hexdigest()
-
-
-def _read_cache(cache_dir: str, key: str) -> str | None:
-   path = Path(cache_dir) / key
-   if path.exists():
-      return path.read_text(encoding='utf-8')
-   return None
-
-
-def _write_cache(cache_dir: str, key: str, value: str) -> None:
-   path = Path(cache_dir)
-   path.mkdir(parents=True, exist_ok=True)
-   (path / key).write_text(value, encoding='utf-8')
-
-
-def generate_response(messages: List[Dict], model: str | None = None, *,
-                      max_tokens: int = DEFAULT_MAX_TOKENS,
-                      temperature: float = DEFAULT_TEMPERATURE,
-                      top_p: float = DEFAULT_TOP_P,
-                      n: int = 1,
-                      presence_penalty: float | None = None,
-                      frequency_penalty: float | None = None,
-                      retries: int = DEFAULT_RETRIES,
-                      base_sleep: float = DEFAULT_BASE_SLEEP,
-                      cache_dir: str | None = None,
-                      verbose: bool = False) -> str:
-   """Call LLM to get response"""
+   key_json = _canonical_json(messages) + b"\n" + _options_json(tuple(sorted(options.items())))
+   if len(key_json) >= PARALLEL_HASH_MIN_BYTES and _cache_hasher is not hashlib.blake2b:
+      return _cache_hasher(key_json, max_threads=_cache_hasher.AUTO).hexdigest()
+   return _cache_hasher(key_json).hexdigest()
+
+
+def _compress_cache_value(value: str) -> bytes:
+   data = value.encode('utf-8')
+   return _ZC.compress(data) if _ZC is not None else zlib.compress(data, 3)
+
+
+def _decompress_cache_value(blob) -> str | None:
+   """Decode a stored value; the frame magic tells zstd and zlib blobs apart."""
+   if isinstance(blob, str):  # uncompressed row written by an older version
+      return blob
+   if blob[:4] == _ZSTD_MAGIC:
+      return _ZD.decompress(blob).decode('utf-8') if _ZD is not None else None
+   return zlib.decompress(blob).decode('utf-8')
+
+
+def _cache_ttl() -> int:
+   """CACHE_TTL_SECONDS as whole seconds for the remote servers; 0 = never expire."""
+   return max(1, round(CACHE_TTL_SECONDS)) if CACHE_TTL_SECONDS else 0
+
+
+class _SQLiteCache:
+   """Response cache in a local SQLite file under cache_dir."""
+
+   def __init__(self, cache_dir: str):
+      Path(cache_dir).mkdir(parents=True, exist_ok=True)
+      # get/set run in worker threads (asyncio.to_thread) that share this one
+      # connection, so access is serialized by self._lock
+      self._conn = sqlite3.connect(str(Path(cache_dir) / "cache.sqlite3"), check_same_thread=False)
+      self._conn.execute("PRAGMA journal_mode=WAL")
+      self._conn.execute("PRAGMA synchronous=NORMAL")
+      self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB, created REAL)")
+      self._lock = threading.Lock()
+
+   def get(self, key: str) -> str | None:
+      with self._lock:
+         row = self._conn.execute(
+            "SELECT value FROM cache WHERE key = ? AND created >= ?",
+            (key, time.time() - CACHE_TTL_SECONDS if CACHE_TTL_SECONDS else 0.0),
+         ).fetchone()
+      return _decompress_cache_value(row[0]) if row else None
+
+   def set(self, key: str, value: str) -> None:
+      now = time.time()
+      blob = _compress_cache_value(value)
+      with self._lock, self._conn:
+         self._conn.execute("INSERT OR REPLACE INTO cache (key, value, created) VALUES (?, ?, ?)",
+                            (key, blob, now))
+         if CACHE_TTL_SECONDS:
+            # Lazy expiry: prune stale rows whenever something new is written
+            self._conn.execute("DELETE FROM cache WHERE created < ?", (now - CACHE_TTL_SECONDS,))
+
+
+class _RedisCache:
+   """Response cache on the Redis server at LLM_CACHE_URL; the server expires entries."""
+
+   def __init__(self, url: str | None):
+      import redis
+      # redis.Redis checks a connection out of its pool per command, so it is
+      # safe to share between threads without a lock
+      self._client = redis.Redis.from_url(url or "redis://localhost:6379/0")
+
+   def get(self, key: str) -> str | None:
+      blob = self._client.get(key)
+      return _decompress_cache_value(blob) if blob is not None else None
+
+   def set(self, key: str, value: str) -> None:
+      self._client.set(key, _compress_cache_value(value), ex=_cache_ttl() or None)
+
+
+class _MemcachedCache:
+   """Response cache on the Memcached server at LLM_CACHE_URL; the server expires entries."""
+
+   def __init__(self, url: str | None):
+      from pymemcache.client.base import PooledClient
+      # Unlike the plain Client, PooledClient is thread-safe
+      self._client = PooledClient(url or "localhost:11211")
+
+   def get(self, key: str) -> str | None:
+      blob = self._client.get(key)
+      return _decompress_cache_value(blob) if blob is not None else None
+
+   def set(self, key: str, value: str) -> None:
+      self._client.set(key, _compress_cache_value(value), expire=_cache_ttl())
+
+
+def _cache_backend(cache_dir: str):
+   """The response cache for cache_dir (or the shared remote one), created on first use."""
+   name = cache_dir if CACHE_BACKEND == "sqlite" else CACHE_BACKEND
+   with _cache_backends_lock:
+      backend = _cache_backends.get(name)
+      if backend is None:
+         try:
+            if CACHE_BACKEND == "redis":
+               backend = _RedisCache(CACHE_URL)
+            elif CACHE_BACKEND == "memcached":
+               backend = _MemcachedCache(CACHE_URL)
+            else:
+               backend = _SQLiteCache(cache_dir)
+         except ModuleNotFoundError as e:
+            raise RuntimeError(f"Missing dependency for LLM_CACHE_BACKEND={CACHE_BACKEND}: {e.name}. "
+                               f"Install it with 'python -m pip install {e.name}'.")
+         _cache_backends[name] = backend
+   return backend
+
+
+def _get_semantic_encoder():
+   global _semantic_encoder
+   if _semantic_encoder is None:
+      _semantic_encoder = SentenceTransformer(SEMANTIC_CACHE_MODEL)
+   return _semantic_encoder
+
+
+def _semantic_embed(messages: List[Dict]):
+   """Embed the concatenated user turns as a normalized float32 row vector."""
+   text = "\n".join(m["content"] for m in messages if m["role"] == "user")
+   vec = _get_semantic_encoder().encode([text], normalize_embeddings=True)
+   return np.asarray(vec, dtype="float32")
+
+
+def _semantic_context(messages: List[Dict]) -> str:
+   """Hash of every non-user turn; near-duplicate prompts only match when these are identical."""
+   return _cache_hasher(_canonical_json([m for m in messages if m["role"] != "user"])).hexdigest()
+
+
+def _semantic_scope(options: Dict) -> str:
+   """Short id of the model + sampling options; each gets its own index."""
+   return _cache_hasher(_options_json(tuple(sorted(options.items())))).hexdigest()[:16]
+
+
+def _semantic_paths(cache_dir: str, scope: str) -> tuple:
+   return Path(cache_dir) / f"semantic-{scope}.faiss", Path(cache_dir) / f"semantic-{scope}.jsonl"
+
+
+def _semantic_read_texts(texts_path: Path) -> List[Dict]:
+   """Entries from the JSONL file, stopping at a line cut short by a crash."""
+   texts = []
+   if texts_path.exists():
+      for line in texts_path.read_text(encoding='utf-8').splitlines():
+         try:
+            texts.append(json.loads(line))
+         except ValueError:
+            break
+   return texts
+
+
+def _semantic_index(cache_dir: str, scope: str) -> tuple:
+   """Load (or create) the FAISS index and parallel response list for cache_dir/scope.
+
+   Entries appended after the index was last saved have no vector, so they
+   are dropped; an index that doesn't line up with the file starts over.
+   """
+   if (cache_dir, scope) not in _semantic_indexes:
+      index_path, texts_path = _semantic_paths(cache_dir, scope)
+      texts = _semantic_read_texts(texts_path)
+      index = faiss.read_index(str(index_path)) if index_path.exists() else None
+      if index is None or index.ntotal > len(texts):
+         index = faiss.IndexFlatIP(_get_semantic_encoder().get_sentence_embedding_dimension())
+      if len(texts) != index.ntotal:
+         texts = texts[:index.ntotal]
+         texts_path.write_text("".join(json.dumps(t) + "\n" for t in texts), encoding='utf-8')
+      _semantic_indexes[cache_dir, scope] = (index, texts)
+   return _semantic_indexes[cache_dir, scope]
+
+
+def _semantic_lookup(messages: List[Dict], cache_dir: str, scope: str,
+                     threshold: float = SEMANTIC_CACHE_THRESHOLD):
+   """Return (cached_text, vector, context); cached_text is None unless cosine >= threshold.
+
+   Only the user turns are embedded, so the system and assistant turns must
+   match exactly (context); only responses generated with the same model and
+   options (scope) can match.
+   """
+   with _semantic_lock:
+      index, texts = _semantic_index(cache_dir, scope)
+      vec = _semantic_embed(messages)
+      context = _semantic_context(messages)
+      if index.ntotal:
+         scores, ids = index.search(vec, min(index.ntotal, SEMANTIC_CACHE_CANDIDATES))
+         for score, i in zip(scores[0], ids[0]):
+            if score < threshold:
+               break
+            # Entries written before the context was stored are plain strings; never reuse them
+            if isinstance(texts[i], dict) and texts[i]["context"] == context:
+               return texts[i]["text"], vec, context
+   return None, vec, context
+
+
+def _semantic_save_index(cache_dir: str, scope: str) -> None:
+   """Write the index (caller holds _semantic_lock); the rename keeps a crash from truncating it."""
+   index, _ = _semantic_indexes[cache_dir, scope]
+   index_path, _ = _semantic_paths(cache_dir, scope)
+   tmp_path = index_path.with_suffix(".faiss.tmp")
+   faiss.write_index(index, str(tmp_path))
+   os.replace(tmp_path, index_path)
+   _semantic_unsaved[cache_dir, scope] = 0
+
+
+@atexit.register
+def _semantic_save_all() -> None:
+   with _semantic_lock:
+      for cache_dir, scope in list(_semantic_unsaved):
+         if _semantic_unsaved[cache_dir, scope]:
+            _semantic_save_index(cache_dir, scope)
+
+
+def _semantic_store(cache_dir: str, scope: str, vec, context: str, value: str) -> None:
+   with _semantic_lock:
+      index, texts = _semantic_index(cache_dir, scope)
+      entry = {"text": value, "context": context}
+      Path(cache_dir).mkdir(parents=True, exist_ok=True)
+      _, texts_path = _semantic_paths(cache_dir, scope)
+      with open(texts_path, 'a', encoding='utf-8') as f:
+         f.write(json.dumps(entry) + "\n")
+      index.add(vec)
+      texts.append(entry)
+      unsaved = _semantic_unsaved.get((cache_dir, scope), 0) + 1
+      _semantic_unsaved[cache_dir, scope] = unsaved
+      if unsaved >= SEMANTIC_INDEX_SAVE_EVERY:
+         _semantic_save_index(cache_dir, scope)
+
+
+def _backoff_seconds(attempt: int, base_sleep: float) -> float:
+   """Exponential backoff with random jitter, capped at MAX_BACKOFF_SECONDS.
+
+   Jitter spreads out retries from concurrent callers instead of having them
+   all wake up and hit the rate limit again at the same moment.
+   """
+   return random.uniform(base_sleep, max(base_sleep, min(MAX_BACKOFF_SECONDS, base_sleep * 2 ** attempt)))
+
+
+def _retry_after_seconds(error: Exception) -> float | None:
+   """The server's Retry-After hint in seconds (delta-seconds form only), if any."""
+   headers = getattr(getattr(error, "response", None), "headers", None)
+   value = headers.get("retry-after") if headers is not None else None
+   try:
+      return max(0.0, float(value)) if value is not None else None
+   except ValueError:
+      return None
+
+
+async def _call_with_retries(acall, retries: int, base_sleep: float, verbose: bool = False,
+                             cooldown_key: str | None = None):
+   """Await acall(), retrying transient LLM errors up to `retries` attempts.
+
+   When cooldown_key is given, a rate limit also puts that key on cooldown,
+   so every caller sharing it waits locally instead of spending a request
+   on another 429.
+   """
+   from litellm import exceptions as litellm_exceptions
+
+   # Transient failures worth retrying; anything else surfaces immediately
+   retryable_errors = (litellm_exceptions.RateLimitError, litellm_exceptions.APIConnectionError)
+   attempts = max(retries, 1)
+   for attempt in range(1, attempts + 1):
+      if cooldown_key is not None:
+         wait = _cooldown_until.get(cooldown_key, 0.0) - time.monotonic()
+         if wait > 0:
+            if verbose:
+               print(f"Rate-limit cooldown: waiting {wait:.2f}s before calling {cooldown_key}")
+            await asyncio.sleep(wait)
+      try:
+         return await acall()
+      except retryable_errors as e:
+         if verbose:
+            print(f"{type(e).__name__} (attempt {attempt}/{attempts}): {repr(e)}")
+         # The server's own estimate beats the exponential guess
+         retry_after = _retry_after_seconds(e)
+         if retry_after is not None:
+            sleep_seconds = min(retry_after, MAX_BACKOFF_SECONDS)
+         else:
+            sleep_seconds = _backoff_seconds(attempt, base_sleep)
+         if cooldown_key is not None and isinstance(e, litellm_exceptions.RateLimitError):
+            wake = time.monotonic() + sleep_seconds
+            _cooldown_until[cooldown_key] = max(wake, _cooldown_until.get(cooldown_key, 0.0))
+         if attempt >= attempts:
+            raise
+         if verbose:
+            print(f"Sleeping {sleep_seconds:.2f}s before retrying...")
+         await asyncio.sleep(sleep_seconds)
+
+
+async def agenerate_response(messages: List[Dict], model: str | None = None, *,
+                             max_tokens: int = DEFAULT_MAX_TOKENS,
+                             temperature: float = DEFAULT_TEMPERATURE,
+                             top_p: float = DEFAULT_TOP_P,
+                             n: int = 1,
+                             presence_penalty: float | None = None,
+                             frequency_penalty: float | None = None,
+                             retries: int = DEFAULT_RETRIES,
+                             base_sleep: float = DEFAULT_BASE_SLEEP,
+                             cache_dir: str | None = None,
+                             verbose: bool = False,
+                             on_token: Callable[[str], None] | None = None,
+                             json_mode: bool = False) -> str:
+   """Call LLM to get response; awaiting the network so independent calls overlap.
+
+   With on_token, the response is streamed and each text delta is passed to
+   on_token as it arrives (cache hits are returned without calling it).
+   json_mode asks the provider for a single JSON object.
+   """
    if model is None:
       model = DEFAULT_MODEL
    options = {
@@ -78,16 +454,32 @@ def generate_response(messages: List[Dict], model: str | None = None, *,
       "presence_penalty": presence_penalty,
       "frequency_penalty": frequency_penalty,
    }
+   if json_mode:
+      # Only added when set, so keys for plain-text requests stay unchanged
+      options["response_format"] = "json_object"
 
    # Try reading from cache first
    cache_key = None
    if cache_dir:
       cache_key = _make_cache_key(messages, options)
-      cached_value = _read_cache(cache_dir, cache_key)
+      # SQLite and the remote servers block, so they are queried off the event loop
+      cached_value = await asyncio.to_thread(_cache_backend(cache_dir).get, cache_key)
       if cached_value is not None:
          if verbose:
             print(f"Cache hit: {cache_key}")
          return cached_value
+
+   # Near-duplicate prompts: only safe for deterministic (temperature 0) calls.
+   # Embedding is CPU-bound, so it runs off the event loop.
+   semantic_vec = None
+   if cache_dir and SEMANTIC_CACHE and faiss is not None and temperature == 0.0:
+      semantic_scope = _semantic_scope(options)
+      cached_value, semantic_vec, semantic_context = await asyncio.to_thread(
+         _semantic_lookup, messages, cache_dir, semantic_scope)
+      if cached_value is not None:
+         if verbose:
+            print("Semantic cache hit")
+         return cached_value
    # Build kwargs for the LLM client
    llm_kwargs = {
       "model": model,
@@ -101,56 +493,143 @@ def generate_response(messages: List[Dict], model: str | None = None, *,
       llm_kwargs["presence_penalty"] = presence_penalty
    if frequency_penalty is not None:
       llm_kwargs["frequency_penalty"] = frequency_penalty
+   if json_mode:
+      llm_kwargs["response_format"] = {"type": "json_object"}
+
+   from litellm import acompletion
+
+   if on_token is not None:
+      llm_kwargs["stream"] = True
+   raw_resp = await _call_with_retries(lambda: acompletion(**llm_kwargs), retries, base_sleep, verbose,
+                                       cooldown_key=model)
+   if on_token is not None:
+      parts = []
+      async for chunk in raw_resp:
+         if not chunk.choices or getattr(chunk.choices[0], "index", 0) != 0:
+            continue
+         delta = chunk.choices[0].delta.content
+         if delta:
+            on_token(delta)
+            parts.append(delta)
+      text = "".join(parts)
+   else:
+      text = raw_resp.choices[0].message.content
+   # write cache
+   if cache_dir and cache_key:
+      await asyncio.to_thread(_cache_backend(cache_dir).set, cache_key, text)
+   if semantic_vec is not None:
+      await asyncio.to_thread(_semantic_store, cache_dir, semantic_scope, semantic_vec,
+                              semantic_context, text)
+   return text
+
+
+def generate_response(messages: List[Dict], model: str | None = None, **kwargs) -> str:
+   """Blocking wrapper around agenerate_response (same keyword arguments)."""
+   return asyncio.run(agenerate_response(messages, model, **kwargs))
+
+
+async def agenerate_responses(message_lists: List[List[Dict]], model: str | None = None, *,
+                              max_concurrency: int = DEFAULT_MAX_CONCURRENCY, **kwargs) -> List[str]:
+   """Run agenerate_response for every message list, at most max_concurrency at a time.
+
+   Results come back in the same order as message_lists.
+   """
+   semaphore = asyncio.Semaphore(max_concurrency)
+
+   async def bounded(messages: List[Dict]) -> str:
+      async with semaphore:
+         return await agenerate_response(messages, model, **kwargs)
+
+   return await asyncio.gather(*(bounded(messages) for messages in message_lists))
+
+
+async def _generate_docs_and_tests(docs_messages: List[Dict], tests_messages: List[Dict],
+                                   model: str | None) -> tuple:
+   """Run the documentation and test-case requests concurrently."""
+   docs_call = agenerate_response(
+      docs_messages,
+      model=model,
+      max_tokens=DEFAULT_MAX_TOKENS,
+      temperature=DEFAULT_TEMPERATURE,
+      top_p=DEFAULT_TOP_P,
+      cache_dir=CACHE_DIR,
+      verbose=False,
+   )
+   tests_call = agenerate_response(
+      tests_messages,
+      model=model,
+      max_tokens=512,
+      temperature=0.0,
+      cache_dir=CACHE_DIR,
+      verbose=False,
+   )
+   # Build both coroutines first, then await them together
+   return await asyncio.gather(docs_call, tests_call)
 
-   # call with retries
-   def _call_llm():
-      return completion(**llm_kwargs)
 
-   attempt = 0
-   while True:
-      attempt += 1
-      try:
-         raw_resp = _call_llm()
-         text = raw_resp.choices[0].message.content
-         # write cache
-         if cache_dir and cache_key:
-            _write_cache(cache_dir, cache_key, text)
-         return text
-      except litellm_exceptions.RateLimitError as e:
-         if verbose:
-            print(f"RateLimitError (attempt {attempt}/{retries}): {repr(e)}")
-         if attempt >= retries:
-            raise
-         sleep_seconds = base_sleep * (2 ** (attempt - 1))
-         if verbose:
-            print(f"Sleeping {sleep_seconds}s before retrying...")
-         time.sleep(sleep_seconds)
-   return response.choices[0].message.content
+def _parse_docs_and_tests(response: str) -> tuple | None:
+   """Return (documented_function, test_cases) from the combined JSON answer, or None."""
+   try:
+      data = orjson.loads(response) if orjson is not None else json.loads(response)
+   except ValueError:
+      return None
+   if not isinstance(data, dict):
+      return None
+   documented_function, test_cases = data.get("documented_function"), data.get("test_cases")
+   if not isinstance(documented_function, str) or not isinstance(test_cases, str):
+      return None
+   return documented_function, test_cases
 
-def extract_code_block(response: str) -> str:
-   """Extract code block from response"""
 
-   if not '```' in response:
-      return response
+def _use_json_mode(model: str | None) -> bool:
+   """Whether to ask model for docs and tests in one JSON answer.
 
-   parts = response.split('```')
-   if len(parts) < 2:
-      return response
-   code_block = parts[1].strip()
-   # Check for "python" at the start and remove
+   Only models litellm lists as supporting structured output qualify: others
+   (e.g. gpt-4) reject response_format with a 400, which would cost a wasted
+   request before the fallback.
+   """
+   import litellm
 
-   if code_block.startswith("python"):
-      code_block = code_block[6:]
+   model = model or DEFAULT_MODEL
+   return model not in _json_mode_failed and litellm.supports_response_schema(model=model)
 
-   return code_block
 
-def develop_custom_function(model: str | None = None, mock: bool = False):
-   # Get user input for function description
-   print("\nWhat kind of function would you like to create?")
-   print("Example: 'A function that calculates the factorial of a number'")
-   print("Your description: ", end='')
-   function_description = input().strip()
+def _make_http_client() -> "httpx.AsyncClient":
+   """Keep-alive pool shared by every acompletion() call, sized for the fan-out.
+
+   HTTP/2 needs the optional 'h2' package; without it the pool still reuses
+   HTTP/1.1 connections, which is what saves the TCP+TLS handshake.
+   """
+   import httpx  # installed with litellm
+
+   limits = httpx.Limits(max_keepalive_connections=DEFAULT_MAX_CONCURRENCY,
+                         max_connections=2 * DEFAULT_MAX_CONCURRENCY)
+   try:
+      return httpx.AsyncClient(http2=True, limits=limits, timeout=60.0)
+   except ImportError:
+      return httpx.AsyncClient(limits=limits, timeout=60.0)
 
+
+async def with_http_session(coro):
+   """Await coro with one AsyncClient installed as litellm's session, then close it."""
+   import litellm
+
+   async with _make_http_client() as client:
+      litellm.aclient_session = client
+      try:
+         return await coro
+      finally:
+         litellm.aclient_session = None
+
+
+def extract_code_block(response: str) -> str:
+   """Extract code block from response"""
+   match = _CODE_BLOCK_RE.search(response)
+   return match.group(1).strip() if match else response
+
+async def _initial_function(function_description: str, model: str | None, mock: bool,
+                            on_token: Callable[[str], None] | None = None) -> tuple:
+   """Step 1: return (messages, initial_function) for a description."""
    # Initialize conversation with system prompt
    messages = [
       {"role": "system", "content": "You are a Python expert helping to develop a function."}
@@ -161,87 +640,176 @@ def develop_custom_function(model: str | None = None, mock: bool = False):
       "role": "user",
       "content": f"Write a Python function that {function_description}. Output the function in a ```python code block```."
    })
-   initial_function = generate_response(
+   initial_function = await agenerate_response(
       messages,
       model=model,
       max_tokens=DEFAULT_MAX_TOKENS,
-      temperature=float(os.getenv("DEFAULT_TEMPERATURE", str(DEFAULT_TEMPERATURE))),
-      top_p=float(os.getenv("DEFAULT_TOP_P", str(DEFAULT_TOP_P))),
-      cache_dir=os.getenv("LLM_CACHE_DIR", DEFAULT_CACHE_DIR) if os.getenv("LLM_CACHE_DIR") else None,
+      temperature=DEFAULT_TEMPERATURE,
+      top_p=DEFAULT_TOP_P,
+      cache_dir=CACHE_DIR,
       verbose=False,
+      on_token=on_token,
    ) if not mock else "def mock_function():\n    return 'mock'"
 
    # Parse the response to get the function code
-   initial_function = extract_code_block(initial_function)
+   return messages, extract_code_block(initial_function)
 
-   print("\n=== Initial Function ===")
-   print(initial_function)
 
+async def _docs_and_tests(messages: List[Dict], initial_function: str, model: str | None,
+                          mock: bool) -> tuple:
+   """Steps 2 and 3: return (documented_function, test_cases) for the step-1 code."""
    # Add assistant's response to conversation
    # Notice that I am purposely causing it to forget its commentary and just see the code so that
    # it appears that is always outputting just code.
-   messages.append({"role": "assistant", "content": "```python\n\n" + initial_function + "\n\n```"})
+   messages = messages + [{"role": "assistant", "content": "```python\n\n" + initial_function + "\n\n```"}]
 
+   # Documentation and tests both depend only on the initial function, so ask
+   # for both in one JSON answer: the history is sent (and billed) once.
+   combined_messages = messages + [{
+      "role": "user",
+      "content": "Add comprehensive documentation to this function, including description, parameters, "
+                 "return value, examples, and edge cases. Also write unittest test cases for it, including "
+                 "tests for basic functionality, edge cases, error cases, and various input scenarios. "
+                 "Return a JSON object with two string keys: \"documented_function\" (the documented "
+                 "function) and \"test_cases\" (the test code)."
+   }]
+   # Used instead when the model has no JSON mode or the answer is not that
+   # JSON: two requests branching off the same history, run concurrently.
    # Second prompt - Add documentation
-   messages.append({
+   docs_messages = messages + [{
       "role": "user",
       "content": "Add comprehensive documentation to this function, including description, parameters, "
                  "return value, examples, and edge cases. Output the function in a ```python code block```."
-   })
-   documented_function = generate_response(
-      messages,
-      model=model,
-      max_tokens=DEFAULT_MAX_TOKENS,
-      temperature=float(os.getenv("DEFAULT_TEMPERATURE", str(DEFAULT_TEMPERATURE))),
-      top_p=float(os.getenv("DEFAULT_TOP_P", str(DEFAULT_TOP_P))),
-      cache_dir=os.getenv("LLM_CACHE_DIR", DEFAULT_CACHE_DIR) if os.getenv("LLM_CACHE_DIR") else None,
-      verbose=False,
-   ) if not mock else initial_function + "\n# Mock documentation"
-   documented_function = extract_code_block(documented_function)
-   print("\n=== Documented Function ===")
-   print(documented_function)
-
-   # Add documentation response to conversation
-   messages.append({"role": "assistant", "content": "```python\n\n" + documented_function + "\n\n```"})
-
+   }]
    # Third prompt - Add test cases
-   messages.append({
+   tests_messages = messages + [{
       "role": "user",
       "content": "Add unittest test cases for this function, including tests for basic functionality, "
               "edge cases, error cases, and various input scenarios. Output the code in a ```python code block```."
-   })
-   test_cases = generate_response(
-      messages,
-      model=model,
-      max_tokens=512,
-      temperature=0.0,
-      cache_dir=os.getenv("LLM_CACHE_DIR", DEFAULT_CACHE_DIR) if os.getenv("LLM_CACHE_DIR") else None,
-      verbose=False,
-   ) if not mock else "import unittest\n\nclass TestMock(unittest.TestCase):\n    def test_mock(self):\n        self.assertEqual(mock_function(), 'mock')\n\nif __name__ == '__main__':\n    unittest.main()"
+   }]
+   if not mock:
+      parsed = None
+      if _use_json_mode(model):
+         from litellm import exceptions as litellm_exceptions
+
+         try:
+            combined = await agenerate_response(
+               combined_messages,
+               model=model,
+               max_tokens=DEFAULT_MAX_TOKENS + 512,
+               temperature=DEFAULT_TEMPERATURE,
+               top_p=DEFAULT_TOP_P,
+               cache_dir=CACHE_DIR,
+               verbose=False,
+               json_mode=True,
+            )
+            parsed = _parse_docs_and_tests(combined)
+         except (litellm_exceptions.BadRequestError, litellm_exceptions.UnsupportedParamsError):
+            pass  # response_format rejected after all; fall back below
+         if parsed is None:
+            # Don't pay for a failing combined request again on the next attempt
+            _json_mode_failed.add(model or DEFAULT_MODEL)
+      if parsed is not None:
+         documented_function, test_cases = parsed
+      else:
+         documented_function, test_cases = await _generate_docs_and_tests(docs_messages, tests_messages, model)
+   else:
+      documented_function = initial_function + "\n# Mock documentation"
+      test_cases = "import unittest\n\nclass TestMock(unittest.TestCase):\n    def test_mock(self):\n        self.assertEqual(mock_function(), 'mock')\n\nif __name__ == '__main__':\n    unittest.main()"
+
    # We will likely run into random problems here depending on if it outputs JUST the test cases or the
    # test cases AND the code. This is the type of issue we will learn to work through with agents in the course.
-   test_cases = extract_code_block(test_cases)
-   print("\n=== Test Cases ===")
-   print(test_cases)
+   return extract_code_block(documented_function), extract_code_block(test_cases)
 
+
+def _save_function(function_description: str, documented_function: str, test_cases: str) -> str:
+   """Write the documented function and its tests to a file named after the description."""
    # Generate filename from function description
-   filename = function_description.lower()
-   filename = ''.join(c for c in filename if c.isalnum() or c.isspace())
+   filename = _FILENAME_UNSAFE_RE.sub('', function_description.lower())
    filename = filename.replace(' ', '_')[:30] + '.py'
 
    # Save final version
    with open(filename, 'w', encoding='utf-8') as f:
       f.write(documented_function + '\n\n' + test_cases)
 
+   return filename
+
+
+def _print_token(token: str) -> None:
+   sys.stdout.write(token)
+   sys.stdout.flush()
+
+
+async def develop_custom_function(model: str | None = None, mock: bool = False, verbose: bool = False):
+   # Get user input for function description
+   print("\nWhat kind of function would you like to create?")
+   print("Example: 'A function that calculates the factorial of a number'")
+   print("Your description: ", end='')
+   function_description = input().strip()
+
+   # In verbose mode the raw step-1 response is shown live as it streams in
+   if verbose and not mock:
+      print("\n=== Model Response (streaming) ===")
+   messages, initial_function = await _initial_function(function_description, model, mock,
+                                                        on_token=_print_token if verbose else None)
+   print("\n=== Initial Function ===")
+   print(initial_function)
+
+   documented_function, test_cases = await _docs_and_tests(messages, initial_function, model, mock)
+   print("\n=== Documented Function ===")
+   print(documented_function)
+   print("\n=== Test Cases ===")
+   print(test_cases)
+
+   filename = _save_function(function_description, documented_function, test_cases)
    return documented_function, test_cases, filename
 
+
+async def develop_custom_functions(function_descriptions: List[str], model: str | None = None,
+                                   mock: bool = False,
+                                   max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> List[str]:
+   """Run the whole pipeline for many descriptions at once; returns the saved filenames.
+
+   Each description still goes step 1 -> steps 2+3, but different descriptions
+   overlap, with at most max_concurrency pipelines in flight.
+   """
+   semaphore = asyncio.Semaphore(max_concurrency)
+
+   async def develop(function_description: str) -> str:
+      async with semaphore:
+         messages, initial_function = await _initial_function(function_description, model, mock)
+         documented_function, test_cases = await _docs_and_tests(messages, initial_function, model, mock)
+      filename = _save_function(function_description, documented_function, test_cases)
+      print(f"Saved {filename}")
+      return filename
+
+   return await asyncio.gather(*(develop(d) for d in function_descriptions))
+
 if __name__ == "__main__":
    parser = argparse.ArgumentParser(description="Quasi-Agent: generate function and tests via LLM")
    parser.add_argument("--model", type=str, default=os.getenv("DEFAULT_MODEL", "openai/gpt-4"),
                        help="Model to use (e.g., openai/gpt-4 or gpt-4.1-nano). Can also be set via DEFAULT_MODEL env var.")
    parser.add_argument('--mock', action='store_true', help='Skip real API calls and use mock responses')
    parser.add_argument('--verbose', action='store_true', help='Show debugging output and caches')
+   parser.add_argument('--batch', type=str, metavar='FILE',
+                       help='Develop one function per non-empty line of FILE, several at a time')
+   parser.add_argument('--semantic-cache', action='store_true',
+                       help='Also reuse cached answers to near-duplicate prompts (needs faiss-cpu, '
+                            'numpy and sentence-transformers, and a cache: LLM_CACHE_DIR)')
    args = parser.parse_args()
-
-   function_code, tests, filename = develop_custom_function(model=args.model, mock=args.mock)
-   print(f"\nFinal code has been saved to {filename}")
\ No newline at end of file
+   if args.semantic_cache:
+      if faiss is None:
+         parser.error("--semantic-cache needs faiss-cpu, numpy and sentence-transformers installed")
+      SEMANTIC_CACHE = True
+
+   if args.batch:
+      descriptions = [line.strip() for line in Path(args.batch).read_text(encoding='utf-8').splitlines()
+                      if line.strip()]
+      run = develop_custom_functions(descriptions, model=args.model, mock=args.mock)
+      # Mock runs make no API calls, so they skip litellm and the HTTP pool entirely
+      filenames = asyncio.run(run if args.mock else with_http_session(run))
+      print(f"\n{len(filenames)} functions have been saved")
+   else:
+      run = develop_custom_function(model=args.model, mock=args.mock, verbose=args.verbose)
+      function_code, tests, filename = asyncio.run(run if args.mock else with_http_session(run))
+      print(f"\nFinal code has been saved to {filename}")
\ No newline at end of file
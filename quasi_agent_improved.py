@@ -21,14 +21,15 @@ except ModuleNotFoundError:
 
 import os
 import argparse
-import time
+import asyncio
+import random
+import re
 import sys
-import hashlib
-import json
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
-from litellm import completion
+from litellm import acompletion
 from litellm import exceptions as litellm_exceptions
+from llm_cache import make_cache_key, read_cache, write_cache
 
 # Load environment variables
 load_dotenv()
@@ -41,67 +42,20 @@ DEFAULT_TOP_P = float(os.getenv("DEFAULT_TOP_P", "1.0"))
 DEFAULT_RETRIES = int(os.getenv("DEFAULT_RETRIES", "3"))
 DEFAULT_BASE_SLEEP = float(os.getenv("DEFAULT_BASE_SLEEP", "1.0"))
 DEFAULT_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+MAX_BACKOFF_SECONDS = 60.0
 
-
-# ============================================================================
-# CACHE MANAGEMENT
-# ============================================================================
-
-def make_cache_key(messages: List[Dict], options: Dict) -> str:
-    """
-    Create a unique cache key based on messages and model options.
-    
-    This allows us to reuse previous API responses when the exact same
-    request is made, saving both time and money.
-    
-    Args:
-        messages: The conversation messages
-        options: Model configuration options
-    
-    Returns:
-        A SHA-256 hash string to use as the cache key
-    """
-    key_obj = {"messages": messages, "options": options}
-    key_json = json.dumps(key_obj, sort_keys=True, default=str)
-    return hashlib.sha256(key_json.encode('utf-8')).hexdigest()
-
-
-def read_cache(cache_dir: str, key: str) -> Optional[str]:
-    """
-    Read a cached response from disk.
-    
-    Args:
-        cache_dir: Directory where cache files are stored
-        key: The cache key to look up
-    
-    Returns:
-        The cached response text, or None if not found
-    """
-    path = Path(cache_dir) / key
-    if path.exists():
-        return path.read_text(encoding='utf-8')
-    return None
-
-
-def write_cache(cache_dir: str, key: str, value: str) -> None:
-    """
-    Write a response to the cache.
-    
-    Args:
-        cache_dir: Directory where cache files are stored
-        key: The cache key to store under
-        value: The response text to cache
-    """
-    path = Path(cache_dir)
-    path.mkdir(parents=True, exist_ok=True)
-    (path / key).write_text(value, encoding='utf-8')
+# One pass over the response: optional language tag (python/python3/py), then
+# everything up to the closing fence (or end of text if the fence is missing)
+_CODE_BLOCK_RE = re.compile(
+    r"```[ \t]*(?:python3?|py)?[ \t]*\n?(.*?)(?:```|\Z)", re.DOTALL | re.IGNORECASE
+)
 
 
 # ============================================================================
 # LLM INTERACTION
 # ============================================================================
 
-def generate_response(
+async def generate_response(
     messages: List[Dict],
     model: Optional[str] = None,
     *,
@@ -161,7 +115,9 @@ def generate_response(
     cache_key = None
     if cache_dir:
         cache_key = make_cache_key(messages, options)
-        cached_value = read_cache(cache_dir, cache_key)
+        # Cache files are read and written in a worker thread so the
+        # concurrent docs/tests calls aren't stalled on disk I/O
+        cached_value = await asyncio.to_thread(read_cache, cache_dir, cache_key)
         if cached_value is not None:
             if verbose:
                 print(f"💾 Cache hit: {cache_key[:16]}...")
@@ -192,12 +148,12 @@ def generate_response(
             if verbose:
                 print(f"🔄 API call attempt {attempt}/{retries}...")
             
-            raw_resp = completion(**llm_kwargs)
+            raw_resp = await acompletion(**llm_kwargs)
             text = raw_resp.choices[0].message.content
             
             # Cache the response
             if cache_dir and cache_key:
-                write_cache(cache_dir, cache_key, text)
+                await asyncio.to_thread(write_cache, cache_dir, cache_key, text)
                 if verbose:
                     print(f"💾 Cached response: {cache_key[:16]}...")
             
@@ -212,10 +168,15 @@ def generate_response(
                 print("Check your API quota and billing at your provider's dashboard")
                 raise
             
-            sleep_seconds = base_sleep * (2 ** (attempt - 1))
+            # Random jitter keeps the concurrent docs/tests calls from waking
+            # up together and hitting the limit again at the same moment
+            sleep_seconds = min(
+                base_sleep * (2 ** (attempt - 1)) + random.uniform(0, base_sleep),
+                MAX_BACKOFF_SECONDS
+            )
             if verbose:
-                print(f"⏳ Sleeping {sleep_seconds}s before retry...")
-            time.sleep(sleep_seconds)
+                print(f"⏳ Sleeping {sleep_seconds:.2f}s before retry...")
+            await asyncio.sleep(sleep_seconds)
 
 
 # ============================================================================
@@ -235,27 +196,15 @@ def extract_code_block(response: str) -> str:
     Returns:
         The extracted code, or the original response if no code block found
     """
-    if '```' not in response:
-        return response.strip()
-    
-    parts = response.split('```')
-    if len(parts) < 2:
-        return response.strip()
-    
-    code_block = parts[1].strip()
-    
-    # Remove language identifier (e.g., "python")
-    if code_block.lower().startswith("python"):
-        code_block = code_block[6:].strip()
-    
-    return code_block
+    match = _CODE_BLOCK_RE.search(response)
+    return match.group(1).strip() if match else response.strip()
 
 
 # ============================================================================
 # MAIN AGENT LOGIC
 # ============================================================================
 
-def develop_custom_function(
+async def develop_custom_function(
     model: Optional[str] = None,
     mock: bool = False,
     verbose: bool = False,
@@ -275,6 +224,9 @@ def develop_custom_function(
     Step 3: Create unit tests
     Step 4: Save to file
     
+    Steps 2 and 3 both build on the function from step 1 and not on each
+    other, so their LLM calls run concurrently.
+    
     Args:
         model: The LLM model to use
         mock: If True, use mock responses instead of real API calls
@@ -335,7 +287,7 @@ def develop_custom_function(
         )
     })
     
-    initial_function = generate_response(
+    initial_function = await generate_response(
         messages,
         model=model,
         max_tokens=DEFAULT_MAX_TOKENS,
@@ -358,13 +310,12 @@ def develop_custom_function(
     })
     
     # ========================================================================
-    # STEP 2: Add Documentation
+    # STEPS 2 & 3: Add Documentation and Generate Test Cases
     # ========================================================================
-    print("\n" + "-" * 70)
-    print("STEP 2/3: Adding comprehensive documentation...")
-    print("-" * 70)
-    
-    messages.append({
+    # Both requests continue the conversation from the initial function;
+    # documentation doesn't change behavior, so the tests don't need to
+    # wait for it
+    docs_messages = messages + [{
         "role": "user",
         "content": (
             "Add comprehensive documentation to this function:\n"
@@ -374,37 +325,9 @@ def develop_custom_function(
             "4. Follow Google or NumPy docstring style\n\n"
             "Output the complete documented function in a ```python code block```."
         )
-    })
+    }]
     
-    documented_function = generate_response(
-        messages,
-        model=model,
-        max_tokens=DEFAULT_MAX_TOKENS,
-        temperature=DEFAULT_TEMPERATURE,
-        cache_dir=cache_dir,
-        verbose=verbose,
-    ) if not mock else initial_function + "\n# Mock documentation"
-    
-    documented_function = extract_code_block(documented_function)
-    
-    print("\n✅ Documentation added:")
-    print("─" * 70)
-    print(documented_function)
-    print("─" * 70)
-    
-    messages.append({
-        "role": "assistant",
-        "content": f"```python\n{documented_function}\n```"
-    })
-    
-    # ========================================================================
-    # STEP 3: Generate Test Cases
-    # ========================================================================
-    print("\n" + "-" * 70)
-    print("STEP 3/3: Creating unit tests...")
-    print("-" * 70)
-    
-    messages.append({
+    tests_messages = messages + [{
         "role": "user",
         "content": (
             "Create comprehensive unittest test cases for this function:\n"
@@ -415,26 +338,50 @@ def develop_custom_function(
             "5. Include docstrings for each test\n\n"
             "Output the complete test class in a ```python code block```."
         )
-    })
+    }]
     
-    test_cases = generate_response(
-        messages,
-        model=model,
-        max_tokens=2048,
-        temperature=0.0,
-        cache_dir=cache_dir,
-        verbose=verbose,
-    ) if not mock else (
-        "import unittest\n\n"
-        "class TestMock(unittest.TestCase):\n"
-        "    def test_mock(self):\n"
-        "        self.assertEqual(mock_function(), 'mock')\n\n"
-        "if __name__ == '__main__':\n"
-        "    unittest.main()"
-    )
+    print("\n" + "-" * 70)
+    print("STEPS 2-3/3: Adding documentation and creating unit tests...")
+    print("-" * 70)
     
+    if not mock:
+        documented_function, test_cases = await asyncio.gather(
+            generate_response(
+                docs_messages,
+                model=model,
+                max_tokens=DEFAULT_MAX_TOKENS,
+                temperature=DEFAULT_TEMPERATURE,
+                cache_dir=cache_dir,
+                verbose=verbose,
+            ),
+            generate_response(
+                tests_messages,
+                model=model,
+                max_tokens=2048,
+                temperature=0.0,
+                cache_dir=cache_dir,
+                verbose=verbose,
+            ),
+        )
+    else:
+        documented_function = initial_function + "\n# Mock documentation"
+        test_cases = (
+            "import unittest\n\n"
+            "class TestMock(unittest.TestCase):\n"
+            "    def test_mock(self):\n"
+            "        self.assertEqual(mock_function(), 'mock')\n\n"
+            "if __name__ == '__main__':\n"
+            "    unittest.main()"
+        )
+    
+    documented_function = extract_code_block(documented_function)
     test_cases = extract_code_block(test_cases)
     
+    print("\n✅ Documentation added:")
+    print("─" * 70)
+    print(documented_function)
+    print("─" * 70)
+    
     print("\n✅ Test cases created:")
     print("─" * 70)
     print(test_cases)
@@ -545,12 +492,12 @@ Environment Variables:
     
     try:
         # Run the agent
-        function_code, tests, filename = develop_custom_function(
+        function_code, tests, filename = asyncio.run(develop_custom_function(
             model=args.model,
             mock=args.mock,
             verbose=args.verbose,
             cache_enabled=not args.no_cache
-        )
+        ))
         
         print("\n" + "=" * 70)
         print("🎉 SUCCESS! Your function is ready to use.")
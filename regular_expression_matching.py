@@ -1,6 +1,67 @@
 
+import functools
 import re
 
+# google-re2 matches in linear time, so patterns like "a*a*a*a*b" cannot make
+# it backtrack exponentially; fall back to the stdlib engine without it
+try:
+    import re2 as _regex_engine
+except ImportError:
+    _regex_engine = re
+
+
+# Characters that make a pattern more than the '.'/'*' grammar is_match documents
+_FULL_REGEX_CHARS = frozenset("\\^$+?{}[]()|")
+
+
+@functools.lru_cache(maxsize=4096)
+def _compile(pattern: str):
+    """Compile pattern once; larger than re's own cache, and skips its lookup overhead."""
+    return _regex_engine.compile(pattern)
+
+
+@functools.lru_cache(maxsize=4096)
+def _tokens(pattern: str):
+    """
+    Split a '.'/'*' pattern into (char, starred) pairs, or return None when it
+    needs the full regex engine (other metacharacters, or a '*' with nothing
+    to repeat, which re rejects).
+    """
+    if _FULL_REGEX_CHARS.intersection(pattern) or pattern.startswith('*') or '**' in pattern:
+        return None
+    tokens = []
+    for ch in pattern:
+        if ch == '*':
+            tokens[-1] = (tokens[-1][0], True)
+        else:
+            tokens.append((ch, False))
+    return tuple(tokens)
+
+
+def _dp_match(text: str, tokens) -> bool:
+    """
+    Bottom-up DP over the text: row[j] is True when the text read so far
+    matches the first j tokens. O(len(text) * len(tokens)) time in the worst
+    case, where a backtracking engine can take exponential time.
+    """
+    row = [True]
+    for _, starred in tokens:
+        row.append(starred and row[-1])
+    for ch in text:
+        new_row = [False]
+        for j, (token, starred) in enumerate(tokens, 1):
+            # '.' matches anything but a newline, as in re
+            same = token == ch or (token == '.' and ch != '\n')
+            if starred:
+                new_row.append(new_row[j - 1] or (same and row[j]))
+            else:
+                new_row.append(same and row[j - 1])
+        row = new_row
+        if not any(row):
+            return False
+    return row[-1]
+
+
 def is_match(text: str, pattern: str) -> bool:
     """
     Checks if a given text string matches a regular expression pattern with support for '.' and '*'.
@@ -56,14 +117,16 @@ def is_match(text: str, pattern: str) -> bool:
         - Consecutive '*': should be handled correctly by the re module.
     """
 
-    # Use the re module to perform the regular expression matching.
-    # ^ asserts the start of the string
-    # $ asserts the end of the string
-    # re.compile compiles the pattern for efficiency if it's used multiple times
-    regex = re.compile(pattern)
-    match = regex.fullmatch(text)  # fullmatch requires the entire string to match
+    # re2 already runs in linear time; without it, match the '.'/'*' grammar
+    # with the DP, which cannot blow up on patterns like "a*a*a*a*b"
+    if _regex_engine is re:
+        tokens = _tokens(pattern)
+        if tokens is not None:
+            return _dp_match(text, tokens)
 
-    return bool(match)
+    # Anything else goes to the regex engine.
+    # _compile keeps compiled patterns around, so repeated patterns skip the compile step
+    return _compile(pattern).fullmatch(text) is not None  # fullmatch requires the entire string to match
 
 
 import unittest
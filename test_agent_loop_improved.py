@@ -0,0 +1,203 @@
+"""
+Tests for the tool functions and loop safeguards of the improved agent loops.
+
+Run with: python -m unittest test_agent_loop_improved
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import types
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import agent_loop_improved_common as common
+import agent_loop_with_function_calling_improved as loop1
+import agent_loop_with_function_calling2_improved as loop2
+
+
+def _touch(directory: str, *names: str) -> None:
+    for name in names:
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(name)
+
+
+class TestSearchFiles(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+        _touch(self.directory, "a.py", "b.txt", ".gitignore")
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_wildcard_matches_dotfiles_like_path_glob(self):
+        expected = sorted(p.name for p in Path(self.directory).glob("*") if p.is_file())
+        self.assertEqual(expected, [".gitignore", "a.py", "b.txt"])
+        for module in (loop1, loop2):
+            with self.subTest(module=module.__name__):
+                self.assertEqual(module.search_files("*", self.directory), expected)
+
+    def test_dot_pattern_matches_dotfiles(self):
+        for module in (loop1, loop2):
+            with self.subTest(module=module.__name__):
+                self.assertEqual(module.search_files(".git*", self.directory), [".gitignore"])
+
+    def test_extension_pattern(self):
+        for module in (loop1, loop2):
+            with self.subTest(module=module.__name__):
+                self.assertEqual(module.search_files("*.py", self.directory), ["a.py"])
+
+
+class TestReadFile(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.directory = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_large_binary_is_not_text(self):
+        # Bigger than one page, so the read is partial; the bad byte is at offset 0
+        path = self._write("image.png", b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 800)
+        self.assertIn("not a text file", loop1.read_file(path))
+        self.assertIn("not a text file", loop1.search_and_read("*.png", self.directory)["image.png"])
+
+    def test_range_may_cut_a_character_at_either_edge(self):
+        path = self._write("text.txt", "é".encode("utf-8") * 100)  # two bytes each
+        page = loop1.read_file(path, offset=1, length=10)
+        self.assertTrue(page.startswith("[bytes 1-11 of 200]\n"), page)
+        self.assertNotIn("not a text file", page)
+
+    def test_invalid_byte_inside_a_range_is_not_text(self):
+        path = self._write("mixed.txt", b"a" * 10 + b"\xff" + b"a" * 100)
+        self.assertIn("not a text file", loop1.read_file(path, offset=1, length=20))
+
+
+def _tool_turn(turn: int, calls: int = 2) -> list:
+    """One assistant message with `calls` tool calls, then their tool messages."""
+    ids = [f"call_{turn}_{i}" for i in range(calls)]
+    assistant = {
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [
+            {"id": call_id, "type": "function",
+             "function": {"name": "read_file", "arguments": json.dumps({"file_name": call_id})}}
+            for call_id in ids
+        ],
+    }
+    return [assistant] + [
+        {"role": "tool", "tool_call_id": call_id, "content": json.dumps({"result": call_id})}
+        for call_id in ids
+    ]
+
+
+class TestCompactMemory(unittest.TestCase):
+    def assertToolCallsPaired(self, memory):
+        """Every tool message answers a call of the assistant message before it, exactly once."""
+        pending = set()
+        for message in memory:
+            if message["role"] == "assistant":
+                self.assertEqual(pending, set(), "tool calls left without results")
+                pending = {call["id"] for call in message.get("tool_calls") or []}
+            elif message["role"] == "tool":
+                self.assertIn(message["tool_call_id"], pending)
+                pending.remove(message["tool_call_id"])
+        self.assertEqual(pending, set(), "tool calls left without results")
+
+    def test_keeps_tool_call_ids_paired(self):
+        memory = [{"role": "system", "content": "system"}, {"role": "user", "content": "task"}]
+        for turn in range(10):
+            memory.extend(_tool_turn(turn))
+            common.compact_memory(memory, keep_turns=3)
+            self.assertToolCallsPaired(memory)
+
+        self.assertTrue(memory[2]["content"].startswith(common.SUMMARY_PREFIX))
+        self.assertEqual(sum(m["role"] == "assistant" for m in memory), 3)
+        # Every folded call, from both compactions, has one summary line with its own result
+        summary = memory[2]["content"].splitlines()[1:]
+        self.assertEqual(len(summary), 2 * 7)
+        for line in summary:
+            call_id = json.loads(line[line.index("(") + 1:line.index(")")])["file_name"]
+            self.assertTrue(line.endswith(" -> " + json.dumps({"result": call_id})), line)
+
+
+def _tool_call_stream(name: str, args: dict):
+    """An acompletion(stream=True) result holding one complete tool call."""
+    call = types.SimpleNamespace(
+        index=0, id="call_0",
+        function=types.SimpleNamespace(name=name, arguments=json.dumps(args)),
+    )
+    chunk = types.SimpleNamespace(
+        choices=[types.SimpleNamespace(delta=types.SimpleNamespace(content=None, tool_calls=[call]))]
+    )
+
+    async def stream():
+        yield chunk
+
+    return stream()
+
+
+class TestStuckDetection(unittest.TestCase):
+    def _run(self, module, next_call, max_iterations=10):
+        """Run module.run_agent against a fake litellm; return (prompts sent, output)."""
+        prompts = []
+
+        async def acompletion(**kwargs):
+            prompts.append(list(kwargs["messages"]))
+            return _tool_call_stream(*next_call(len(prompts)))
+
+        fake_litellm = types.SimpleNamespace(acompletion=acompletion)
+        out = io.StringIO()
+        with mock.patch.dict(sys.modules, {"litellm": fake_litellm}), contextlib.redirect_stdout(out):
+            asyncio.run(module.run_agent("task", model="test/model", max_iterations=max_iterations))
+        return prompts, out.getvalue()
+
+    def test_repeated_tool_call_gets_hint_then_stops(self):
+        for module in (loop1, loop2):
+            with self.subTest(module=module.__name__), tempfile.TemporaryDirectory() as directory:
+                key = "directory" if module is loop1 else "path"
+                prompts, output = self._run(module, lambda n: ("list_files", {key: directory}))
+                hinted = [i for i, messages in enumerate(prompts)
+                          if messages[-1]["content"] == common.STUCK_HINT]
+                self.assertEqual(hinted, [common.STUCK_REPEAT_LIMIT])
+                self.assertIn("asking the agent to wrap up", output)
+                self.assertIn("stopping to avoid a loop", output)
+                self.assertEqual(len(prompts), 2 * common.STUCK_REPEAT_LIMIT)
+
+    def test_consecutive_tool_errors_get_hint(self):
+        for module in (loop1, loop2):
+            with self.subTest(module=module.__name__):
+                prompts, output = self._run(
+                    module, lambda n: ("read_file", {"file_name": f"missing-{n}.txt"}),
+                    max_iterations=common.STUCK_ERROR_LIMIT + 1,
+                )
+                self.assertEqual(prompts[-1][-1]["content"], common.STUCK_HINT)
+                self.assertIn("asking the agent to wrap up", output)
+
+    def test_varied_successful_calls_are_not_stuck(self):
+        for module in (loop1, loop2):
+            with self.subTest(module=module.__name__), tempfile.TemporaryDirectory() as directory:
+                _touch(directory, *(f"f{i}.txt" for i in range(6)))
+                prompts, output = self._run(
+                    module,
+                    lambda n: ("search_files", {"pattern": f"f{n % 6}.txt", "directory": directory}),
+                    max_iterations=6,
+                )
+                self.assertNotIn("wrap up", output)
+                self.assertFalse(any(m["content"] == common.STUCK_HINT for m in prompts[-1]))
+
+
+if __name__ == "__main__":
+    unittest.main()